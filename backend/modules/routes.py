@@ -6,15 +6,17 @@ from flask import request, jsonify, send_from_directory, send_file
 from compiler import main as compiler
 
 
-@app.route('/download/executable')
-def download_executable():
-    executable_path = os.path.join(app.root_path, 'a.out')
+@app.route('/download/executable/<artifact_id>')
+def download_executable(artifact_id):
+    executable_path = compiler.artifact_store.path(artifact_id)
 
-    if not os.path.exists(executable_path):
+    if executable_path is None:
         return jsonify({"error": "Executable file not found."}), 404
 
+    # Artifact IDs are content hashes, so they double as strong ETags.
+    # 'conditional' enables If-None-Match and Range requests.
     return send_file(executable_path, as_attachment=True, download_name="executable.out",
-                     mimetype='application/octet-stream')
+                     mimetype='application/octet-stream', conditional=True, etag=artifact_id)
 
 
 @app.route('/api/compile', methods=['POST'])
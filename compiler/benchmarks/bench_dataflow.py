@@ -0,0 +1,79 @@
+"""Times the dataflow analyses on generated programs of growing size.
+
+Run with 'python -m compiler.benchmarks.bench_dataflow' from the repository root. The garbage
+collector is paused while timing, as in 'timeit'. Each column is the time per instruction.
+
+The time per instruction of liveness, live intervals and block liveness should stay roughly flat
+as the programs grow, and so should that of 'optimize_ir', which is built on them. Reaching
+definitions over all definitions and available expressions are not: every definition and expression
+in these programs stays valid until the end, so their results, and their time, grow with the number
+of blocks times the size of the program. The optimizer only asks for the reaching definitions of
+loop counters, and doesn't use available expressions.
+"""
+import gc
+import sys
+import time
+
+from compiler.src import ir
+from compiler.src.cfg import build_cfg
+from compiler.src.dataflow import available_expressions, reaching_definitions
+from compiler.src.ir_generator import generate_ir
+from compiler.src.ir_optimizer import optimize_ir
+from compiler.src.liveness import block_liveness, live_intervals, live_variables
+from compiler.src.parser import parse
+from compiler.src.sym_table import SymTable
+from compiler.src.tokenizer import tokenize
+from compiler.src.type import initialize_root_types
+from compiler.src.type_checker import typecheck
+
+
+def program(statements: int) -> str:
+    """Straight-line code mixed with loops and branches, so that the analyses have to iterate. The
+    input keeps the optimizer from working out the whole program."""
+    parts = ['var s = read_int();']
+    for i in range(statements // 4):
+        parts.append(f'var v{i} = s + {i};')
+        parts.append(f'while v{i} > {i} do {{ v{i} = v{i} / 2; }}')
+        parts.append(f'if v{i} % 2 == 0 then {{ s = s + v{i}; }} else {{ s = s - 1; }}')
+    return '{ ' + ' '.join(parts) + ' s }'
+
+
+def timed(function, *args) -> float:
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def live_sets(instructions: list[ir.Instruction]) -> None:
+    """Liveness as the code generator uses it, asked about every instruction."""
+    liveness = live_variables(instructions)
+    for i in range(len(instructions)):
+        liveness.live_out_vars(i)
+
+
+def main(sizes: list[int]) -> None:
+    columns = ['liveness', 'intervals', 'blocks', 'reaching', 'available', 'optimize_ir']
+    print(f'{"statements":>10} {"insns":>8} ' + ' '.join(f'{column:>11}' for column in columns))
+    for size in sizes:
+        ast = parse(tokenize(program(size)))
+        typecheck(ast, SymTable())
+        instructions = generate_ir(initialize_root_types(), ast)
+        cfg = build_cfg(instructions)
+        times = [
+            timed(live_sets, instructions),
+            timed(live_intervals, instructions),
+            timed(block_liveness, cfg),
+            timed(reaching_definitions, cfg),
+            timed(available_expressions, cfg),
+            timed(optimize_ir, instructions),
+        ]
+        per_instruction = ' '.join(f'{t / len(instructions) * 1e6:>9.1f}us' for t in times)
+        print(f'{size:>10} {len(instructions):>8} {per_instruction}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [250, 1000, 4000, 8000])
@@ -0,0 +1,46 @@
+"""Times compiled programs that read a lot of input or write a lot of output through the runtime.
+
+Run with 'python -m compiler.benchmarks.bench_io' from the repository root, optionally giving the
+counts of numbers to read and print.
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+from compiler.src.assembler import assemble
+from compiler.tests.test_program_utils import compile_to_assembly
+
+sum_input = '{ var n = read_int(); var s = 0; while n > 0 do { s = s + read_int(); n = n - 1; } s }'
+print_numbers = '{ var n = read_int(); var i = 0; while i < n do { print_int(i * 7919); i = i + 1; } n }'
+
+
+def numbers_input(count: int) -> str:
+    return f'{count}\n' + ''.join(f'{i * 7919 - 5 * 10 ** 8}\n' for i in range(count))
+
+
+def timed_run(executable: str, stdin: str) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = subprocess.run([executable], input=stdin, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def main(counts: list[int]) -> None:
+    with tempfile.TemporaryDirectory(prefix='compiler_bench_') as workdir:
+        reader = path.join(workdir, 'sum_input')
+        assemble(compile_to_assembly(sum_input), reader, workdir=workdir)
+        writer = path.join(workdir, 'print_numbers')
+        assemble(compile_to_assembly(print_numbers), writer, workdir=workdir)
+        print(f'{"program":<14} {"numbers":>10} {"bytes":>10} {"seconds":>8} {"MB/s":>8}')
+        for count in counts:
+            stdin = numbers_input(count)
+            seconds, _ = timed_run(reader, stdin)
+            print(f'{"sum_input":<14} {count:>10} {len(stdin):>10} {seconds:>8.3f} {len(stdin) / seconds / 1e6:>8.1f}')
+        for count in counts:
+            seconds, stdout = timed_run(writer, f'{count}\n')
+            print(f'{"print_numbers":<14} {count:>10} {len(stdout):>10} {seconds:>8.3f} {len(stdout) / seconds / 1e6:>8.1f}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6])
@@ -0,0 +1,39 @@
+"""Times building executables from the test programs with 'as' and 'ld', and with the in-process encoder.
+
+Run with 'python -m compiler.benchmarks.bench_link' from the repository root, optionally giving the
+number of rounds over the test programs.
+"""
+import sys
+import tempfile
+import time
+from os import path
+
+from compiler.src.assembler import assemble
+from compiler.src.elf_writer import build_executable, runtime_object
+from compiler.tests.test_program_utils import compile_to_assembly, program_cases
+
+
+def main(rounds: int) -> None:
+    programs = [compile_to_assembly(source_code) for source_code, _, _ in program_cases] * rounds
+    # Both ways reuse a runtime built before the first program.
+    runtime_object()
+    with tempfile.TemporaryDirectory(prefix='compiler_bench_') as workdir:
+        executable = path.join(workdir, 'a.out')
+        assemble(programs[0], executable, workdir=workdir)
+        start = time.perf_counter()
+        for asm in programs:
+            assemble(asm, executable, workdir=workdir)
+        binutils = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for asm in programs:
+        build_executable(asm)
+    builtin = time.perf_counter() - start
+
+    print(f'{len(programs)} programs')
+    print(f'as + ld:  {binutils / len(programs) * 1000:>7.2f} ms per program')
+    print(f'builtin:  {builtin / len(programs) * 1000:>7.2f} ms per program ({binutils / builtin:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
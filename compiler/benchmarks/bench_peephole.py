@@ -0,0 +1,31 @@
+"""Counts how often each peephole rule fires on the test programs, and how many instructions it saves.
+
+Run with 'python -m compiler.benchmarks.bench_peephole' from the repository root.
+"""
+from collections import Counter
+
+from compiler.src.peephole import all_rules, optimize_assembly
+from compiler.tests.test_program_utils import compile_to_assembly, program_cases
+
+
+def instruction_count(asm: str) -> int:
+    return sum(1 for line in asm.split('\n') if line and not line.startswith(('#', '.')) and not line.endswith(':'))
+
+
+def main() -> None:
+    for use_registers in (True, False):
+        hits: Counter[str] = Counter()
+        before = after = 0
+        for source_code, _, _ in program_cases:
+            asm = compile_to_assembly(source_code, use_registers=use_registers, peephole=False)
+            optimized = '\n'.join(optimize_assembly(asm.split('\n'), hits=hits))
+            before += instruction_count(asm)
+            after += instruction_count(optimized)
+        print(f'use_registers={use_registers}: {before} -> {after} instructions '
+              f'({(before - after) / before:.1%} fewer)')
+        for name in all_rules:
+            print(f'  {name:<20} {hits[name]:>6}')
+
+
+if __name__ == '__main__':
+    main()
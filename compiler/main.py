@@ -1,6 +1,14 @@
-from compiler.src.assembler import assemble
+import os
+import tempfile
+
+from compiler.src.artifacts import ArtifactStore
+from compiler.src.assembler import assemble, build_directory
 from compiler.src.assembly_generator import generate_assembly
+from compiler.src.compile_cache import CompileCache, source_key, token_key, ast_key, ir_key, location_mapping, \
+    relocate
+from compiler.src.elf_writer import build_executable
 from compiler.src.ir_generator import generate_ir, IrException
+from compiler.src.ir_optimizer import optimize_ir
 from compiler.src.parser import parse, ParseException
 from compiler.src.sym_table import SymTable
 from compiler.src.tokenizer import tokenize
@@ -8,25 +16,128 @@ from compiler.src.type import initialize_root_types
 from compiler.src.type_checker import typecheck
 
 
-def full_compile(source_code):
+def _cache_options_from_environment() -> dict:
+    """CompileCache options set by the environment, such as EZCOMPILER_CACHE_MAX_ENTRIES for `max_entries`.
+
+    The directory in EZCOMPILER_CACHE_DIR must only be writable by the service, see `CompileCache`.
+    """
+    options: dict = {'disk_dir': os.environ.get('EZCOMPILER_CACHE_DIR')}
+    for option in ('max_entries', 'max_bytes', 'max_disk_bytes'):
+        value = os.environ.get(f'EZCOMPILER_CACHE_{option.upper()}')
+        if value:
+            options[option] = int(value)
+    return options
+
+
+compile_cache = CompileCache(**_cache_options_from_environment())
+artifact_store = ArtifactStore(
+    os.environ.get('EZCOMPILER_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), f'ezcompiler_artifacts-{os.getuid()}')))
+# With EZCOMPILER_ASSEMBLER=builtin, executables are encoded and linked in this process instead of by 'as' and 'ld'.
+builtin_assembler = os.environ.get('EZCOMPILER_ASSEMBLER') == 'builtin'
+
+# The parts of a result that a cache hit at each stage boundary provides. The assembly and the executable
+# are only stored under the IR key, and the other entries refer to that entry by its key, 'output_key'.
+_TOKENS_STAGE = ('tokens', 'ast', 'ir', 'output_key')
+_AST_STAGE = ('ast', 'ir', 'output_key')
+_IR_STAGE = ('asm', 'executable')
+
+
+def full_compile(source_code, cache: CompileCache | None = compile_cache, artifacts: ArtifactStore = artifact_store):
+    key = source_key(source_code)
+    cached = _cached_entry(cache, key)
+    if cached is None:
+        cached = _compile(source_code, cache)
+        # A failure to assemble may be transient, so only results that are complete get cached.
+        if cache is not None and cached.get('file_generated', True):
+            cache.put(key, {field: value for field, value in cached.items() if field not in _IR_STAGE})
+
+    result = dict(cached)
+    result.pop('output_key', None)
+    executable = result.pop('executable', None)
+    if executable is not None:
+        result['artifact_id'] = artifacts.put(executable)
+    return result
+
+
+def _compile(source_code, cache: CompileCache | None):
+    """Runs the pipeline, consulting `cache` at each stage boundary.
+
+    The token stream, the type checked AST and the IR are each used as a key (ignoring source
+    locations), so an edit that leaves one of them unchanged, such as reformatting or editing
+    comments, reuses everything downstream of it, including the executable.
+    """
     try:
         tokens = tokenize(source_code)
+        tokens_key = token_key(tokens)
+        cached = _cached_entry(cache, tokens_key)
+        if cached is not None:
+            mapping = location_mapping(cached['tokens'], tokens)
+            return _result(tokens, relocate(cached['ast'], mapping), relocate(cached['ir'], mapping),
+                           cached['asm'], cached['executable'], cached['output_key'])
+
         ast = parse(tokens)
         global_symtable = SymTable()
         typecheck(ast, global_symtable)
+        typed_ast_key = ast_key(ast)
+        cached = _cached_entry(cache, typed_ast_key)
+        if cached is not None:
+            mapping = location_mapping(cached['ast'], ast)
+            result = _result(tokens, ast, relocate(cached['ir'], mapping), cached['asm'], cached['executable'],
+                             cached['output_key'])
+            _store_stage(cache, tokens_key, result, _TOKENS_STAGE)
+            return result
+
         root_types = initialize_root_types()
-        ir_instructions = generate_ir(root_types, ast)
+        ir_instructions = optimize_ir(generate_ir(root_types, ast))
+        ir_instructions_key = ir_key(ir_instructions)
+        cached = cache.get(ir_instructions_key) if cache is not None else None
+        if cached is not None:
+            result = _result(tokens, ast, ir_instructions, cached['asm'], cached['executable'], ir_instructions_key)
+            _store_stage(cache, tokens_key, result, _TOKENS_STAGE)
+            _store_stage(cache, typed_ast_key, result, _AST_STAGE)
+            return result
+
         asm = generate_assembly(ir_instructions)
-        file_generated = False
+        executable = None
         try:
-            assemble(asm, 'a.out')
-            file_generated = True
+            if builtin_assembler:
+                executable = build_executable(asm)
+            else:
+                with tempfile.TemporaryDirectory(prefix='compiler_', dir=build_directory()) as workdir:
+                    executable_path = os.path.join(workdir, 'a.out')
+                    assemble(asm, executable_path, workdir=workdir)
+                    with open(executable_path, 'rb') as f:
+                        executable = f.read()
         except Exception as e:
             pass
-        return {'ast': ast, 'tokens': tokens, 'ir': ir_instructions, 'asm': asm, 'file_generated': file_generated}
+        result = _result(tokens, ast, ir_instructions, asm, executable, ir_instructions_key)
+        _store_stage(cache, ir_instructions_key, result, _IR_STAGE)
+        _store_stage(cache, typed_ast_key, result, _AST_STAGE)
+        _store_stage(cache, tokens_key, result, _TOKENS_STAGE)
+        return result
     except ParseException as e:
         return {'error': str(e)}
     except TypeError as e:
         return {'error': str(e)}
     except IrException as e:
         return {'error': str(e)}
+
+
+def _result(tokens, ast, ir_instructions, asm, executable, output_key):
+    return {'ast': ast, 'tokens': tokens, 'ir': ir_instructions, 'asm': asm,
+            'file_generated': executable is not None, 'executable': executable, 'output_key': output_key}
+
+
+def _cached_entry(cache: CompileCache | None, key: str):
+    """Looks up an entry along with the assembly and executable that it refers to. An entry whose output
+    has been evicted counts as a miss."""
+    cached = cache.get(key) if cache is not None else None
+    if cached is None or 'output_key' not in cached:
+        return cached
+    output = cache.get(cached['output_key'])
+    return {**cached, **output} if output is not None else None
+
+
+def _store_stage(cache: CompileCache | None, key: str, result, stage: tuple[str, ...]) -> None:
+    if cache is not None and result['file_generated']:
+        cache.put(key, {field: result[field] for field in stage})
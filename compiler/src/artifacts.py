@@ -0,0 +1,70 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from os import path
+
+from compiler.src.private_directory import make_private_directory
+
+_artifact_id_pattern = re.compile(r'[0-9a-f]{32}')
+
+
+class ArtifactStore:
+    """Keeps compiled executables on disk, each in its own file named by an artifact ID.
+
+    IDs are derived from the file contents, so storing the same executable twice yields the same
+    ID and concurrent compiles never write to each other's files. Artifacts that have not been
+    stored or looked up for `ttl` seconds are removed by `cleanup`, which `put` runs at most once
+    every `cleanup_interval` seconds.
+
+    The executables are served to users, so `root_dir` must be private to the service, see
+    `make_private_directory`.
+    """
+
+    def __init__(self, root_dir: str, ttl: float = 3600, cleanup_interval: float = 60) -> None:
+        self.root_dir = root_dir
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = time.monotonic()
+        self._lock = threading.Lock()
+        make_private_directory(root_dir)
+
+    def put(self, data: bytes) -> str:
+        artifact_id = hashlib.sha256(data).hexdigest()[:32]
+        # The file is always written again, rather than trusting one that is already there, which also
+        # refreshes its expiry and can't race with `cleanup` removing it.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o755)
+        os.replace(tmp_path, path.join(self.root_dir, artifact_id))
+
+        with self._lock:
+            cleanup_due = time.monotonic() - self._last_cleanup >= self.cleanup_interval
+            if cleanup_due:
+                self._last_cleanup = time.monotonic()
+        if cleanup_due:
+            self.cleanup()
+        return artifact_id
+
+    def path(self, artifact_id: str) -> str | None:
+        """Returns the path of the artifact, or None if the ID is malformed or the artifact has expired."""
+        if not _artifact_id_pattern.fullmatch(artifact_id):
+            return None
+        artifact_path = path.join(self.root_dir, artifact_id)
+        try:
+            os.utime(artifact_path)
+        except FileNotFoundError:
+            return None
+        return artifact_path
+
+    def cleanup(self) -> None:
+        expiry = time.time() - self.ttl
+        for entry in os.scandir(self.root_dir):
+            try:
+                if entry.stat().st_mtime < expiry:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
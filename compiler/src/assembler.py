@@ -1,9 +1,26 @@
+import hashlib
+import os
+import stat
 import subprocess
 import tempfile
+import threading
 from contextlib import nullcontext
 from os import path
 from typing import ContextManager
 
+from compiler.src.private_directory import make_private_directory
+
+
+def build_directory() -> str:
+    """The directory for intermediate build files: $EZCOMPILER_BUILD_DIR if set, otherwise /dev/shm if it is
+    usable, so that object files stay in memory, and otherwise the system temp directory."""
+    configured = os.environ.get('EZCOMPILER_BUILD_DIR')
+    if configured:
+        return configured
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK | os.X_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
 
 def assemble(
         assembly_code: str,
@@ -12,28 +29,73 @@ def assemble(
         tempfile_basename: str = 'program',
         # Give ['c'] to link the C standard library
         extra_libraries: list[str] = [],
+        debug: bool = False,
 ) -> None:
-    """Invokes 'as' and 'ld' to generate an executable from Assembly code."""
-    cm: ContextManager[str] = nullcontext(
-        workdir) if workdir is not None else tempfile.TemporaryDirectory(prefix='compiler_')  # type: ignore
+    """Invokes 'as' and 'ld' to generate an executable from Assembly code.
+
+    The assembly is piped to 'as', so only the object file is written to `workdir`, which is a new
+    directory in `build_directory()` by default. With `debug`, the assembly is written to a file and
+    assembled with debug info that refers to it. The runtime in `stdlib_asm_code` is assembled only
+    once and then reused, see `stdlib_object`.
+    """
+    if not assembly_code.endswith('\n'):
+        assembly_code += '\n'
+    cm: ContextManager[str] = nullcontext(workdir) if workdir is not None else tempfile.TemporaryDirectory(
+        prefix='compiler_', dir=build_directory())  # type: ignore
     with cm as workdir:
-        stdlib_asm = path.join(workdir, 'stdlib.s')
-        stdlib_obj = path.join(workdir, 'stdlib.o')
-        program_asm = path.join(workdir, f'{tempfile_basename}.s')
+        stdlib_obj = stdlib_object(debug=debug)
         program_obj = path.join(workdir, f'{tempfile_basename}.o')
-        with open(stdlib_asm, 'w') as f:
-            f.write(stdlib_asm_code)
-        with open(program_asm, 'w') as f:
-            f.write(assembly_code)
-        subprocess.run(['as', '-g', '-o' +
-                        stdlib_obj, stdlib_asm], check=True)
-        subprocess.run(['as', '-g', '-o' +
-                        program_obj, program_asm], check=True)
+        if debug:
+            program_asm = path.join(workdir, f'{tempfile_basename}.s')
+            with open(program_asm, 'w') as f:
+                f.write(assembly_code)
+            subprocess.run(['as', '-g', '-o' + program_obj, program_asm], check=True)
+        else:
+            subprocess.run(['as', '-o' + program_obj, '-'], input=assembly_code.encode(), check=True)
         linker_flags = ['-static', *[f'-l{lib}' for lib in extra_libraries]]
         subprocess.run(
             ['ld', '-o' + output_file, *linker_flags, stdlib_obj, program_obj], check=True)
 
 
+_stdlib_object_lock = threading.Lock()
+
+
+def stdlib_object(cache_dir: str | None = None, debug: bool = False) -> str:
+    """Returns the path of an object file assembled from `stdlib_asm_code`, with debug info if `debug` is set.
+
+    The object file is named after a hash of the runtime source and the assembler flags, and kept in
+    `cache_dir`, so it is built at most once per runtime version and shared by every later link, including
+    those of other processes. Since the object is linked into every executable, `cache_dir` must only be
+    writable by the current user. By default it is a directory of the user's own in `build_directory()`,
+    created with mode 0700.
+    """
+    cache_dir = cache_dir if cache_dir is not None else path.join(build_directory(), f'ezcompiler-{os.getuid()}')
+    make_private_directory(cache_dir)
+    flags = ['-g'] if debug else []
+    digest = hashlib.sha256('\n'.join([' '.join(['as', *flags]), stdlib_asm_code]).encode()).hexdigest()[:16]
+    stdlib_obj = path.join(cache_dir, f'ezcompiler_stdlib_{digest}.o')
+    if _is_own_file(stdlib_obj):
+        return stdlib_obj
+
+    with _stdlib_object_lock:
+        if not _is_own_file(stdlib_obj):
+            with tempfile.TemporaryDirectory(prefix='compiler_', dir=cache_dir) as workdir:
+                built_obj = path.join(workdir, 'stdlib.o')
+                subprocess.run(['as', *flags, '-o' + built_obj, '-'], input=stdlib_asm_code.encode(), check=True)
+                # Renaming is atomic, so a concurrent build in another process never exposes
+                # a partially written object.
+                os.replace(built_obj, stdlib_obj)
+    return stdlib_obj
+
+
+def _is_own_file(file: str) -> bool:
+    try:
+        st = os.lstat(file)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISREG(st.st_mode) and st.st_uid == os.getuid()
+
+
 stdlib_asm_code: str = """
     .global _start
     .global print_int
@@ -43,10 +105,21 @@ stdlib_asm_code: str = """
     .section .text
 
 # ***** Function '_start' *****
-# Calls function 'main', prints the output value, and halts the program
+# Calls function 'main', writes out the buffered output, and halts the program.
+#
+# If a division traps, 'handle_division_error' writes out the buffered output
+# before the program is killed.
 
 _start:
+    movq $13, %rax           # rax = syscall number for rt_sigaction
+    movq $8, %rdi            # rdi = SIGFPE
+    movq $division_error_action, %rsi
+    xorq %rdx, %rdx          # rdx = no place for the old action
+    movq $8, %r10            # r10 = size of the signal mask
+    syscall
+
     call main
+    call flush_output
     movq $60, %rax
     xorq %rdi, %rdi
     syscall
@@ -62,19 +135,27 @@ _start:
 #     push(newline)
 #     if x < 0:
 #         negative = true
-#         x = -x
-#     while x > 0:
-#         push(digit for (x % 10))
-#         x = x / 10
+#         x = -x (as unsigned)
+#     while x >= 100:
+#         push(the two digits for (x % 100))
+#         x = x / 100
+#     if x >= 10:
+#         push(the two digits for x)
+#     else:
+#         push(digit for x)
 #     if negative:
 #         push(minus sign)
-#     syscall 'write' with pushed data
+#     append pushed data to the output buffer
 #     return the original argument
 #
+# Division by 100 is done by multiplying with its reciprocal, and the two
+# digits are looked up from 'digit_pairs', so there is no slow 'div'.
+#
 # Registers:
 # - rdi = our input number, which we divide down as we go
 # - rsp = stack pointer, pointing to the next character to emit.
 # - rbp = pointer to one after the last byte of our output (which grows downward)
+# - r8 = the reciprocal of 100
 # - r9 = whether the number was negative
 # - r10 = a copy of the original input, so we can return it
 # - rax, rcx and rdx are used by intermediate computations
@@ -90,35 +171,46 @@ print_int:
     movb $10, (%rsp)         # ASCII newline = 10
     decq %rsp
 
-    # Check for zero and negative cases
+    # Check for the negative case
     xorq %r9, %r9
-    xorq %rax, %rax
     cmpq $0, %rdi
-    je .Ljust_zero
     jge .Lnot_negative
     movq $1, %r9
-    negq %rdi                # Handle as positive
+    negq %rdi                # Handle as positive. The magnitude is read as unsigned,
+                             # so INT64_MIN stays 2^63 here.
 
 .Lnot_negative:
+    movq $0x28F5C28F5C28F5C3, %r8  # ceil(2^68 / 100) = (2^68 + 44) / 100, for dividing by 100
 
 .Ldigit_loop:
-    cmpq $0, %rdi
-    je .Ldigits_done        # Loop done when input = 0
+    cmpq $100, %rdi
+    jb .Llast_digits         # Loop done when input < 100
 
-    # Divide rdi by 10
+    # Divide rdi by 100, as (rdi / 4) * (2^68 / 100) / 2^66 without a division
     movq %rdi, %rax
-    movq $10, %rcx
-    cqto
-    idivq %rcx               # Sets rax = quotient and rdx = remainder
-
-    movq %rax, %rdi          # The quotient becomes our remaining input
-    addl $48, %edx           # ASCII '0' = 48. Add the remainder to get the correct digit.
-    movb %dl, (%rsp)         # Store the digit in the output
-    decq %rsp
+    shrq $2, %rax
+    mulq %r8                 # Sets rdx = high 64 bits of the product
+    shrq $2, %rdx            # rdx = quotient
+
+    imulq $100, %rdx, %rcx
+    subq %rcx, %rdi          # rdi = remainder
+    movzwl digit_pairs(,%rdi,2), %ecx  # The two ASCII digits of the remainder
+    movq %rdx, %rdi          # The quotient becomes our remaining input
+    movw %cx, -1(%rsp)       # Store the digits in the output
+    subq $2, %rsp
     jmp .Ldigit_loop
 
-.Ljust_zero:
-    movb $48, (%rsp)         # ASCII '0' = 48
+.Llast_digits:
+    cmpq $10, %rdi
+    jb .Llast_digit
+    movzwl digit_pairs(,%rdi,2), %ecx
+    movw %cx, -1(%rsp)
+    subq $2, %rsp
+    jmp .Ldigits_done
+
+.Llast_digit:
+    addl $48, %edi           # ASCII '0' = 48. Add the last digit to get its character.
+    movb %dil, (%rsp)        # Store the digit in the output
     decq %rsp
 
 .Ldigits_done:
@@ -130,9 +222,7 @@ print_int:
     decq %rsp
 .Lminus_done:
 
-    # Call syscall 'write'
-    movq $1, %rax            # rax = syscall number for write
-    movq $1, %rdi            # rdi = file handle for stdout
+    # Append the output to the output buffer
     # rsi = pointer to message
     movq %rsp, %rsi
     incq %rsi
@@ -140,7 +230,7 @@ print_int:
     movq %rbp, %rdx
     subq %rsp, %rdx
     decq %rdx
-    syscall
+    call buffer_output
 
     # Restore stack registers and return the original input
     movq %rbp, %rsp
@@ -166,12 +256,10 @@ print_bool:
     movq $true_str_len, %rdx
 
 .Lwrite:
-    # Call syscall 'write'
-    movq $1, %rax            # rax = syscall number for write
-    movq $1, %rdi            # rdi = file handle for stdout
+    # Append the output to the output buffer
     # rsi = pointer to message (already set above)
     # rdx = number of bytes (already set above)
-    syscall
+    call buffer_output
 
     # Restore stack registers and return the original input
     movq %rbp, %rsp
@@ -189,49 +277,64 @@ false_str_len = . - false_str
 # ***** Function 'read_int' *****
 # Reads an integer from stdin, skipping non-digit characters, until a newline.
 #
-# To avoid the complexity of buffering, it very inefficiently
-# makes a syscall to read each byte.
+# Buffered output is written out first, so that a prompt shows up before
+# the program waits for input.
+#
+# Input is read into 'input_buffer' with as few 'read' syscalls as possible.
+# 'input_pos' and 'input_end' point to the next unread byte and one past
+# the last byte read, so the input left over is kept for the next call.
 #
 # It crashes the program if input could not be read.
+#
+# Registers:
+# - rsi = pointer to the next input byte
+# - rdi = pointer to one past the last input byte in the buffer
+# - r8 = the current input byte
+# - r9 = whether a minus sign was seen
+# - r10 = the number read so far
+# - r12 = the number of input bytes read by this call
 read_int:
     pushq %rbp           # Save previous stack frame pointer
     movq %rsp, %rbp      # Set stack frame pointer
-    subq $16, %rsp       # Reserve space for input
-                         # (we only need 1 byte, but getting 16 for alignment)
+    pushq %r12           # Save r12, which is callee-saved
+    subq $8, %rsp        # Keep the stack aligned
+    call flush_output
 
     xorq %r9, %r9        # Clear r9 - it'll store the minus sign
     xorq %r10, %r10      # Clear r10 - it'll accumulate our output
-                         # Skip r11 - syscalls destroy it
     xorq %r12, %r12      # Clear r12 - it'll count the number of input bytes read.
+    movq input_pos(%rip), %rsi
+    movq input_end(%rip), %rdi
 
     # Loop until a newline or end of input is encountered
-.Lloop:
-    decq %rsi
-    cmpq %rsp, %rsi
-    je .Lend
+.Lread_loop:
+    cmpq %rdi, %rsi
+    jb .Lhave_byte
 
-    # Call syscall 'read'
+    # The buffer is used up, so fill it with syscall 'read'
     xorq %rax, %rax      # syscall number for read = 0
     xorq %rdi, %rdi      # file handle for stdin = 0
-    movq %rsp, %rsi      # rsi = pointer to buffer
-    movq $1, %rdx        # rdx = buffer size
+    leaq input_buffer(%rip), %rsi   # rsi = pointer to buffer
+    movq $input_buffer_size, %rdx   # rdx = buffer size
     syscall              # result in rax = number of bytes read,
-                         # or 0 on end of input, -1 on error
+                         # or 0 on end of input, negative on error
+                         # (syscalls destroy rcx and r11)
 
-    # Check return value: either -1, 0 or 1.
     cmpq $0, %rax
-    jg .Lno_error
+    jg .Lrefilled
+    movq input_end(%rip), %rsi      # Nothing was read, so the buffer stays used up.
+    movq %rsi, %rdi
     je .Lend_of_input
     jmp .Lerror
 
-.Lend_of_input:
-    cmpq $0, %r12
-    je .Lerror           # If we've read no input, it's an error.
-    jmp .Lend            # Otherwise complete reading this input.
+.Lrefilled:
+    leaq (%rsi,%rax), %rdi
+    movq %rdi, input_end(%rip)
 
-.Lno_error:
+.Lhave_byte:
+    movzbq (%rsi), %r8   # Load input byte to r8
+    incq %rsi
     incq %r12            # Increment input byte counter
-    movq (%rsp), %r8     # Load input byte to r8
 
     # If the input byte is 10 (newline), exit the loop
     cmpq $10, %r8
@@ -243,29 +346,34 @@ read_int:
     xorq $1, %r9
 .Lnegation_done:
 
-    # If the input byte is not between 48 ('0') and 57 ('9')
-    # then skip it as a junk character.
-    cmpq $48, %r8
-    jl .Lloop
-    cmpq $57, %r8
-    jg .Lloop
-
-    # Subtract 48 to get a digit 0..9
+    # Subtract 48 ('0') to get a digit. If the input byte was not between
+    # 48 ('0') and 57 ('9'), the result is above 9 when compared unsigned,
+    # and the byte is skipped as a junk character.
     subq $48, %r8
+    cmpq $9, %r8
+    ja .Lread_loop
 
     # Shift the digit onto the result
     imulq $10, %r10
     addq %r8, %r10
 
-    jmp .Lloop
+    jmp .Lread_loop
+
+.Lend_of_input:
+    cmpq $0, %r12
+    je .Lerror           # If we've read no input, it's an error.
+                         # Otherwise complete reading this input.
 
 .Lend:
+    movq %rsi, input_pos(%rip)      # Continue from here next time
+
     # If it's a negative number, negate the result
     cmpq $0, %r9
     je .Lfinal_negation_done
     neg %r10
 .Lfinal_negation_done:
-    # Restore stack registers and return the result
+    # Restore r12 and the stack registers and return the result
+    movq -8(%rbp), %r12
     movq %rbp, %rsp
     popq %rbp
     movq %r10, %rax
@@ -287,4 +395,101 @@ read_int:
 read_int_error_str:
     .ascii "Error: read_int() failed to read input\\n"
 read_int_error_str_len = . - read_int_error_str
+
+# ***** Function 'buffer_output' *****
+# Appends rdx bytes starting at rsi to 'output_buffer'. If they don't fit,
+# the buffer is written out first.
+#
+# Only rax, rcx, rdx, rsi, rdi and r11 are changed.
+buffer_output:
+    movq output_len(%rip), %rax
+    leaq (%rax,%rdx), %rcx
+    cmpq $output_buffer_size, %rcx
+    jbe .Lbuffer_fits
+    pushq %rsi
+    pushq %rdx
+    call flush_output
+    popq %rdx
+    popq %rsi
+    xorq %rax, %rax      # The buffer is now empty
+.Lbuffer_fits:
+    leaq output_buffer(%rip), %rdi
+    addq %rax, %rdi      # rdi = pointer to the end of the buffered output
+    addq %rdx, %rax
+    movq %rax, output_len(%rip)
+    movq %rdx, %rcx
+    rep movsb            # Copy rcx bytes from rsi to rdi
+    ret
+
+# ***** Function 'flush_output' *****
+# Writes out the contents of 'output_buffer' with syscall 'write', and empties it.
+#
+# Only rax, rcx, rdx, rsi, rdi and r11 are changed.
+flush_output:
+    leaq output_buffer(%rip), %rsi  # rsi = pointer to the bytes left to write
+    movq output_len(%rip), %rdx     # rdx = number of bytes left to write
+.Lflush_loop:
+    cmpq $0, %rdx
+    je .Lflush_done
+    movq $1, %rax            # rax = syscall number for write
+    movq $1, %rdi            # rdi = file handle for stdout
+    syscall                  # result in rax = number of bytes written,
+                             # which may be less than asked for
+    cmpq $0, %rax
+    jle .Lflush_done         # If nothing could be written, the rest is dropped.
+    addq %rax, %rsi
+    subq %rax, %rdx
+    jmp .Lflush_loop
+.Lflush_done:
+    movq $0, output_len(%rip)
+    ret
+
+# ***** Function 'handle_division_error' *****
+# The SIGFPE handler. The handler is reset before it runs, so when it returns,
+# the division traps again and the program is killed as usual.
+handle_division_error:
+    call flush_output
+    ret
+
+# Returns from a signal handler with syscall 'rt_sigreturn'.
+signal_return:
+    movq $15, %rax
+    syscall
+
+    .section .rodata
+# The ASCII digits of each number from 0 to 99, two bytes each.
+digit_pairs:
+    .ascii "00010203040506070809"
+    .ascii "10111213141516171819"
+    .ascii "20212223242526272829"
+    .ascii "30313233343536373839"
+    .ascii "40414243444546474849"
+    .ascii "50515253545556575859"
+    .ascii "60616263646566676869"
+    .ascii "70717273747576777879"
+    .ascii "80818283848586878889"
+    .ascii "90919293949596979899"
+
+    .section .data
+    .align 8
+division_error_action:
+    .quad handle_division_error     # The handler
+    .quad 0x84000000                # Flags SA_RESETHAND | SA_RESTORER
+    .quad signal_return             # The restorer, which the handler returns to
+    .quad 0                         # The signals to block while handling
+
+    .section .bss
+    .align 16
+input_buffer_size = 65536
+input_buffer:
+    .skip input_buffer_size
+input_pos:
+    .skip 8
+input_end:
+    .skip 8
+output_buffer_size = 65536
+output_buffer:
+    .skip output_buffer_size
+output_len:
+    .skip 8
 """
@@ -1,23 +1,57 @@
 import dataclasses
 
 from compiler.src import ir
-from compiler.src.intrinsics import all_intrinsics, IntrinsicArgs
-from compiler.src.ir import IRVar
+from compiler.src.intrinsics import all_intrinsics, condition_codes, emit_compare, IntrinsicArgs, \
+    negated_condition_codes
+from compiler.src.ir import IRVar, call_args, defined_vars
+from compiler.src.liveness import live_intervals, live_variables
+from compiler.src.peephole import optimize_assembly
+from compiler.src.register_allocator import allocate_registers, Allocation
 
 
 class Locals:
+    """Maps IR variables to registers or stack slots.
+
+    Variables without a register get stack slots. When their live intervals are known, variables
+    whose intervals don't overlap share a slot, so the frame grows with the number of variables
+    live at the same time instead of the total number of variables.
+    """
     _var_to_location: dict[IRVar, str]
     _stack_used: int
 
-    def __init__(self, variables: list[IRVar]) -> None:
+    def __init__(
+            self,
+            variables: list[IRVar],
+            registers: dict[IRVar, str] | None = None,
+            intervals: dict[IRVar, tuple[int, int]] | None = None,
+    ) -> None:
         self._var_to_location = {}
         self._stack_used = 0
-        offset = 8
 
+        registers = registers or {}
+        on_stack = [var for var in variables if var not in registers]
         for var in variables:
-            self._stack_used += 8
-            self._var_to_location[var] = f"-{offset}(%rbp)"
-            offset += 8
+            if var in registers:
+                self._var_to_location[var] = registers[var]
+        if intervals is None:
+            for var in on_stack:
+                self._var_to_location[var] = self.new_slot()
+            return
+
+        free_slots: list[str] = []
+        active: list[IRVar] = []
+        for var in sorted(on_stack, key=lambda v: intervals[v]):
+            start, _ = intervals[var]
+            for other in list(active):
+                if intervals[other][1] < start:
+                    active.remove(other)
+                    free_slots.append(self._var_to_location[other])
+            self._var_to_location[var] = free_slots.pop() if free_slots else self.new_slot()
+            active.append(var)
+
+    def new_slot(self) -> str:
+        self._stack_used += 8
+        return f"-{self._stack_used}(%rbp)"
 
     def get_ref(self, v: IRVar) -> str:
         return self._var_to_location[v]
@@ -47,15 +81,69 @@ def get_all_ir_variables(instructions: list[ir.Instruction]) -> list[ir.IRVar]:
     return result_list
 
 
-def generate_assembly(instructions: list[ir.Instruction]) -> str:
+def get_immediate_constants(instructions: list[ir.Instruction]) -> dict[IRVar, int]:
+    """Variables that are only ever set to the same constant, which fits in an immediate operand, with their values."""
+    constants: dict[IRVar, int] = {}
+    not_constant: set[IRVar] = set()
+    for insn in instructions:
+        match insn:
+            case ir.LoadIntConst() if -2 ** 31 <= insn.value < 2 ** 31:
+                value: int | None = insn.value
+            case ir.LoadBoolConst():
+                value = 1 if insn.value else 0
+            case _:
+                value = None
+        for var in defined_vars(insn):
+            if value is None or constants.setdefault(var, value) != value:
+                not_constant.add(var)
+    return {var: value for var, value in constants.items() if var not in not_constant}
+
+
+def generate_assembly(instructions: list[ir.Instruction], use_registers: bool = True, peephole: bool = True) -> str:
+    """Generates x86-64 assembly for the function 'main'.
+
+    With `use_registers`, variables are kept in registers chosen by `allocate_registers` where
+    possible, and only the rest live in stack slots. With `peephole`, the emitted code is cleaned
+    up by `optimize_assembly`.
+    """
     lines = []
 
     def emit(line: str) -> None:
         lines.append(line)
 
+    def is_register(ref: str) -> bool:
+        return ref.startswith('%')
+
+    def emit_move(source: str, dest: str) -> None:
+        if source == dest:
+            return
+        if is_register(source) or is_register(dest) or source.startswith('$'):
+            emit(f'movq {source}, {dest}')
+        else:
+            emit(f'movq {source}, %rax')
+            emit(f'movq %rax, {dest}')
+
+    # Constants are read as immediate operands. They only need a location if a conditional jump tests one.
+    constants = get_immediate_constants(instructions)
+    tested = {insn.cond for insn in instructions if isinstance(insn, ir.CondJump)}
+    immediates = {var for var in constants if var not in tested}
+
+    liveness = live_variables(instructions)
+    intervals = {
+        var: interval for var, interval in live_intervals(instructions, liveness).items() if var not in immediates
+    }
+    allocation = allocate_registers(instructions, intervals) if use_registers else Allocation()
     locals = Locals(
-        variables=get_all_ir_variables(instructions)
+        # Variables without an interval, such as the names of called functions, are never loaded or stored.
+        variables=[var for var in get_all_ir_variables(instructions) if var in intervals],
+        registers=allocation.registers,
+        intervals=intervals
     )
+    # 'main' follows the System V calling convention, so it preserves the callee-saved registers it uses.
+    saved_registers = allocation.used_callee_saved_registers()
+    save_slots = [locals.new_slot() for _ in saved_registers]
+    # Keep the stack 16-byte aligned at calls, as the System V ABI requires.
+    frame_size = (locals.stack_used() + 15) // 16 * 16
 
     emit(".extern print_int")
     emit(".extern print_bool")
@@ -66,56 +154,101 @@ def generate_assembly(instructions: list[ir.Instruction]) -> str:
     emit("main:")
     emit("pushq %rbp")
     emit("movq %rsp, %rbp")
-    emit(f"subq ${locals.stack_used()}, %rsp")
-
-    for insn in instructions:
+    emit(f"subq ${frame_size}, %rsp")
+    for reg, slot in zip(saved_registers, save_slots):
+        emit(f'movq {reg}, {slot}')
+
+    def jumps_on_result(i: int) -> bool:
+        """Whether the comparison at `i` only exists to be tested by the jump right after it."""
+        insn = instructions[i]
+        following = instructions[i + 1] if i + 1 < len(instructions) else None
+        return (isinstance(insn, ir.Call) and insn.fun.name in condition_codes
+                and isinstance(following, ir.CondJump) and following.cond == insn.dest
+                and not liveness.is_live_out(i + 1, insn.dest))
+
+    def operand(var: IRVar) -> str:
+        """Where an instruction reads the value of the variable from."""
+        return f'${constants[var]}' if var in constants else locals.get_ref(var)
+
+    # The condition code of a comparison whose flags the next 'CondJump' branches on directly.
+    fused_condition: str | None = None
+
+    for i, insn in enumerate(instructions):
         emit('# ' + str(insn))
+        # Jumps to the label right after them are left out, as execution falls through to it anyway.
+        following = instructions[i + 1] if i + 1 < len(instructions) else None
+        next_label = following.name if isinstance(following, ir.Label) else None
         match insn:
             case ir.Label():
                 emit(f'.L{insn.name}:')
+            case ir.LoadIntConst() | ir.LoadBoolConst() if insn.dest in immediates:
+                pass
             case ir.LoadIntConst():
+                dest = locals.get_ref(insn.dest)
                 if -2 ** 31 <= insn.value < 2 ** 31:
-                    emit(f'movq ${insn.value}, {locals.get_ref(insn.dest)}')
+                    emit(f'movq ${insn.value}, {dest}')
+                elif is_register(dest):
+                    emit(f'movabsq ${insn.value}, {dest}')
                 else:
                     emit(f'movabsq ${insn.value}, %rax')
-                    emit(f'movq %rax, {locals.get_ref(insn.dest)}')
+                    emit(f'movq %rax, {dest}')
             case ir.LoadBoolConst():
                 value = 1 if insn.value else 0
                 emit(f'movq ${value}, {locals.get_ref(insn.dest)}')
             case ir.Copy():
-                emit(f'movq {locals.get_ref(insn.source)}, %rax')
-                emit(f'movq %rax, {locals.get_ref(insn.dest)}')
+                emit_move(operand(insn.source), locals.get_ref(insn.dest))
             case ir.CondJump():
-                emit(f'cmpq $0, {locals.get_ref(insn.cond)}')
-                emit(f'jne .L{insn.then_label.name}')
-                emit(f'jmp .L{insn.else_label.name}')
+                if fused_condition is not None:
+                    condition = fused_condition
+                    fused_condition = None
+                else:
+                    emit(f'cmpq $0, {locals.get_ref(insn.cond)}')
+                    condition = 'ne'
+                if next_label == insn.then_label.name:
+                    emit(f'j{negated_condition_codes[condition]} .L{insn.else_label.name}')
+                else:
+                    emit(f'j{condition} .L{insn.then_label.name}')
+                    if next_label != insn.else_label.name:
+                        emit(f'jmp .L{insn.else_label.name}')
             case ir.Jump():
-                emit(f'jmp .L{insn.label.name}')
+                if next_label != insn.label.name:
+                    emit(f'jmp .L{insn.label.name}')
             case ir.Call():
-                args = insn.args if isinstance(insn.args, list) else [insn.args]
+                args = call_args(insn)
 
-                if insn.fun.name in all_intrinsics:
+                if jumps_on_result(i):
+                    fused_condition = emit_compare([operand(arg) for arg in args], condition_codes[insn.fun.name], emit)
+                elif insn.fun.name in all_intrinsics:
                     intrinsic = all_intrinsics[insn.fun.name]
-                    arg_refs = [locals.get_ref(arg) for arg in args]
+                    arg_refs = [operand(arg) for arg in args]
+                    dest = locals.get_ref(insn.dest)
+                    # An intrinsic may write its result register before reading its later operands.
+                    if is_register(dest) and dest not in arg_refs[1:]:
+                        result_register = dest
+                    else:
+                        result_register = '%rax'
                     intrinsic(IntrinsicArgs(
                         arg_refs=arg_refs,
-                        result_register="%rax",
+                        result_register=result_register,
                         emit=emit
                     ))
-                    if insn.dest:
-                        emit(f'movq %rax, {locals.get_ref(insn.dest)}')
+                    emit_move(result_register, dest)
                 else:
                     arg_registers = ["%rdi", "%rsi", "%rdx", "%rcx", "%r8", "%r9"]
                     for arg, reg in zip(args, arg_registers):
-                        emit(f'movq {locals.get_ref(arg)}, {reg}')
+                        emit_move(operand(arg), reg)
 
                     emit(f'call {insn.fun.name}')
 
                     if insn.dest:
-                        emit(f'movq %rax, {locals.get_ref(insn.dest)}')
+                        emit_move('%rax', locals.get_ref(insn.dest))
 
+    for reg, slot in zip(saved_registers, save_slots):
+        emit(f'movq {slot}, {reg}')
     emit("movq %rbp, %rsp")
     emit("popq %rbp")
     emit("ret")
 
-    return "\n".join(lines)
+    if peephole:
+        lines = optimize_assembly(lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+from compiler.src import ir
+from compiler.src.cfg import ControlFlowGraph, build_cfg
+from compiler.src.dead_code import remove_unreachable_code
+
+# Loop conditions of at most this many instructions are copied to the end of the loop body.
+_max_rotated_condition = 8
+
+
+def layout_blocks(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Orders the basic blocks so that as many jumps as possible fall through to the next block.
+
+    Loops are first rotated: the jump back to the condition is replaced by a copy of the condition.
+    A 'while' loop then tests its condition once before the first iteration and once at the end of
+    each iteration, like a do-while loop behind a guard, so it takes one conditional jump per
+    iteration instead of a conditional and an unconditional one.
+    """
+    cfg = build_cfg(instructions)
+    _rotate_loops(cfg)
+    cfg.link()
+    return remove_unreachable_code(cfg.instructions(_chain_blocks(cfg)))
+
+
+def _rotate_loops(cfg: ControlFlowGraph) -> None:
+    position = {name: i for i, name in enumerate(cfg.reverse_postorder())}
+    for name, block in cfg.blocks.items():
+        jump = block.terminator()
+        if not isinstance(jump, ir.Jump) or name not in position:
+            continue
+        header = cfg.blocks[jump.label.name]
+        # Only jumps back to an earlier block close a loop.
+        if header.name == name or position[header.name] > position[name]:
+            continue
+        if isinstance(header.terminator(), ir.CondJump) and len(header.instructions) - 1 <= _max_rotated_condition:
+            block.instructions[-1:] = header.instructions[1:]
+
+
+def _chain_blocks(cfg: ControlFlowGraph) -> list[str]:
+    """Places each block after the block that it is most natural to fall through from.
+
+    Blocks are taken in program order, and each is followed by a chain of successors: the target of a
+    fallthrough, the branch of a conditional jump that comes first in the program, or the target of
+    an unconditional jump that nothing else jumps to. Unreachable blocks are left out.
+
+    The last block in program order falls off the end of the program when it doesn't end in a jump,
+    so its chain is placed last. If that is the chain of the entry block, which has to stay first,
+    the last block is split off and reached with a jump instead.
+    """
+    names = list(cfg.blocks)
+    program_order = {name: i for i, name in enumerate(names)}
+    reachable = set(cfg.postorder())
+    chains: list[list[str]] = []
+    placed: set[str] = set()
+
+    def next_in_chain(block_name: str) -> str | None:
+        block = cfg.blocks[block_name]
+        candidates = [succ for succ in block.successors if succ not in placed]
+        if isinstance(block.terminator(), ir.Jump):
+            candidates = [succ for succ in candidates if len(cfg.blocks[succ].predecessors) == 1]
+        return min(candidates, key=program_order.__getitem__, default=None)
+
+    for name in names:
+        chain: list[str] = []
+        current: str | None = name
+        while current is not None and current in reachable and current not in placed:
+            chain.append(current)
+            placed.add(current)
+            current = next_in_chain(current)
+        if chain:
+            chains.append(chain)
+
+    exit_chain = next((chain for chain in chains if chain[-1] == names[-1]), None)
+    if exit_chain is not None and cfg.blocks[names[-1]].terminator() is None:
+        if exit_chain is chains[0] and len(chains) > 1:
+            chains.append([exit_chain.pop()])
+        else:
+            chains.remove(exit_chain)
+            chains.append(exit_chain)
+    return [name for chain in chains for name in chain]
@@ -0,0 +1,144 @@
+from dataclasses import dataclass, field
+
+from compiler.src import ir
+from compiler.src.tokenizer import SourceLocation, L
+
+
+@dataclass
+class BasicBlock:
+    """A run of instructions that is only entered at the top and only left at the bottom.
+
+    If the block starts with a label, the label is its first instruction. A block that doesn't end
+    in a jump falls through to its only successor.
+    """
+    name: str
+    instructions: list[ir.Instruction]
+    successors: list[str] = field(default_factory=list)
+    predecessors: list[str] = field(default_factory=list)
+
+    def label(self) -> ir.Label | None:
+        if self.instructions and isinstance(self.instructions[0], ir.Label):
+            return self.instructions[0]
+        return None
+
+    def terminator(self) -> ir.Jump | ir.CondJump | None:
+        if self.instructions and isinstance(self.instructions[-1], (ir.Jump, ir.CondJump)):
+            return self.instructions[-1]
+        return None
+
+
+@dataclass
+class ControlFlowGraph:
+    """Basic blocks in program order. The entry block has no label and no predecessors."""
+    blocks: dict[str, BasicBlock]
+    entry: str = 'entry'
+    # The number after each prefix that new_block_name tries first, so that it doesn't try every number again.
+    _next_number: dict[str, int] = field(default_factory=dict, repr=False)
+
+    def new_block_name(self, prefix: str) -> str:
+        n = self._next_number.get(prefix, 1)
+        while f'{prefix}{n}' in self.blocks:
+            n += 1
+        self._next_number[prefix] = n + 1
+        return f'{prefix}{n}'
+
+    def postorder(self) -> list[str]:
+        """Blocks reachable from the entry, each listed after all of its successors (ignoring back edges).
+
+        Successors are visited last to first. In reverse postorder, the body of a loop, which is the
+        first successor of its condition, then comes right after the loop header instead of after
+        all the code that follows the loop.
+        """
+        order: list[str] = []
+        visited = {self.entry}
+        stack = [(self.entry, reversed(self.blocks[self.entry].successors))]
+        while stack:
+            name, successors = stack[-1]
+            for succ in successors:
+                if succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, reversed(self.blocks[succ].successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(name)
+        return order
+
+    def reverse_postorder(self) -> list[str]:
+        return self.postorder()[::-1]
+
+    def link(self) -> None:
+        """Recomputes successors and predecessors from the instructions and the block order."""
+        names = list(self.blocks)
+        for block in self.blocks.values():
+            block.predecessors = []
+        for i, block in enumerate(self.blocks.values()):
+            match block.terminator():
+                case ir.Jump() as jump:
+                    block.successors = [jump.label.name]
+                case ir.CondJump() as cond_jump:
+                    block.successors = [cond_jump.then_label.name, cond_jump.else_label.name]
+                case _:
+                    block.successors = [names[i + 1]] if i + 1 < len(names) else []
+        for block in self.blocks.values():
+            for succ in block.successors:
+                if block.name not in self.blocks[succ].predecessors:
+                    self.blocks[succ].predecessors.append(block.name)
+
+    def instructions(self, order: list[str] | None = None) -> list[ir.Instruction]:
+        """Flattens the blocks back into an instruction list, laid out in the given order.
+
+        Jumps are added where a block falls through to a successor that is not laid out next.
+        Blocks missing from `order` are left out. A block that falls off the end of the program has
+        nowhere to jump to, so it must be laid out last.
+        """
+        order = order if order is not None else list(self.blocks)
+        result: list[ir.Instruction] = []
+        for i, name in enumerate(order):
+            block = self.blocks[name]
+            result.extend(block.instructions)
+            if block.terminator() is None and not block.successors:
+                assert i + 1 == len(order), f'Block {name} falls off the end of the program but is not last'
+            elif block.terminator() is None:
+                succ = block.successors[0]
+                if i + 1 >= len(order) or order[i + 1] != succ:
+                    result.append(ir.Jump(_location(block), self._ensure_label(succ)))
+        return result
+
+    def _ensure_label(self, name: str) -> ir.Label:
+        block = self.blocks[name]
+        label = block.label()
+        if label is None:
+            label = ir.Label(_location(block), name)
+            block.instructions.insert(0, label)
+        return label
+
+
+def _location(block: BasicBlock) -> SourceLocation:
+    return block.instructions[-1].location if block.instructions else L
+
+
+def build_cfg(instructions: list[ir.Instruction]) -> ControlFlowGraph:
+    """Splits the instructions into basic blocks at labels and after jumps.
+
+    Every instruction ends up in exactly one block, and the blocks keep the order of the instructions.
+    """
+    cfg = ControlFlowGraph({'entry': BasicBlock('entry', [])})
+    current = cfg.blocks['entry']
+    taken_names = {'entry', *(insn.name for insn in instructions if isinstance(insn, ir.Label))}
+    unnamed = 0
+
+    for insn in instructions:
+        if isinstance(insn, ir.Label):
+            current = cfg.blocks[insn.name] = BasicBlock(insn.name, [insn])
+            continue
+        if current.terminator() is not None:
+            # Code after a jump with no label in between is unreachable, but it gets a block like any other.
+            unnamed += 1
+            while f'block{unnamed}' in taken_names:
+                unnamed += 1
+            current = cfg.blocks[f'block{unnamed}'] = BasicBlock(f'block{unnamed}', [])
+        current.instructions.append(insn)
+
+    cfg.link()
+    return cfg
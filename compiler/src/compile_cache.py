@@ -0,0 +1,234 @@
+import dataclasses
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import cache
+from os import path
+from typing import Any
+
+from compiler.src.private_directory import make_private_directory
+from compiler.src.tokenizer import SourceLocation, Token
+
+
+@cache
+def compiler_fingerprint() -> str:
+    """Hash of the compiler's own source, so that cached results never outlive the code that produced them."""
+    digest = hashlib.sha256()
+    src_dir = path.dirname(path.abspath(__file__))
+    for name in sorted(os.listdir(src_dir)):
+        if name.endswith('.py'):
+            with open(path.join(src_dir, name), 'rb') as f:
+                digest.update(name.encode())
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def source_key(source_code: str) -> str:
+    return _key('source', source_code)
+
+
+def token_key(tokens: list[Token]) -> str:
+    """Key of a token stream, ignoring token locations."""
+    return _key('tokens', repr([(token.type, token.text) for token in tokens]))
+
+
+def ast_key(ast: Any) -> str:
+    """Key of a (type checked) AST, ignoring node locations."""
+    return _key('ast', repr(_without_locations(ast)))
+
+
+def ir_key(instructions: list[Any]) -> str:
+    """Key of an IR instruction list, ignoring instruction locations."""
+    return _key('ir', '\n'.join(str(insn) for insn in instructions))
+
+
+def _key(stage: str, text: str) -> str:
+    return hashlib.sha256(f'{compiler_fingerprint()}:{stage}:{text}'.encode()).hexdigest()
+
+
+def _without_locations(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj):
+        return type(obj).__name__, tuple(
+            _without_locations(getattr(obj, field.name))
+            for field in dataclasses.fields(obj)
+            if field.name != 'location'
+        )
+    if isinstance(obj, list):
+        return tuple(_without_locations(e) for e in obj)
+    return obj
+
+
+def location_mapping(old: Any, new: Any) -> dict[tuple[int, int], SourceLocation]:
+    """Pairs up the locations of two structures that are equal apart from their locations,
+    such as the token streams of two sources that only differ in whitespace and comments."""
+    old_locations: list[SourceLocation] = []
+    new_locations: list[SourceLocation] = []
+    _collect_locations(old, old_locations)
+    _collect_locations(new, new_locations)
+    return {(o.line, o.column): n for o, n in zip(old_locations, new_locations)}
+
+
+def relocate(obj: Any, mapping: dict[tuple[int, int], SourceLocation]) -> Any:
+    """Returns a copy of `obj` with every location replaced according to `mapping`."""
+    if isinstance(obj, SourceLocation):
+        return mapping.get((obj.line, obj.column), obj)
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.replace(obj, **{
+            field.name: relocate(getattr(obj, field.name), mapping)
+            for field in dataclasses.fields(obj)
+            if field.init
+        })
+    if isinstance(obj, list):
+        return [relocate(e, mapping) for e in obj]
+    return obj
+
+
+def _collect_locations(obj: Any, out: list[SourceLocation]) -> None:
+    if isinstance(obj, SourceLocation):
+        out.append(obj)
+    elif dataclasses.is_dataclass(obj):
+        for field in dataclasses.fields(obj):
+            _collect_locations(getattr(obj, field.name), out)
+    elif isinstance(obj, list):
+        for e in obj:
+            _collect_locations(e, out)
+
+
+class CompileCache:
+    """LRU cache of compilation results, keyed by a hash such as `source_key`.
+
+    Entries are kept in memory up to `max_entries` entries and `max_bytes` bytes (measured as the
+    size of the pickled entry). If `disk_dir` is given, entries are also written there, so that they
+    survive restarts and are shared between worker processes. The disk tier is limited to
+    `max_disk_bytes` and evicts the least recently used files first. To avoid scanning the directory on
+    every write, each instance adds up what it writes on top of the usage found by its last scan, and
+    only scans again once that goes over the limit. Writes from other processes are not counted until
+    then, so with several processes the directory can go over the limit for a while.
+
+    Entries are read back from `disk_dir` with `pickle`, so anything that can write to it can run code
+    in this process. It must be private to the service: it is created with mode 0700, and a
+    PermissionError is raised if it is not owned by the current user or others can write to it.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 256,
+            max_bytes: int = 64 * 1024 * 1024,
+            disk_dir: str | None = None,
+            max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._bytes_used = 0
+        self._lock = threading.Lock()
+        self._disk_bytes_used = 0
+        if disk_dir is not None:
+            make_private_directory(disk_dir)
+            self._disk_bytes_used = self._evict_from_disk()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        blob = self._read_from_disk(key)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        value = pickle.loads(blob)
+        with self._lock:
+            self.hits += 1
+            self._insert(key, value, len(blob))
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value)
+        with self._lock:
+            self._insert(key, value, len(blob))
+        self._write_to_disk(key, blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes_used = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, key: str, value: Any, size: int) -> None:
+        if key in self._entries:
+            self._bytes_used -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._bytes_used += size
+        while len(self._entries) > self.max_entries or self._bytes_used > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes_used -= evicted_size
+
+    def _disk_path(self, key: str) -> str:
+        assert self.disk_dir is not None
+        return path.join(self.disk_dir, f'{key}.pickle')
+
+    def _read_from_disk(self, key: str) -> bytes | None:
+        if self.disk_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                blob = f.read()
+            # Refresh the modification time, which the disk tier uses as its LRU order.
+            os.utime(self._disk_path(key))
+            return blob
+        except OSError:
+            return None
+
+    def _write_to_disk(self, key: str, blob: bytes) -> None:
+        if self.disk_dir is None or len(blob) > self.max_disk_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, self._disk_path(key))
+        with self._lock:
+            # Replacing an existing file counts it twice, which only makes the next scan come sooner.
+            self._disk_bytes_used += len(blob)
+            over_limit = self._disk_bytes_used > self.max_disk_bytes
+        if over_limit:
+            disk_bytes_used = self._evict_from_disk()
+            with self._lock:
+                self._disk_bytes_used = disk_bytes_used
+
+    def _evict_from_disk(self) -> int:
+        """Removes the least recently used files until the disk tier fits in its limit, and returns the
+        number of bytes that remain."""
+        assert self.disk_dir is not None
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.pickle'):
+                try:
+                    entry_stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+        disk_used = sum(size for _, size, _ in files)
+        for _, size, file_path in sorted(files):
+            if disk_used <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            disk_used -= size
+        return disk_used
@@ -0,0 +1,47 @@
+from compiler.src import ir
+from compiler.src.intrinsics import all_evaluators
+from compiler.src.ir import IRVar, call_args
+
+
+def fold_constants(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Evaluates intrinsic calls on known values at compile time.
+
+    Values are known from constant loads and propagated through copies. Since a label can be
+    reached from several places, nothing is known right after one. Conditional jumps on a known
+    condition become unconditional jumps.
+    """
+    known: dict[IRVar, int | bool] = {}
+    result: list[ir.Instruction] = []
+
+    def load_const(loc, value: int | bool, dest: IRVar) -> ir.Instruction:
+        known[dest] = value
+        if isinstance(value, bool):
+            return ir.LoadBoolConst(loc, value, dest)
+        return ir.LoadIntConst(loc, value, dest)
+
+    for insn in instructions:
+        loc = insn.location
+        match insn:
+            case ir.Label():
+                known.clear()
+            case ir.LoadIntConst() | ir.LoadBoolConst():
+                known[insn.dest] = insn.value
+            case ir.Copy():
+                if insn.source in known:
+                    insn = load_const(loc, known[insn.source], insn.dest)
+                else:
+                    known.pop(insn.dest, None)
+            case ir.Call():
+                args = call_args(insn)
+                value = None
+                if insn.fun.name in all_evaluators and all(arg in known for arg in args):
+                    value = all_evaluators[insn.fun.name](*[known[arg] for arg in args])
+                if value is not None:
+                    insn = load_const(loc, value, insn.dest)
+                else:
+                    known.pop(insn.dest, None)
+            case ir.CondJump():
+                if insn.cond in known:
+                    insn = ir.Jump(loc, insn.then_label if known[insn.cond] else insn.else_label)
+        result.append(insn)
+    return result
@@ -0,0 +1,68 @@
+from compiler.src import ir
+from compiler.src.ir import IRVar, defined_vars, used_vars, with_used_vars, with_dest
+from compiler.src.liveness import live_variables
+
+# How far back `coalesce_copies` looks for the instruction that computed a copied value.
+_coalesce_window = 16
+
+
+def propagate_copies(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Replaces reads of a copy's destination with reads of its source, within straight-line code.
+
+    The copies themselves are left for `eliminate_dead_code` to remove once nothing reads them.
+    """
+    copies: dict[IRVar, IRVar] = {}
+    copied_from: dict[IRVar, set[IRVar]] = {}
+    result: list[ir.Instruction] = []
+
+    def forget(var: IRVar) -> None:
+        source = copies.pop(var, None)
+        if source is not None:
+            copied_from[source].discard(var)
+        for dest in copied_from.pop(var, set()):
+            del copies[dest]
+
+    for insn in instructions:
+        if isinstance(insn, ir.Label):
+            copies.clear()
+            copied_from.clear()
+        insn = with_used_vars(insn, lambda v: copies.get(v, v))
+        if isinstance(insn, ir.Copy) and insn.source == insn.dest:
+            continue
+        for var in defined_vars(insn):
+            forget(var)
+        if isinstance(insn, ir.Copy):
+            copies[insn.dest] = insn.source
+            copied_from.setdefault(insn.source, set()).add(insn.dest)
+        result.append(insn)
+    return result
+
+
+def coalesce_copies(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Makes the instruction that computes a temporary write directly to the variable it is then copied to.
+
+    For example 'Call(+, [x, y], t); Copy(t, z)' becomes 'Call(+, [x, y], z)' when 't' is not read afterwards.
+    This removes most of the copies the IR generator emits for variable declarations and assignments.
+    """
+    liveness = live_variables(instructions)
+    result = list(instructions)
+    removed = [False] * len(result)
+
+    for j, insn in enumerate(instructions):
+        if not isinstance(insn, ir.Copy) or liveness.is_live_out(j, insn.source):
+            continue
+        temp, dest = insn.source, insn.dest
+        for i in range(j - 1, max(j - _coalesce_window, -1), -1):
+            if removed[i]:
+                continue
+            candidate = result[i]
+            if isinstance(candidate, (ir.Label, ir.Jump, ir.CondJump)):
+                break
+            if temp in defined_vars(candidate):
+                result[i] = with_dest(candidate, dest)
+                removed[j] = True
+                break
+            if temp in used_vars(candidate) or dest in used_vars(candidate) or dest in defined_vars(candidate):
+                break
+
+    return [insn for insn, r in zip(result, removed) if not r]
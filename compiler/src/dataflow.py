@@ -0,0 +1,207 @@
+import heapq
+from dataclasses import dataclass
+from typing import Generic, Hashable, Iterable, TypeVar
+
+from compiler.src import ir
+from compiler.src.cfg import ControlFlowGraph
+from compiler.src.intrinsics import all_intrinsics
+from compiler.src.ir import IRVar, call_args, defined_vars
+
+T = TypeVar('T', bound=Hashable)
+
+
+class BitSetUniverse(Generic[T]):
+    """Numbers a collection of items, so that sets of them can be stored as the bits of an int."""
+
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        self.items: list[T] = []
+        self.index: dict[T, int] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: T) -> int:
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+        return self.index[item]
+
+    def bit(self, item: T) -> int:
+        return 1 << self.index[item]
+
+    def bits(self, items: Iterable[T]) -> int:
+        result = 0
+        for item in items:
+            result |= 1 << self.index[item]
+        return result
+
+    def full(self) -> int:
+        return (1 << len(self.items)) - 1
+
+    def members(self, bits: int) -> list[T]:
+        result = []
+        while bits:
+            lowest = bits & -bits
+            result.append(self.items[lowest.bit_length() - 1])
+            bits ^= lowest
+        return result
+
+
+@dataclass
+class DataflowResult:
+    """The facts holding at the start and at the end of each block, as bitsets."""
+    block_in: dict[str, int]
+    block_out: dict[str, int]
+
+
+def solve_dataflow(
+        cfg: ControlFlowGraph,
+        gen: dict[str, int],
+        kill: dict[str, int],
+        forward: bool,
+        may: bool,
+        full: int = 0,
+        boundary: int = 0,
+) -> DataflowResult:
+    """Solves a gen/kill dataflow problem over the blocks of `cfg` with a worklist.
+
+    A forward problem computes 'out = gen | (in & ~kill)' from the facts flowing in from the
+    predecessors, and a backward one computes 'in = gen | (out & ~kill)' from the successors.
+    The facts of several neighbours are combined with union for 'may' problems and with
+    intersection for 'must' problems, whose sets start out as `full`. `boundary` holds at the
+    entry (forward) or at the exits (backward).
+
+    The worklist always hands out the pending block that comes first in reverse postorder (forward)
+    or postorder (backward). Acyclic code then converges in a single pass, and a change flowing
+    around a loop settles before it is carried on to the code after the loop.
+    """
+    order = cfg.reverse_postorder() if forward else cfg.postorder()
+    reachable = set(order)
+    initial = 0 if may else full
+    block_in = {name: initial for name in cfg.blocks}
+    block_out = {name: initial for name in cfg.blocks}
+
+    def sources(name: str) -> list[str]:
+        block = cfg.blocks[name]
+        neighbours = block.predecessors if forward else block.successors
+        return [n for n in neighbours if n in reachable]
+
+    def targets(name: str) -> list[str]:
+        block = cfg.blocks[name]
+        return block.successors if forward else block.predecessors
+
+    position = {name: i for i, name in enumerate(order)}
+    worklist = list(range(len(order)))
+    queued = set(order)
+    while worklist:
+        name = order[heapq.heappop(worklist)]
+        queued.discard(name)
+
+        incoming = sources(name)
+        if not incoming:
+            meet = boundary
+        elif may:
+            meet = 0
+            for n in incoming:
+                meet |= (block_out if forward else block_in)[n]
+        else:
+            meet = full
+            for n in incoming:
+                meet &= (block_out if forward else block_in)[n]
+        result = gen[name] | (meet & ~kill[name])
+
+        if forward:
+            block_in[name] = meet
+            changed = result != block_out[name]
+            block_out[name] = result
+        else:
+            block_out[name] = meet
+            changed = result != block_in[name]
+            block_in[name] = result
+
+        if changed:
+            for n in targets(name):
+                if n in reachable and n not in queued:
+                    queued.add(n)
+                    heapq.heappush(worklist, position[n])
+
+    return DataflowResult(block_in, block_out)
+
+
+def reaching_definitions(
+        cfg: ControlFlowGraph,
+        variables: Iterable[IRVar] | None = None,
+) -> tuple[BitSetUniverse[tuple[str, int]], DataflowResult]:
+    """Which definitions, identified by block name and instruction index, may reach each block.
+
+    With `variables`, only their definitions are tracked, which keeps the bitsets narrow. A definition
+    can reach every block after it, so over all definitions the time grows with the number of blocks
+    times the number of definitions.
+    """
+    tracked = set(variables) if variables is not None else None
+    definitions: BitSetUniverse[tuple[str, int]] = BitSetUniverse()
+    definitions_of: dict[IRVar, int] = {}
+    for name, block in cfg.blocks.items():
+        for i, insn in enumerate(block.instructions):
+            for var in defined_vars(insn):
+                if tracked is not None and var not in tracked:
+                    continue
+                bit = 1 << definitions.add((name, i))
+                definitions_of[var] = definitions_of.get(var, 0) | bit
+
+    gen: dict[str, int] = {}
+    kill: dict[str, int] = {}
+    for name, block in cfg.blocks.items():
+        block_gen = 0
+        block_kill = 0
+        for i, insn in enumerate(block.instructions):
+            for var in defined_vars(insn):
+                if var not in definitions_of:
+                    continue
+                block_gen &= ~definitions_of[var]
+                block_gen |= definitions.bit((name, i))
+                block_kill |= definitions_of[var]
+        gen[name] = block_gen
+        kill[name] = block_kill & ~block_gen
+
+    return definitions, solve_dataflow(cfg, gen, kill, forward=True, may=True)
+
+
+Expression = tuple[str, tuple[IRVar, ...]]
+
+
+def expression_of(insn: ir.Instruction) -> Expression | None:
+    """The intrinsic operation an instruction computes, if any."""
+    if isinstance(insn, ir.Call) and insn.fun.name in all_intrinsics:
+        return insn.fun.name, tuple(call_args(insn))
+    return None
+
+
+def available_expressions(cfg: ControlFlowGraph) -> tuple[BitSetUniverse[Expression], DataflowResult]:
+    """Which intrinsic operations have been computed on every path to each block, with their operands
+    unchanged since."""
+    expressions: BitSetUniverse[Expression] = BitSetUniverse()
+    expressions_using: dict[IRVar, int] = {}
+    for block in cfg.blocks.values():
+        for insn in block.instructions:
+            expression = expression_of(insn)
+            if expression is not None:
+                bit = 1 << expressions.add(expression)
+                for var in expression[1]:
+                    expressions_using[var] = expressions_using.get(var, 0) | bit
+
+    gen: dict[str, int] = {}
+    kill: dict[str, int] = {}
+    for name, block in cfg.blocks.items():
+        block_gen = 0
+        block_kill = 0
+        for insn in block.instructions:
+            expression = expression_of(insn)
+            if expression is not None:
+                block_gen |= expressions.bit(expression)
+            for var in defined_vars(insn):
+                block_gen &= ~expressions_using.get(var, 0)
+                block_kill |= expressions_using.get(var, 0)
+        gen[name] = block_gen
+        kill[name] = block_kill
+
+    return expressions, solve_dataflow(cfg, gen, kill, forward=True, may=False, full=expressions.full())
@@ -0,0 +1,45 @@
+from compiler.src import ir
+from compiler.src.intrinsics import all_intrinsics, trapping_intrinsics
+from compiler.src.cfg import build_cfg
+from compiler.src.liveness import Liveness, live_variables
+
+
+def eliminate_dead_code(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Removes instructions whose only effect is to write a variable that is not read afterwards.
+
+    Calls to runtime functions and to intrinsics that may trap are kept for their side effects.
+    """
+    liveness = live_variables(instructions)
+    return [insn for i, insn in enumerate(instructions) if not _is_dead(insn, i, liveness)]
+
+
+def _is_dead(insn: ir.Instruction, i: int, liveness: Liveness) -> bool:
+    match insn:
+        case ir.LoadIntConst() | ir.LoadBoolConst() | ir.Copy():
+            return not liveness.is_live_out(i, insn.dest)
+        case ir.Call():
+            return (insn.fun.name in all_intrinsics
+                    and insn.fun.name not in trapping_intrinsics
+                    and not liveness.is_live_out(i, insn.dest))
+    return False
+
+
+def remove_unreachable_code(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Removes instructions that control never reaches, jumps to the very next instruction,
+    and labels that nothing jumps to."""
+    cfg = build_cfg(instructions)
+    reachable = set(cfg.postorder())
+    result = [insn for name, block in cfg.blocks.items() if name in reachable for insn in block.instructions]
+    result = [
+        insn for insn, following in zip(result, result[1:] + [None])
+        if not (isinstance(insn, ir.Jump) and isinstance(following, ir.Label) and insn.label.name == following.name)
+    ]
+    targets = set()
+    for insn in result:
+        match insn:
+            case ir.Jump():
+                targets.add(insn.label.name)
+            case ir.CondJump():
+                targets.add(insn.then_label.name)
+                targets.add(insn.else_label.name)
+    return [insn for insn in result if not isinstance(insn, ir.Label) or insn.name in targets]
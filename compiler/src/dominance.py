@@ -0,0 +1,172 @@
+from dataclasses import dataclass, field
+
+from compiler.src import ir
+from compiler.src.cfg import BasicBlock, ControlFlowGraph
+from compiler.src.ir import with_target
+
+
+def immediate_dominators(cfg: ControlFlowGraph) -> dict[str, str]:
+    """Maps each block reachable from the entry to its immediate dominator. The entry maps to itself.
+
+    Uses the iterative algorithm of Cooper, Harvey and Kennedy, "A Simple, Fast Dominance Algorithm".
+    """
+    order = cfg.reverse_postorder()
+    position = {name: i for i, name in enumerate(order)}
+    idom = {cfg.entry: cfg.entry}
+
+    def intersect(a: str, b: str) -> str:
+        while a != b:
+            while position[a] > position[b]:
+                a = idom[a]
+            while position[b] > position[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for name in order[1:]:
+            processed = [pred for pred in cfg.blocks[name].predecessors if pred in idom]
+            new_idom = processed[0]
+            for pred in processed[1:]:
+                new_idom = intersect(pred, new_idom)
+            if idom.get(name) != new_idom:
+                idom[name] = new_idom
+                changed = True
+    return idom
+
+
+class DominatorTree:
+    """The immediate dominators of the reachable blocks, numbered so that dominance can be tested in
+    constant time: a block dominates another if the other one is visited within its own visit in a
+    depth-first walk of the tree."""
+
+    def __init__(self, cfg: ControlFlowGraph) -> None:
+        self.idom = immediate_dominators(cfg)
+        children: dict[str, list[str]] = {name: [] for name in self.idom}
+        for name, parent in self.idom.items():
+            if name != parent:
+                children[parent].append(name)
+
+        self._enter: dict[str, float] = {}
+        self._leave: dict[str, float] = {}
+        clock = 0
+        stack = [(cfg.entry, False)]
+        while stack:
+            name, leaving = stack.pop()
+            clock += 1
+            if leaving:
+                self._leave[name] = clock
+            else:
+                self._enter[name] = clock
+                stack.append((name, True))
+                stack.extend((child, False) for child in children[name])
+
+    def dominates(self, a: str, b: str) -> bool:
+        """Whether every path from the entry to block `b` goes through block `a`."""
+        return self._enter[a] <= self._enter[b] and self._leave[b] <= self._leave[a]
+
+    def insert_above(self, name: str, block: str) -> None:
+        """Adds a new block that is the only way into `block` from outside the blocks it dominates."""
+        self.idom[name] = self.idom[block]
+        self.idom[block] = name
+        self._enter[name] = self._enter[block] - 0.5
+        self._leave[name] = self._leave[block] + 0.5
+
+
+def dominance_frontiers(cfg: ControlFlowGraph, idom: dict[str, str]) -> dict[str, set[str]]:
+    """For each block, the blocks where its dominance ends: those it doesn't strictly dominate,
+    but which have a predecessor that it dominates."""
+    frontiers: dict[str, set[str]] = {name: set() for name in idom}
+    for name in idom:
+        predecessors = [pred for pred in cfg.blocks[name].predecessors if pred in idom]
+        if len(predecessors) < 2:
+            continue
+        for pred in predecessors:
+            runner = pred
+            while runner != idom[name]:
+                frontiers[runner].add(name)
+                runner = idom[runner]
+    return frontiers
+
+
+@dataclass
+class Loop:
+    """A natural loop: the blocks that can reach a back edge to the header without going through the header."""
+    header: str
+    blocks: set[str] = field(default_factory=set)
+
+    def exits(self, cfg: ControlFlowGraph) -> list[tuple[str, str]]:
+        """The edges from a block in the loop to a block outside it."""
+        return [
+            (name, succ) for name in self.blocks for succ in cfg.blocks[name].successors if succ not in self.blocks
+        ]
+
+
+def natural_loops(cfg: ControlFlowGraph, dominators: DominatorTree) -> list[Loop]:
+    """Finds the loops of the graph, innermost first. Back edges to the same header make up one loop."""
+    idom = dominators.idom
+    loops: dict[str, Loop] = {}
+    for name in idom:
+        for succ in cfg.blocks[name].successors:
+            if succ in idom and dominators.dominates(succ, name):
+                loop = loops.setdefault(succ, Loop(succ, {succ}))
+                stack = [name]
+                while stack:
+                    block = stack.pop()
+                    if block not in loop.blocks:
+                        loop.blocks.add(block)
+                        stack.extend(pred for pred in cfg.blocks[block].predecessors if pred in idom)
+    return sorted(loops.values(), key=lambda loop: len(loop.blocks))
+
+
+def enclosing_loops(loops: list[Loop]) -> dict[str, list[Loop]]:
+    """For the header of each loop, the other loops that contain it.
+
+    This walks the blocks of each loop once, rather than comparing every pair of loops.
+    """
+    enclosing: dict[str, list[Loop]] = {loop.header: [] for loop in loops}
+    for loop in loops:
+        for name in loop.blocks:
+            if name in enclosing and name != loop.header:
+                enclosing[name].append(loop)
+    return enclosing
+
+
+def insert_preheader(cfg: ControlFlowGraph, loop: Loop, instructions: list[ir.Instruction]) -> str:
+    """Adds a new block with the given instructions, and makes every edge into the loop from outside go
+    through it. Returns the name of the new block.
+
+    The block is added last, so it must be laid out with `order_with_preheaders`.
+    """
+    header = cfg.blocks[loop.header]
+    header_label = header.label()
+    assert header_label is not None
+    name = cfg.new_block_name('preheader')
+    label = ir.Label(header_label.location, name)
+    preheader = BasicBlock(name, [label, *instructions], successors=[loop.header])
+
+    for pred_name in header.predecessors:
+        if pred_name in loop.blocks:
+            continue
+        pred = cfg.blocks[pred_name]
+        terminator = pred.terminator()
+        if terminator is not None:
+            pred.instructions[-1] = with_target(terminator, loop.header, label)
+        pred.successors = [name if succ == loop.header else succ for succ in pred.successors]
+        preheader.predecessors.append(pred_name)
+    header.predecessors = [pred for pred in header.predecessors if pred in loop.blocks] + [name]
+    cfg.blocks[name] = preheader
+    return name
+
+
+def order_with_preheaders(cfg: ControlFlowGraph, preheaders: dict[str, str]) -> list[str]:
+    """The blocks in program order, with the preheader of each loop header right before it."""
+    placed = set(preheaders.values())
+    order: list[str] = []
+    for name in cfg.blocks:
+        if name not in placed:
+            if name in preheaders:
+                order.append(preheaders[name])
+            order.append(name)
+    return order
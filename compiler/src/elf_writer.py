@@ -0,0 +1,146 @@
+import functools
+import os
+import struct
+
+from compiler.src.assembler import stdlib_asm_code
+from compiler.src.machine_code import EncodingException, ObjectCode, assemble_object
+
+# The address the executable is loaded at, which is also what 'ld' uses for static executables.
+base_address = 0x400000
+
+_page_size = 0x1000
+_elf_header_size = 64
+_program_header_size = 56
+
+# Segment types and permissions in the program headers.
+_PT_LOAD = 1
+_PT_GNU_STACK = 0x6474e551
+_PF_X, _PF_W, _PF_R = 1, 2, 4
+
+
+@functools.cache
+def runtime_object() -> ObjectCode:
+    """The runtime in `stdlib_asm_code`, encoded once per process and then linked into every executable."""
+    return assemble_object(stdlib_asm_code)
+
+
+def build_executable(assembly_code: str) -> bytes:
+    """Encodes the assembly and links it with the runtime into a static x86-64 Linux executable, without
+    running 'as' or 'ld'."""
+    return link([assemble_object(assembly_code), runtime_object()])
+
+
+def write_executable(assembly_code: str, output_file: str) -> None:
+    """Like `assembler.assemble`, but with `build_executable`."""
+    executable = build_executable(assembly_code)
+    with open(output_file, 'wb') as f:
+        f.write(executable)
+    os.chmod(output_file, 0o755)
+
+
+def link(objects: list[ObjectCode], entry: str = '_start') -> bytes:
+    """Lays out the objects in a static ELF64 executable and fills in their relocations.
+
+    Code and read-only data go in one segment that can be read and executed, and data and '.bss'
+    in another that can be read and written. The symbols of each object that are not global are
+    only visible to that object.
+    """
+    headers_size = _elf_header_size + 3 * _program_header_size
+
+    # The offset of each section of each object, in the file for the first segment and in memory for the second.
+    offsets: list[dict[str, int]] = [{} for _ in objects]
+    image = bytearray(headers_size)
+    for section in ('.text', '.rodata'):
+        for obj, obj_offsets in zip(objects, offsets):
+            image += bytes(-len(image) % max(obj.alignments[section], 16))
+            obj_offsets[section] = len(image)
+            image += obj.sections[section]
+    code_size = len(image)
+
+    data = bytearray()
+    data_offset = code_size + -code_size % 16
+    for obj, obj_offsets in zip(objects, offsets):
+        data += bytes(-(data_offset + len(data)) % max(obj.alignments['.data'], 16))
+        obj_offsets['.data'] = len(data)
+        data += obj.sections['.data']
+    data_size = len(data)
+    for obj, obj_offsets in zip(objects, offsets):
+        data_size += -(data_offset + data_size) % max(obj.alignments['.bss'], 16)
+        obj_offsets['.bss'] = data_size
+        data_size += obj.bss_size
+    # The data segment starts on a new page, at an address with the same offset within its page as in the file.
+    data_address = (base_address + data_offset + _page_size - 1) // _page_size * _page_size + data_offset % _page_size
+
+    def address(obj_offsets: dict[str, int], section: str | None, value: int) -> int:
+        if section is None:
+            return value
+        if section in ('.data', '.bss'):
+            return data_address + obj_offsets[section] + value
+        return base_address + obj_offsets[section] + value
+
+    global_symbols: dict[str, int] = {}
+    for obj, obj_offsets in zip(objects, offsets):
+        for name in obj.global_symbols:
+            if name in global_symbols:
+                raise EncodingException(f'Symbol {name} is defined more than once')
+            global_symbols[name] = address(obj_offsets, *obj.symbols[name])
+    if entry not in global_symbols:
+        raise EncodingException(f'Entry point {entry} is not defined')
+
+    for obj, obj_offsets in zip(objects, offsets):
+        for relocation in obj.relocations:
+            if relocation.symbol in obj.symbols:
+                target = address(obj_offsets, *obj.symbols[relocation.symbol])
+            elif relocation.symbol in global_symbols:
+                target = global_symbols[relocation.symbol]
+            else:
+                raise EncodingException(f'Undefined reference to {relocation.symbol}')
+            place = address(obj_offsets, relocation.section, relocation.offset)
+            value = target + relocation.addend
+            match relocation.kind:
+                case 'pc32':
+                    value -= place
+                    size = 4
+                case 'abs32s':
+                    size = 4
+                case _:
+                    size = 8
+                    value %= 2 ** 64
+            if size == 4 and not -2 ** 31 <= value < 2 ** 31:
+                raise EncodingException(f'Relocation against {relocation.symbol} does not fit in 32 bits')
+            contents = data if relocation.section == '.data' else image
+            start = obj_offsets[relocation.section] + relocation.offset
+            contents[start:start + size] = (value % 2 ** (8 * size)).to_bytes(size, 'little')
+
+    image += bytes(data_offset - code_size) + data
+    image[:headers_size] = _elf_header(global_symbols[entry], 3) + b''.join([
+        _program_header(_PT_LOAD, _PF_R | _PF_X, 0, base_address, code_size, code_size),
+        _program_header(_PT_LOAD, _PF_R | _PF_W, data_offset, data_address, len(data), data_size),
+        _program_header(_PT_GNU_STACK, _PF_R | _PF_W, 0, 0, 0, 0),
+    ])
+    return bytes(image)
+
+
+def _elf_header(entry: int, program_headers: int) -> bytes:
+    identification = b'\x7fELF' + bytes([2, 1, 1, 0]) + bytes(8)  # 64-bit, little-endian, version 1, System V
+    return identification + struct.pack(
+        '<HHIQQQIHHHHHH',
+        2,  # Executable file
+        0x3e,  # x86-64
+        1,  # Version
+        entry,
+        _elf_header_size,  # Program headers come right after this header
+        0,  # No section headers
+        0,  # Flags
+        _elf_header_size,
+        _program_header_size,
+        program_headers,
+        64,  # Size of a section header
+        0,  # Number of section headers
+        0,  # Index of the section name table
+    )
+
+
+def _program_header(segment_type: int, flags: int, offset: int, address: int, file_size: int, memory_size: int) -> bytes:
+    alignment = _page_size if segment_type == _PT_LOAD else 16
+    return struct.pack('<IIQQQQQQ', segment_type, flags, offset, address, address, file_size, memory_size, alignment)
@@ -0,0 +1,116 @@
+from collections import Counter
+from dataclasses import dataclass
+
+from compiler.src import ir
+from compiler.src.cfg import ControlFlowGraph, build_cfg
+from compiler.src.dominance import DominatorTree, Loop, enclosing_loops, insert_preheader, natural_loops, \
+    order_with_preheaders
+from compiler.src.intrinsics import all_evaluators
+from compiler.src.ir import IRVar, call_args, defined_vars, new_var_source
+
+
+@dataclass
+class InductionVariable:
+    """A variable whose only write in a loop adds a constant step to itself, at the given instruction."""
+    var: IRVar
+    step: int
+    block: str
+    index: int
+
+
+def known_constants(instructions: list[ir.Instruction]) -> dict[IRVar, int]:
+    """Variables that are only ever set to the same integer constant, with their values."""
+    constants: dict[IRVar, int] = {}
+    not_constant: set[IRVar] = set()
+    for insn in instructions:
+        for var in defined_vars(insn):
+            if not isinstance(insn, ir.LoadIntConst) or constants.setdefault(var, insn.value) != insn.value:
+                not_constant.add(var)
+    return {var: value for var, value in constants.items() if var not in not_constant}
+
+
+def basic_induction_variables(
+        cfg: ControlFlowGraph,
+        loop: Loop,
+        constants: dict[IRVar, int],
+) -> dict[IRVar, InductionVariable]:
+    """Finds the variables that the loop only changes with `i = i + c` or `i = i - c`."""
+    definitions = Counter(
+        var for name in loop.blocks for insn in cfg.blocks[name].instructions for var in defined_vars(insn)
+    )
+    found: dict[IRVar, InductionVariable] = {}
+    for name in loop.blocks:
+        for i, insn in enumerate(cfg.blocks[name].instructions):
+            if not isinstance(insn, ir.Call) or definitions[insn.dest] != 1:
+                continue
+            match insn.fun.name, call_args(insn):
+                case '+', [a, b] if a == insn.dest and b in constants:
+                    step = constants[b]
+                case '+', [a, b] if b == insn.dest and a in constants:
+                    step = constants[a]
+                case '-', [a, b] if a == insn.dest and b in constants:
+                    step = all_evaluators['unary_-'](constants[b])
+                case _:
+                    continue
+            found[insn.dest] = InductionVariable(insn.dest, step, name, i)
+    return found
+
+
+def reduce_induction_variables(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Replaces multiplications of a basic induction variable by a constant with a new variable that
+    holds the product and is updated by an addition wherever the induction variable is.
+
+    For `i * k` with `i` stepping by `s`, the product starts out as `i * k` in a preheader of the loop
+    and grows by `s * k` right after each step of `i`, so it always equals `i * k` inside the loop.
+    """
+    cfg = build_cfg(instructions)
+    loops = natural_loops(cfg, DominatorTree(cfg))
+    if not loops:
+        return instructions
+    constants = known_constants(instructions)
+    new_var = new_var_source(instructions)
+    enclosing = enclosing_loops(loops)
+
+    preheaders: dict[str, str] = {}
+    for loop in loops:
+        induction_variables = basic_induction_variables(cfg, loop, constants)
+        products: dict[tuple[IRVar, int], IRVar] = {}
+        for name in loop.blocks:
+            block = cfg.blocks[name]
+            for i, insn in enumerate(block.instructions):
+                if not isinstance(insn, ir.Call) or insn.fun.name != '*':
+                    continue
+                match call_args(insn):
+                    case [a, b] if a in induction_variables and constants.get(b, 0) not in (0, 1):
+                        key = a, constants[b]
+                    case [a, b] if b in induction_variables and constants.get(a, 0) not in (0, 1):
+                        key = b, constants[a]
+                    case _:
+                        continue
+                if key not in products:
+                    products[key] = new_var()
+                block.instructions[i] = ir.Copy(insn.location, products[key], insn.dest)
+        if not products:
+            continue
+
+        preheader: list[ir.Instruction] = []
+        updates: dict[tuple[str, int], list[ir.Instruction]] = {}
+        for (var, factor), product in products.items():
+            induction_variable = induction_variables[var]
+            step = cfg.blocks[induction_variable.block].instructions[induction_variable.index]
+            factor_var, increment = new_var(), new_var()
+            preheader += [
+                ir.LoadIntConst(step.location, factor, factor_var),
+                ir.Call(step.location, IRVar('*'), [var, factor_var], product),
+                ir.LoadIntConst(step.location, all_evaluators['*'](induction_variable.step, factor), increment),
+            ]
+            updates.setdefault((induction_variable.block, induction_variable.index), []).append(
+                ir.Call(step.location, IRVar('+'), [product, increment], product)
+            )
+        for (name, i), update in sorted(updates.items(), reverse=True):
+            cfg.blocks[name].instructions[i + 1:i + 1] = update
+        preheaders[loop.header] = insert_preheader(cfg, loop, preheader)
+        for other in enclosing[loop.header]:
+            other.blocks.add(preheaders[loop.header])
+
+    return cfg.instructions(order_with_preheaders(cfg, preheaders)) if preheaders else instructions
@@ -4,6 +4,7 @@ from typing import Callable
 
 @dataclass
 class IntrinsicArgs():
+    # Registers, stack slots, or immediates like '$5' for operands known at compile time.
     arg_refs: list[str]
     result_register: str
     emit: Callable[[str], None]
@@ -13,6 +14,26 @@ Intrinsic = Callable[[IntrinsicArgs], None]
 
 all_intrinsics: dict[str, Intrinsic] = {}
 
+# Computes the result of an intrinsic at compile time.
+# Returns None if the operation would trap at runtime, in which case it must not be folded.
+Evaluator = Callable[..., int | bool | None]
+
+all_evaluators: dict[str, Evaluator] = {}
+
+INT64_MIN = -2 ** 63
+
+# Intrinsics that crash the program on some operands, which makes calling them a side effect.
+trapping_intrinsics = {'/', '%'}
+
+# The x86 condition codes that the comparison intrinsics test, for 'setcc' and 'jcc'.
+condition_codes = {'==': 'e', '!=': 'ne', '<': 'l', '<=': 'le', '>': 'g', '>=': 'ge'}
+
+# The condition code that holds exactly when the given one doesn't.
+negated_condition_codes = {'e': 'ne', 'ne': 'e', 'l': 'ge', 'ge': 'l', 'le': 'g', 'g': 'le'}
+
+# The condition code that holds for 'b ? a' exactly when the given one holds for 'a ? b'.
+swapped_condition_codes = {'e': 'e', 'ne': 'ne', 'l': 'g', 'g': 'l', 'le': 'ge', 'ge': 'le'}
+
 
 def _intrinsic(name: str) -> Callable[[Intrinsic], Intrinsic]:
     """Function decorator that registers that function as an intrinsic."""
@@ -25,6 +46,37 @@ def _intrinsic(name: str) -> Callable[[Intrinsic], Intrinsic]:
     return wrapper
 
 
+def _evaluator(name: str) -> Callable[[Evaluator], Evaluator]:
+    """Function decorator that registers the compile-time semantics of an intrinsic."""
+
+    def wrapper(f: Evaluator) -> Evaluator:
+        assert name not in all_evaluators
+        all_evaluators[name] = f
+        return f
+
+    return wrapper
+
+
+def wrap_int64(value: int) -> int:
+    """Wraps an integer into the signed 64-bit range, as the x86-64 instructions do on overflow."""
+    return (value - INT64_MIN) % 2 ** 64 + INT64_MIN
+
+
+def immediate_value(ref: str) -> int | None:
+    """The value of an immediate operand such as '$5', or None for registers and memory."""
+    return int(ref[1:]) if ref.startswith('$') else None
+
+
+def _is_register(ref: str) -> bool:
+    return ref.startswith('%')
+
+
+def _power_of_two_exponent(value: int | None) -> int | None:
+    if value is not None and value > 0 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+
 @_intrinsic("unary_-")
 def unary_minus(a: IntrinsicArgs) -> None:
     a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
@@ -37,11 +89,23 @@ def unary_not(a: IntrinsicArgs) -> None:
     a.emit(f'xorq $1, {a.result_register}')
 
 
+def _commuted(a: IntrinsicArgs) -> tuple[str, str]:
+    """The operands of a commutative operation, with an immediate one last."""
+    left, right = a.arg_refs
+    if immediate_value(left) is not None:
+        return right, left
+    return left, right
+
+
 @_intrinsic("+")
 def plus(a: IntrinsicArgs) -> None:
-    if a.result_register != a.arg_refs[0]:
-        a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'addq {a.arg_refs[1]}, {a.result_register}')
+    left, right = _commuted(a)
+    if immediate_value(right) is not None and _is_register(left) and left != a.result_register:
+        a.emit(f'leaq {immediate_value(right)}({left}), {a.result_register}')
+        return
+    if a.result_register != left:
+        a.emit(f'movq {left}, {a.result_register}')
+    a.emit(f'addq {right}, {a.result_register}')
 
 
 @_intrinsic("-")
@@ -53,66 +117,287 @@ def minus(a: IntrinsicArgs) -> None:
 
 @_intrinsic("*")
 def multiply(a: IntrinsicArgs) -> None:
-    if a.result_register != a.arg_refs[0]:
-        a.emit(f'movq {a.arg_refs[0]}, {a.result_register}')
-    a.emit(f'imulq {a.arg_refs[1]}, {a.result_register}')
+    left, right = _commuted(a)
+    factor = immediate_value(right)
+    shift = _power_of_two_exponent(factor)
+    if factor in (3, 5, 9):
+        # 'lea' can add a register to itself scaled by 2, 4 or 8.
+        if not _is_register(left):
+            a.emit(f'movq {left}, {a.result_register}')
+            left = a.result_register
+        a.emit(f'leaq ({left},{left},{factor - 1}), {a.result_register}')
+        return
+    if a.result_register != left:
+        a.emit(f'movq {left}, {a.result_register}')
+    if shift is not None:
+        if shift > 0:
+            a.emit(f'shlq ${shift}, {a.result_register}')
+    else:
+        a.emit(f'imulq {right}, {a.result_register}')
+
+
+def _emit_idivq(a: IntrinsicArgs) -> None:
+    a.emit(f'movq {a.arg_refs[0]}, %rax')
+    a.emit('cqto')  # Sign-extend 'rax' into 'rdx:rax', which 'idivq' divides
+    divisor = a.arg_refs[1]
+    if immediate_value(divisor) is not None:
+        # 'idivq' can't take an immediate, and %r11 is kept free for cases like this.
+        a.emit(f'movq {divisor}, %r11')
+        divisor = '%r11'
+    a.emit(f'idivq {divisor}')
+
+
+def signed_division_magic(divisor: int) -> tuple[int, int]:
+    """The magic multiplier and shift for dividing signed 64-bit integers by `divisor`, where |divisor| >= 2.
+
+    The quotient is the high half of 'multiplier * n', corrected by adding (divisor > 0, multiplier < 0)
+    or subtracting (divisor < 0, multiplier > 0) 'n', shifted right arithmetically by `shift`, plus one
+    if the result is negative. This is the algorithm in Hacker's Delight, section 10-4.
+    """
+    mask = 2 ** 64 - 1
+    two63 = 2 ** 63
+    abs_divisor = abs(divisor)
+    t = two63 + (1 if divisor < 0 else 0)
+    abs_nc = t - 1 - t % abs_divisor
+    p = 63
+    q1, r1 = divmod(two63, abs_nc)
+    q2, r2 = divmod(two63, abs_divisor)
+    while True:
+        p += 1
+        q1, r1 = 2 * q1 & mask, 2 * r1 & mask
+        if r1 >= abs_nc:
+            q1, r1 = q1 + 1 & mask, r1 - abs_nc
+        q2, r2 = 2 * q2 & mask, 2 * r2 & mask
+        if r2 >= abs_divisor:
+            q2, r2 = q2 + 1 & mask, r2 - abs_divisor
+        delta = abs_divisor - r2
+        if not (q1 < delta or (q1 == delta and r1 == 0)):
+            break
+    multiplier = wrap_int64(q2 + 1)
+    return (-multiplier if divisor < 0 else multiplier), p - 64
+
+
+def _emit_magic_division(a: IntrinsicArgs, divisor: int) -> None:
+    """Leaves the quotient in 'rdx', using a multiplication instead of 'idivq'."""
+    multiplier, shift = signed_division_magic(divisor)
+    dividend = a.arg_refs[0]
+    if immediate_value(dividend) is not None:
+        a.emit(f'movq {dividend}, %r11')
+        dividend = '%r11'
+    a.emit(f'movabsq ${multiplier}, %rax')
+    a.emit(f'imulq {dividend}')  # rdx:rax = rax * dividend
+    if divisor > 0 and multiplier < 0:
+        a.emit(f'addq {dividend}, %rdx')
+    elif divisor < 0 and multiplier > 0:
+        a.emit(f'subq {dividend}, %rdx')
+    if shift > 0:
+        a.emit(f'sarq ${shift}, %rdx')
+    # Round negative quotients towards zero by adding their sign bit.
+    a.emit('movq %rdx, %rax')
+    a.emit('shrq $63, %rax')
+    a.emit('addq %rax, %rdx')
+
+
+def _emit_rounding_bias(a: IntrinsicArgs, shift: int) -> None:
+    """Loads the dividend into 'rax', and into 'rdx' the value to add to it so that shifting it right by
+    `shift` rounds towards zero: 2^shift - 1 for negative dividends, and 0 for others."""
+    a.emit(f'movq {a.arg_refs[0]}, %rax')
+    a.emit('cqto')
+    a.emit(f'shrq ${64 - shift}, %rdx')
+
+
+def _division_method(divisor: int | None) -> str:
+    """How to divide by the divisor operand, which is None if it's not a constant."""
+    # Division by 0 and -1 is left to 'idivq', which traps on 0 and on INT64_MIN / -1.
+    if divisor in (None, 0, -1):
+        return 'idivq'
+    if divisor == 1:
+        return 'identity'
+    if _power_of_two_exponent(abs(divisor)) is not None:
+        return 'shift'
+    return 'magic'
 
 
 @_intrinsic("/")
 def divide(a: IntrinsicArgs) -> None:
-    a.emit(f'movq {a.arg_refs[0]}, %rax')
-    a.emit('cqto')  # TODO: explain
-    a.emit(f'idivq {a.arg_refs[1]}')
-    if a.result_register != '%rax':
-        a.emit(f'movq %rax, {a.result_register}')
+    divisor = immediate_value(a.arg_refs[1])
+    match _division_method(divisor):
+        case 'idivq':
+            _emit_idivq(a)
+            quotient = '%rax'
+        case 'identity':
+            quotient = a.arg_refs[0]
+        case 'shift':
+            shift = _power_of_two_exponent(abs(divisor))
+            _emit_rounding_bias(a, shift)
+            a.emit('addq %rdx, %rax')
+            a.emit(f'sarq ${shift}, %rax')
+            if divisor < 0:
+                a.emit('negq %rax')
+            quotient = '%rax'
+        case _:
+            _emit_magic_division(a, divisor)
+            quotient = '%rdx'
+    if a.result_register != quotient:
+        a.emit(f'movq {quotient}, {a.result_register}')
 
 
 @_intrinsic("%")
 def remainder(a: IntrinsicArgs) -> None:
-    # Same as division, but remainder is in register 'rdx'
-    a.emit(f'movq {a.arg_refs[0]}, %rax')
-    a.emit('cqto')
-    a.emit(f'idivq {a.arg_refs[1]}')
-    if a.result_register != '%rdx':
-        a.emit(f'movq %rdx, {a.result_register}')
+    divisor = immediate_value(a.arg_refs[1])
+    match _division_method(divisor):
+        case 'idivq':
+            # Same as division, but remainder is in register 'rdx'
+            _emit_idivq(a)
+            result = '%rdx'
+        case 'identity':
+            result = '$0'
+        case 'shift':
+            # The sign of the remainder follows the dividend, so dividing by -2^k leaves the same remainder as 2^k.
+            # x % 2^k == ((x + bias) & (2^k - 1)) - bias
+            shift = _power_of_two_exponent(abs(divisor))
+            _emit_rounding_bias(a, shift)
+            a.emit('addq %rdx, %rax')
+            a.emit(f'andq ${(1 << shift) - 1}, %rax')
+            a.emit('subq %rdx, %rax')
+            result = '%rax'
+        case _:
+            # x % d == x - (x / d) * d
+            _emit_magic_division(a, divisor)
+            a.emit(f'imulq ${divisor}, %rdx')
+            a.emit(f'movq {a.arg_refs[0]}, %rax')
+            a.emit('subq %rdx, %rax')
+            result = '%rax'
+    if a.result_register != result:
+        a.emit(f'movq {result}, {a.result_register}')
 
 
 @_intrinsic("==")
 def eq(a: IntrinsicArgs) -> None:
-    _int_comparison(a, 'sete')
+    _int_comparison(a, '==')
 
 
 @_intrinsic("!=")
 def ne(a: IntrinsicArgs) -> None:
-    _int_comparison(a, 'setne')
+    _int_comparison(a, '!=')
 
 
 @_intrinsic("<")
 def lt(a: IntrinsicArgs) -> None:
-    _int_comparison(a, 'setl')
+    _int_comparison(a, '<')
 
 
 @_intrinsic("<=")
 def le(a: IntrinsicArgs) -> None:
-    _int_comparison(a, 'setle')
+    _int_comparison(a, '<=')
 
 
 @_intrinsic(">")
 def gt(a: IntrinsicArgs) -> None:
-    _int_comparison(a, 'setg')
+    _int_comparison(a, '>')
 
 
 @_intrinsic(">=")
 def ge(a: IntrinsicArgs) -> None:
-    _int_comparison(a, 'setge')
+    _int_comparison(a, '>=')
+
 
+def emit_compare(arg_refs: list[str], condition: str, emit: Callable[[str], None]) -> str:
+    """Sets the flags by comparing the first operand to the second, clobbering only 'rdx'.
 
-def _int_comparison(a: IntrinsicArgs, setcc_insn: str) -> None:
+    Returns the condition code to test, which differs from `condition` if the operands had to be swapped.
+    """
+    left, right = arg_refs
+    if immediate_value(left) is not None and immediate_value(right) is None:
+        # An immediate can only be the first operand of 'cmpq', which is the right-hand side.
+        left, right = right, left
+        condition = swapped_condition_codes[condition]
+    if not _is_register(left) and not _is_register(right):
+        # 'cmpq' can't compare two memory operands, and can't compare to an immediate.
+        emit(f'movq {left}, %rdx')
+        left = '%rdx'
+    emit(f'cmpq {right}, {left}')
+    return condition
+
+
+def _int_comparison(a: IntrinsicArgs, op: str) -> None:
     # We use 'al' and 'eax' below, which means the lower bytes of 'rax'
     a.emit('xor %rax, %rax')  # Clear all bits of rax
-    a.emit(f'movq {a.arg_refs[0]}, %rdx')
-    a.emit(f'cmpq {a.arg_refs[1]}, %rdx')
+    condition = emit_compare(a.arg_refs, condition_codes[op], a.emit)
     # Set lowest byte of 'rax' to comparison result
-    a.emit(f'{setcc_insn} %al')
+    a.emit(f'set{condition} %al')
     if a.result_register != '%rax':
         a.emit(f'movq %rax, {a.result_register}')
+
+
+@_evaluator("unary_-")
+def eval_unary_minus(a: int) -> int:
+    return wrap_int64(-a)
+
+
+@_evaluator("unary_not")
+def eval_unary_not(a: bool) -> bool:
+    return not a
+
+
+@_evaluator("+")
+def eval_plus(a: int, b: int) -> int:
+    return wrap_int64(a + b)
+
+
+@_evaluator("-")
+def eval_minus(a: int, b: int) -> int:
+    return wrap_int64(a - b)
+
+
+@_evaluator("*")
+def eval_multiply(a: int, b: int) -> int:
+    return wrap_int64(a * b)
+
+
+@_evaluator("/")
+def eval_divide(a: int, b: int) -> int | None:
+    # 'idivq' traps on both of these
+    if b == 0 or (a == INT64_MIN and b == -1):
+        return None
+    # 'idivq' rounds towards zero, unlike Python's '//'
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+@_evaluator("%")
+def eval_remainder(a: int, b: int) -> int | None:
+    quotient = eval_divide(a, b)
+    if quotient is None:
+        return None
+    return a - b * quotient
+
+
+@_evaluator("==")
+def eval_eq(a: int, b: int) -> bool:
+    return a == b
+
+
+@_evaluator("!=")
+def eval_ne(a: int, b: int) -> bool:
+    return a != b
+
+
+@_evaluator("<")
+def eval_lt(a: int, b: int) -> bool:
+    return a < b
+
+
+@_evaluator("<=")
+def eval_le(a: int, b: int) -> bool:
+    return a <= b
+
+
+@_evaluator(">")
+def eval_gt(a: int, b: int) -> bool:
+    return a > b
+
+
+@_evaluator(">=")
+def eval_ge(a: int, b: int) -> bool:
+    return a >= b
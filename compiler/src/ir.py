@@ -1,6 +1,7 @@
 import dataclasses
 from dataclasses import dataclass
-from typing import Any
+from itertools import count
+from typing import Any, Callable
 
 from compiler.src.tokenizer import SourceLocation
 
@@ -22,6 +23,8 @@ class Instruction():
         def format_value(v: Any) -> str:
             if isinstance(v, list):
                 return f'[{", ".join(format_value(e) for e in v)}]'
+            elif isinstance(v, dict):
+                return f'{{{", ".join(f"{k}: {format_value(e)}" for k, e in v.items())}}}'
             else:
                 return str(v)
 
@@ -58,6 +61,14 @@ class Call(Instruction):
     dest: IRVar
 
 
+@dataclass(frozen=True)
+class Phi(Instruction):
+    """Only in SSA form: at the top of a block, takes the value of the source for the predecessor
+    block that control came from."""
+    sources: dict[str, IRVar]
+    dest: IRVar
+
+
 @dataclass(frozen=True)
 class Label(Instruction):
     name: str
@@ -73,3 +84,74 @@ class CondJump(Instruction):
     cond: IRVar
     then_label: Label
     else_label: Label
+
+
+def call_args(insn: Call) -> list[IRVar]:
+    # The IR generator gives the argument of print_int and print_bool as a bare variable.
+    return insn.args if isinstance(insn.args, list) else [insn.args]
+
+
+def used_vars(insn: Instruction) -> list[IRVar]:
+    """Variables whose values the instruction reads."""
+    match insn:
+        case Copy():
+            return [insn.source]
+        case Call():
+            return call_args(insn)
+        case CondJump():
+            return [insn.cond]
+        case Phi():
+            return list(insn.sources.values())
+    return []
+
+
+def defined_vars(insn: Instruction) -> list[IRVar]:
+    """Variables that the instruction writes."""
+    match insn:
+        case LoadBoolConst() | LoadIntConst() | Copy() | Call() | Phi():
+            return [insn.dest]
+    return []
+
+
+def with_used_vars(insn: Instruction, replace: Callable[[IRVar], IRVar]) -> Instruction:
+    """Returns the instruction with each variable it reads replaced by `replace(var)`."""
+    match insn:
+        case Copy():
+            return dataclasses.replace(insn, source=replace(insn.source))
+        case Call():
+            return dataclasses.replace(insn, args=[replace(arg) for arg in call_args(insn)])
+        case CondJump():
+            return dataclasses.replace(insn, cond=replace(insn.cond))
+        case Phi():
+            return dataclasses.replace(insn, sources={name: replace(var) for name, var in insn.sources.items()})
+    return insn
+
+
+def with_dest(insn: Instruction, dest: IRVar) -> Instruction:
+    """Returns the instruction writing to `dest` instead of its current destination."""
+    return dataclasses.replace(insn, dest=dest)
+
+
+def with_target(jump: Instruction, old: str, new: Label) -> Instruction:
+    """Returns the jump going to `new` wherever it went to the label named `old`."""
+    match jump:
+        case Jump() if jump.label.name == old:
+            return dataclasses.replace(jump, label=new)
+        case CondJump():
+            return dataclasses.replace(
+                jump,
+                then_label=new if jump.then_label.name == old else jump.then_label,
+                else_label=new if jump.else_label.name == old else jump.else_label,
+            )
+    return jump
+
+
+def new_var_source(instructions: list[Instruction]) -> Callable[[], IRVar]:
+    """Returns a function that makes new variables, named like the IR generator's but not used by any
+    of the instructions."""
+    taken = [
+        int(var.name[1:]) for insn in instructions for var in [*used_vars(insn), *defined_vars(insn)]
+        if var.name[:1] == 'x' and var.name[1:].isdigit()
+    ]
+    counter = count(max(taken, default=0) + 1)
+    return lambda: IRVar(f'x{next(counter)}')
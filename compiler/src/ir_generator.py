@@ -12,33 +12,59 @@ class IrException(Exception):
     pass
 
 
-var_counter = 0
-label_counter = {}
+class IrContext:
+    """State of a single `generate_ir` invocation.
+
+    Keeping it out of module globals lets several threads generate IR at the same time.
+    """
+
+    def __init__(self, root_types: Dict[IRVar, Type]) -> None:
+        self.var_types: Dict[IRVar, Type] = root_types.copy()
+        self.var_counter = 0
+        self.label_counter: Dict[str, int] = {}
+
+    def new_var(self, t: Type) -> IRVar:
+        self.var_counter += 1
+        new_var = IRVar(f"x{self.var_counter}")
+        self.var_types[new_var] = t
+        return new_var
+
+    def new_label(self, prefix: str, loc: SourceLocation) -> Label:
+        self.label_counter[prefix] = self.label_counter.get(prefix, 0) + 1
+        return Label(loc, f"{prefix}{self.label_counter[prefix]}")
 
 
 def generate_ir(
         root_types: Dict[IRVar, Type],
         root_expr: Expression
 ) -> List[Instruction]:
-    var_types: Dict[IRVar, Type] = root_types.copy()
+    ctx = IrContext(root_types)
+    new_var = ctx.new_var
+    new_label = ctx.new_label
     var_unit = IRVar('unit')
-    var_types[var_unit] = Unit
+    ctx.var_types[var_unit] = Unit
     ins: List[Instruction] = []
 
-    def new_var(t: Type) -> IRVar:
-        global var_counter
-        var_counter += 1
-        new_var_name = f"x{var_counter}"
-        new_var = IRVar(new_var_name)
-        var_types[new_var] = t
-        return new_var
+    def visit_condition(st: SymTable, expr: Expression, l_true: Label, l_false: Label) -> None:
+        """Emits code that jumps to `l_true` if the condition holds and to `l_false` if it doesn't.
 
-    def new_label(prefix: str, loc: SourceLocation) -> Label:
-        if prefix not in label_counter:
-            label_counter[prefix] = 0
-        label_counter[prefix] += 1
-        label_name = f"{prefix}{label_counter[prefix]}"
-        return Label(loc, label_name)
+        'and', 'or' and 'not' jump straight to the right target instead of computing a Bool to test.
+        """
+        loc = expr.location
+        match expr:
+            case BinaryOp() if expr.op in ["and", "or"]:
+                l_right = new_label(expr.op + '_right', loc)
+                if expr.op == "and":
+                    visit_condition(st, expr.left, l_right, l_false)
+                else:
+                    visit_condition(st, expr.left, l_true, l_right)
+                ins.append(l_right)
+                visit_condition(st, expr.right, l_true, l_false)
+            case UnaryOp() if expr.op == "not":
+                visit_condition(st, expr.operand, l_false, l_true)
+            case _:
+                var_cond = visit(st, expr)
+                ins.append(CondJump(loc, var_cond, l_true, l_false))
 
     def visit(st: SymTable, expr: Expression) -> IRVar:
         loc = expr.location
@@ -63,9 +89,9 @@ def generate_ir(
 
             case BinaryOp():
                 if expr.op in ["and", "or"]:
-                    l_right = Label(loc, expr.op + '_right')
-                    l_skip = Label(loc, expr.op + '_skip')
-                    l_end = Label(loc, expr.op + '_end')
+                    l_right = new_label(expr.op + '_right', loc)
+                    l_skip = new_label(expr.op + '_skip', loc)
+                    l_end = new_label(expr.op + '_end', loc)
 
                     var_left = visit(st, expr.left)
 
@@ -129,8 +155,7 @@ def generate_ir(
                     l_then = new_label("then", loc)
                     l_end = new_label("if_end", loc)
 
-                    var_cond = visit(st, expr.condition)
-                    ins.append(CondJump(loc, var_cond, l_then, l_end))
+                    visit_condition(st, expr.condition, l_then, l_end)
 
                     ins.append(l_then)
                     visit(st, expr.then_branch)
@@ -142,8 +167,7 @@ def generate_ir(
                     l_else = new_label("else", loc)
                     l_end = new_label("if_end", loc)
 
-                    var_cond = visit(st, expr.condition)
-                    ins.append(CondJump(loc, var_cond, l_then, l_else))
+                    visit_condition(st, expr.condition, l_then, l_else)
                     ins.append(l_then)
 
                     var_result = new_var(expr.then_branch.type)
@@ -184,8 +208,7 @@ def generate_ir(
                 l_end = new_label("while_end", loc)
 
                 ins.append(l_start)
-                var_cond = visit(st, expr.condition)
-                ins.append(CondJump(loc, var_cond, l_body, l_end))
+                visit_condition(st, expr.condition, l_body, l_end)
                 ins.append(l_body)
 
                 visit(st, expr.body)
@@ -209,10 +232,6 @@ def generate_ir(
                     raise IrException(f"Unsupported function call: {expr.name}")
 
     root_symtab = SymTable(parent=None)
-    global var_counter
-    var_counter = 0
-    global label_counter
-    label_counter = {}
     for var, typ in root_types.items():
         root_symtab.define(var.name, var)
 
@@ -0,0 +1,35 @@
+from compiler.src import ir
+from compiler.src.block_layout import layout_blocks
+from compiler.src.constant_folding import fold_constants
+from compiler.src.copy_propagation import propagate_copies, coalesce_copies
+from compiler.src.dead_code import remove_unreachable_code, eliminate_dead_code
+from compiler.src.induction_variables import reduce_induction_variables
+from compiler.src.loop_invariants import hoist_loop_invariants
+from compiler.src.loop_unrolling import unroll_loops
+from compiler.src.sccp import propagate_constants_sparsely
+from compiler.src.ssa import from_ssa, to_ssa
+from compiler.src.value_numbering import number_values
+
+
+def optimize_ir(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Propagates constants in SSA form, runs the IR optimization passes until they stop making changes,
+    then the loop transformations, which open up more work for the other passes, and finally lays out
+    the blocks."""
+    instructions = _simplify(from_ssa(propagate_constants_sparsely(to_ssa(instructions))))
+    instructions = _simplify(unroll_loops(reduce_induction_variables(instructions)))
+    return layout_blocks(instructions)
+
+
+def _simplify(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    while True:
+        optimized = fold_constants(instructions)
+        optimized = number_values(optimized)
+        optimized = hoist_loop_invariants(optimized)
+        # Coalescing goes first, as propagation would make the temporaries it removes live again.
+        optimized = coalesce_copies(optimized)
+        optimized = propagate_copies(optimized)
+        optimized = eliminate_dead_code(optimized)
+        optimized = remove_unreachable_code(optimized)
+        if optimized == instructions:
+            return optimized
+        instructions = optimized
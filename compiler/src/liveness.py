@@ -0,0 +1,140 @@
+import heapq
+from dataclasses import dataclass
+
+from compiler.src import ir
+from compiler.src.cfg import BasicBlock, ControlFlowGraph, build_cfg
+from compiler.src.ir import IRVar, defined_vars, used_vars
+
+
+class Liveness:
+    """The variables that are live before and after each instruction.
+
+    Only the variables live at the end of each basic block are stored. The sets for the instructions
+    of a block are worked out from them the first time the block is asked about.
+    """
+
+    def __init__(self, blocks: list[BasicBlock], block_out: dict[str, frozenset[IRVar]]) -> None:
+        self._blocks = blocks
+        self._block_out = block_out
+        # The index of the first instruction of each block, and the block of each instruction.
+        self._starts: list[int] = []
+        self._block_of: list[int] = []
+        for b, block in enumerate(blocks):
+            self._starts.append(len(self._block_of))
+            self._block_of.extend([b] * len(block.instructions))
+        self._live_in: dict[int, list[frozenset[IRVar]]] = {}
+        self._live_out: dict[int, list[frozenset[IRVar]]] = {}
+
+    def is_live_out(self, i: int, var: IRVar) -> bool:
+        return var in self._sets(i, self._live_out)
+
+    def live_in_vars(self, i: int) -> list[IRVar]:
+        return list(self._sets(i, self._live_in))
+
+    def live_out_vars(self, i: int) -> list[IRVar]:
+        return list(self._sets(i, self._live_out))
+
+    def _sets(self, i: int, sets: dict[int, list[frozenset[IRVar]]]) -> frozenset[IRVar]:
+        b = self._block_of[i]
+        if b not in sets:
+            block = self._blocks[b]
+            live = self._block_out[block.name]
+            block_in: list[frozenset[IRVar]] = []
+            block_out: list[frozenset[IRVar]] = []
+            for insn in reversed(block.instructions):
+                block_out.append(live)
+                defs, uses = defined_vars(insn), used_vars(insn)
+                if defs or uses:
+                    live = live.difference(defs).union(uses)
+                block_in.append(live)
+            self._live_in[b] = block_in[::-1]
+            self._live_out[b] = block_out[::-1]
+        return sets[b][i - self._starts[b]]
+
+
+@dataclass
+class BlockLiveness:
+    """The variables that are live at the start and at the end of each basic block."""
+    block_in: dict[str, frozenset[IRVar]]
+    block_out: dict[str, frozenset[IRVar]]
+
+
+def block_liveness(cfg: ControlFlowGraph) -> BlockLiveness:
+    """Computes the variables that are live at the start and at the end of each basic block.
+
+    The sets are stored sparsely rather than as bitsets over every variable in the program, so the
+    time taken grows with the size of the program times the number of variables live at once, not
+    the number of variables in total. The blocks are visited in the same order as in `solve_dataflow`.
+    """
+    gen: dict[str, frozenset[IRVar]] = {}
+    kill: dict[str, frozenset[IRVar]] = {}
+    for name, block in cfg.blocks.items():
+        block_gen: set[IRVar] = set()
+        block_kill: set[IRVar] = set()
+        for insn in reversed(block.instructions):
+            block_gen.difference_update(defined_vars(insn))
+            block_gen.update(used_vars(insn))
+            block_kill.update(defined_vars(insn))
+        gen[name] = frozenset(block_gen)
+        kill[name] = frozenset(block_kill)
+
+    order = cfg.postorder()
+    position = {name: i for i, name in enumerate(order)}
+    block_in: dict[str, frozenset[IRVar]] = {name: frozenset() for name in cfg.blocks}
+    block_out = dict(block_in)
+    worklist = list(range(len(order)))
+    queued = set(order)
+    while worklist:
+        name = order[heapq.heappop(worklist)]
+        queued.discard(name)
+        live_out: frozenset[IRVar] = frozenset().union(*(block_in[succ] for succ in cfg.blocks[name].successors))
+        block_out[name] = live_out
+        live_in = gen[name] | (live_out - kill[name])
+        if live_in != block_in[name]:
+            block_in[name] = live_in
+            for pred in cfg.blocks[name].predecessors:
+                if pred in position and pred not in queued:
+                    queued.add(pred)
+                    heapq.heappush(worklist, position[pred])
+
+    return BlockLiveness(block_in, block_out)
+
+
+def live_variables(instructions: list[ir.Instruction]) -> Liveness:
+    """Computes the variables that are live before and after each instruction."""
+    cfg = build_cfg(instructions)
+    return Liveness(list(cfg.blocks.values()), block_liveness(cfg).block_out)
+
+
+def live_intervals(
+        instructions: list[ir.Instruction],
+        liveness: Liveness | None = None,
+) -> dict[IRVar, tuple[int, int]]:
+    """For each variable, the first and last instruction index at which it is defined, used or live.
+
+    The interval is conservative: the variable may be dead in parts of it, but it is never live outside it.
+    """
+    liveness = liveness or live_variables(instructions)
+    intervals: dict[IRVar, tuple[int, int]] = {}
+
+    def extend(var: IRVar, i: int) -> None:
+        start, end = intervals.get(var, (i, i))
+        intervals[var] = (min(start, i), max(end, i))
+
+    # A variable that is live somewhere inside a straight run of instructions is also live at one of its ends,
+    # or is defined or used in it, so only the ends of the runs need to be looked at.
+    run_start = 0
+    for i, insn in enumerate(instructions):
+        if isinstance(insn, ir.Label):
+            run_start = i
+        for var in [*used_vars(insn), *defined_vars(insn)]:
+            extend(var, i)
+        if i == run_start:
+            for var in liveness.live_in_vars(i):
+                extend(var, i)
+        if isinstance(insn, (ir.Jump, ir.CondJump)) or i + 1 == len(instructions) \
+                or isinstance(instructions[i + 1], ir.Label):
+            for var in liveness.live_out_vars(i):
+                extend(var, i)
+            run_start = i + 1
+    return intervals
@@ -0,0 +1,147 @@
+from collections import Counter
+
+from compiler.src import ir
+from compiler.src.cfg import ControlFlowGraph, build_cfg
+from compiler.src.dominance import DominatorTree, Loop, enclosing_loops, insert_preheader, natural_loops, \
+    order_with_preheaders
+from compiler.src.intrinsics import all_intrinsics, trapping_intrinsics
+from compiler.src.ir import IRVar, call_args, defined_vars
+from compiler.src.liveness import BlockLiveness, block_liveness
+
+
+def hoist_loop_invariants(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Moves constant loads and intrinsic calls whose operands don't change inside a loop into a
+    preheader, a new block that runs once before the loop is entered.
+
+    An instruction is only moved if it is the only one in the loop that writes its destination, and
+    the destination is not read in the loop before that write. If the destination is read after the
+    loop, the instruction must run on every path out of the loop. Divisions that may trap must also
+    run on every path out of the loop, so that a loop that never runs its body doesn't crash, and
+    nothing with a side effect may run before them in the loop, so that its output comes before the
+    crash.
+    """
+    cfg = build_cfg(instructions)
+    dominators = DominatorTree(cfg)
+    loops = natural_loops(cfg, dominators)
+    if not loops:
+        return instructions
+    liveness = block_liveness(cfg)
+    safe_divisors = _safe_divisors(instructions)
+    position: dict[str, float] = {name: i for i, name in enumerate(cfg.reverse_postorder())}
+    enclosing = enclosing_loops(loops)
+
+    preheaders: dict[str, str] = {}
+    for loop in loops:
+        hoisted = _invariant_instructions(cfg, dominators, loop, liveness, safe_divisors, position)
+        if not hoisted:
+            continue
+        preheader = insert_preheader(cfg, loop, [cfg.blocks[name].instructions[i] for name, i in hoisted])
+        _remove_instructions(cfg, hoisted)
+        preheaders[loop.header] = preheader
+        dominators.insert_above(preheader, loop.header)
+        position[preheader] = position[loop.header] - 0.5
+        # The preheader is part of every loop around this one.
+        for other in enclosing[loop.header]:
+            other.blocks.add(preheader)
+
+    return cfg.instructions(order_with_preheaders(cfg, preheaders)) if preheaders else instructions
+
+
+def _safe_divisors(instructions: list[ir.Instruction]) -> set[IRVar]:
+    """Variables that are only ever set to the same constant, which division can't trap on."""
+    values: dict[IRVar, int] = {}
+    unsafe: set[IRVar] = set()
+    for insn in instructions:
+        for var in defined_vars(insn):
+            if not isinstance(insn, ir.LoadIntConst) or insn.value in (0, -1) \
+                    or values.setdefault(var, insn.value) != insn.value:
+                unsafe.add(var)
+    return set(values) - unsafe
+
+
+def _invariant_instructions(
+        cfg: ControlFlowGraph,
+        dominators: DominatorTree,
+        loop: Loop,
+        liveness: BlockLiveness,
+        safe_divisors: set[IRVar],
+        position: dict[str, float],
+) -> list[tuple[str, int]]:
+    """The block names and indices of the instructions that can be hoisted out of the loop, in the order
+    they must run."""
+    definitions = Counter(
+        var for name in loop.blocks for insn in cfg.blocks[name].instructions for var in defined_vars(insn)
+    )
+    exits = loop.exits(cfg)
+    live_at_header = liveness.block_in[loop.header]
+    order = sorted(loop.blocks, key=position.__getitem__)
+    clean_on_entry = _side_effect_free_on_entry(cfg, loop, order)
+
+    def runs_before_every_exit(name: str) -> bool:
+        return all(dominators.dominates(name, exiting) for exiting, _ in exits)
+
+    def runs_first_on_every_path(name: str, i: int) -> bool:
+        """Whether the instruction runs before every exit and after no side effects in an iteration."""
+        before = cfg.blocks[name].instructions[:i]
+        return runs_before_every_exit(name) and clean_on_entry[name] and not any(map(_has_side_effect, before))
+
+    hoisted: dict[tuple[str, int], None] = {}
+    invariant: set[IRVar] = set()
+    found = True
+    while found:
+        found = False
+        for name in order:
+            for i, insn in enumerate(cfg.blocks[name].instructions):
+                if (name, i) in hoisted:
+                    continue
+                match insn:
+                    case ir.LoadIntConst() | ir.LoadBoolConst():
+                        operands: list[IRVar] = []
+                    case ir.Call() if insn.fun.name in all_intrinsics:
+                        operands = call_args(insn)
+                    case _:
+                        continue
+                if definitions[insn.dest] != 1 or insn.dest in live_at_header:
+                    continue
+                if not all(definitions[arg] == 0 or arg in invariant for arg in operands):
+                    continue
+                if any(insn.dest in liveness.block_in[target] for _, target in exits) \
+                        and not runs_before_every_exit(name):
+                    continue
+                if isinstance(insn, ir.Call) and insn.fun.name in trapping_intrinsics \
+                        and operands[1] not in safe_divisors and not runs_first_on_every_path(name, i):
+                    continue
+                hoisted[name, i] = None
+                invariant.add(insn.dest)
+                found = True
+
+    return sorted(hoisted, key=lambda place: (position[place[0]], place[1]))
+
+
+def _has_side_effect(insn: ir.Instruction) -> bool:
+    return isinstance(insn, ir.Call) and insn.fun.name not in all_intrinsics
+
+
+def _side_effect_free_on_entry(cfg: ControlFlowGraph, loop: Loop, order: list[str]) -> dict[str, bool]:
+    """For each block of the loop, whether no path from the loop header to it can run a call with a
+    side effect."""
+    dirty: set[str] = set()
+    changed = True
+    while changed:
+        changed = False
+        for name in order:
+            block = cfg.blocks[name]
+            if name not in dirty and not any(_has_side_effect(insn) for insn in block.instructions):
+                continue
+            for succ in block.successors:
+                if succ in loop.blocks and succ != loop.header and succ not in dirty:
+                    dirty.add(succ)
+                    changed = True
+    return {name: name not in dirty for name in loop.blocks}
+
+
+def _remove_instructions(cfg: ControlFlowGraph, removed: list[tuple[str, int]]) -> None:
+    places = set(removed)
+    for block_name in {block_name for block_name, _ in removed}:
+        block = cfg.blocks[block_name]
+        block.instructions = [insn for i, insn in enumerate(block.instructions) if (block_name, i) not in places]
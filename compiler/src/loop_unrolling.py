@@ -0,0 +1,272 @@
+import dataclasses
+from dataclasses import dataclass
+
+from compiler.src import ir
+from compiler.src.cfg import ControlFlowGraph, build_cfg
+from compiler.src.dataflow import reaching_definitions
+from compiler.src.dominance import DominatorTree, Loop, enclosing_loops, natural_loops
+from compiler.src.induction_variables import InductionVariable, basic_induction_variables, known_constants
+from compiler.src.intrinsics import INT64_MIN
+from compiler.src.ir import IRVar, call_args, new_var_source
+from compiler.src.liveness import block_liveness
+
+# Loops are unrolled completely if all the copies of their body come to at most this many instructions.
+max_unrolled_size = 64
+
+# Loops that are too long to unroll completely have their body repeated this many times per iteration.
+unroll_factor = 4
+
+# The comparison that holds when the operands are swapped.
+_mirrored = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '==', '!=': '!='}
+
+
+@dataclass
+class CountedLoop:
+    """An innermost loop that tests an induction variable against a constant before each iteration,
+    and runs a number of times that is known at compile time."""
+    loop: Loop
+    body: list[str]
+    induction_variable: InductionVariable
+    initial_value: int
+    trip_count: int
+
+
+def unroll_loops(
+        instructions: list[ir.Instruction],
+        max_size: int = max_unrolled_size,
+        factor: int = unroll_factor,
+) -> list[ir.Instruction]:
+    """Copies the body of loops that run a constant number of times.
+
+    If the copies of the body for all the iterations fit in `max_size` instructions, the loop is
+    replaced by them. Otherwise, if `factor` copies fit, the loop runs `factor` copies per iteration,
+    testing its condition once for all of them, and the iterations left over run after the loop.
+    The copies keep updating the induction variable, so constant folding can then work out its
+    value in each of them.
+    """
+    cfg = build_cfg(instructions)
+    counted_loops = find_counted_loops(cfg, instructions)
+    if not counted_loops:
+        return instructions
+    new_var = new_var_source(instructions)
+    labels = {insn.name for insn in instructions if isinstance(insn, ir.Label)}
+
+    def new_label(label: ir.Label) -> ir.Label:
+        n = 1
+        while f'{label.name}_{n}' in labels:
+            n += 1
+        labels.add(f'{label.name}_{n}')
+        return ir.Label(label.location, f'{label.name}_{n}')
+
+    replaced: dict[str, list[ir.Instruction]] = {}
+    removed: set[str] = set()
+    for counted in counted_loops:
+        size = sum(
+            not isinstance(insn, ir.Label) for name in counted.body for insn in cfg.blocks[name].instructions
+        )
+        header = cfg.blocks[counted.loop.header]
+        header_label = header.label()
+        cond_jump = header.terminator()
+        assert header_label is not None and isinstance(cond_jump, ir.CondJump)
+
+        def copies(count: int, last_target: ir.Label) -> list[ir.Instruction]:
+            """The given number of copies of the body, one after the other, then a jump to `last_target`."""
+            renamed = [
+                {name: new_label(cfg.blocks[name].instructions[0]) for name in counted.body} for _ in range(count)
+            ]
+            code: list[ir.Instruction] = []
+            for k in range(count):
+                next_target = renamed[k + 1][counted.body[0]] if k + 1 < count else last_target
+                code += _copy_body(cfg, counted, renamed[k], next_target)
+            if count == 0:
+                code.append(ir.Jump(cond_jump.location, last_target))
+            return code
+
+        # The label and any constants the condition uses stay at the top.
+        code = header.instructions[:-2]
+        if counted.trip_count * size <= max_size:
+            code += copies(counted.trip_count, cond_jump.else_label)
+        elif factor > 1 and factor * size <= max_size and counted.trip_count >= factor:
+            induction_variable = counted.induction_variable
+            iterations = counted.trip_count // factor * factor
+            leftover = counted.trip_count - iterations
+            bound, cond = new_var(), new_var()
+            body_label = new_label(cond_jump.then_label)
+            leftover_label = new_label(cond_jump.else_label) if leftover else cond_jump.else_label
+            loc = cond_jump.location
+            code += [
+                ir.LoadIntConst(loc, counted.initial_value + iterations * induction_variable.step, bound),
+                ir.Call(loc, IRVar('!='), [induction_variable.var, bound], cond),
+                ir.CondJump(loc, cond, body_label, leftover_label),
+                body_label,
+                *copies(factor, header_label),
+            ]
+            if leftover:
+                code += [leftover_label, *copies(leftover, cond_jump.else_label)]
+        else:
+            continue
+        replaced[counted.loop.header] = code
+        removed.update(counted.body)
+
+    if not replaced:
+        return instructions
+    result: list[ir.Instruction] = []
+    # The blocks hold the instructions in their original order, and nothing outside a loop falls through
+    # into its body, so the other blocks can stay as they are.
+    for name, block in cfg.blocks.items():
+        if name not in removed:
+            result.extend(replaced.get(name, block.instructions))
+    return result
+
+
+def find_counted_loops(cfg: ControlFlowGraph, instructions: list[ir.Instruction]) -> list[CountedLoop]:
+    """Finds the innermost loops whose trip count is known at compile time.
+
+    The header of such a loop only loads constants and compares an induction variable with one of
+    them, and is the only way out of the loop. The induction variable is set to a constant before the
+    loop, and stepped exactly once per iteration.
+    """
+    dominators = DominatorTree(cfg)
+    loops = natural_loops(cfg, dominators)
+    if not loops:
+        return []
+    constants = known_constants(instructions)
+    liveness = block_liveness(cfg)
+    order = {name: i for i, name in enumerate(cfg.blocks)}
+    # Loops that contain another loop aren't innermost.
+    outer = {other.header for others in enclosing_loops(loops).values() for other in others}
+
+    candidates: list[tuple[Loop, list[str], InductionVariable, str, int]] = []
+    for loop in loops:
+        header = cfg.blocks[loop.header]
+        if loop.header in outer:
+            continue
+        match header.instructions:
+            case [ir.Label(), *loads, ir.Call() as compare, ir.CondJump() as cond_jump]:
+                pass
+            case _:
+                continue
+        if not all(isinstance(insn, (ir.LoadIntConst, ir.LoadBoolConst)) for insn in loads) \
+                or compare.fun.name not in _mirrored or cond_jump.cond != compare.dest \
+                or loop.exits(cfg) != [(loop.header, cond_jump.else_label.name)]:
+            continue
+        body = sorted(loop.blocks - {loop.header}, key=order.__getitem__)
+        if not body or body[0] != cond_jump.then_label.name or not _can_copy(cfg, loop, body):
+            continue
+        if any(
+                compare.dest in liveness.block_in[name]
+                for name in [cond_jump.then_label.name, cond_jump.else_label.name]
+        ):
+            continue
+
+        induction_variables = basic_induction_variables(cfg, loop, constants)
+        a, b = call_args(compare)
+        if a in induction_variables and b in constants:
+            induction_variable, op, limit = induction_variables[a], compare.fun.name, constants[b]
+        elif b in induction_variables and a in constants:
+            induction_variable, op, limit = induction_variables[b], _mirrored[compare.fun.name], constants[a]
+        else:
+            continue
+        latches = [name for name in header.predecessors if name in loop.blocks]
+        if not all(dominators.dominates(induction_variable.block, latch) for latch in latches):
+            continue
+
+        candidates.append((loop, body, induction_variable, op, limit))
+    if not candidates:
+        return []
+
+    # Only the definitions of the induction variables are needed, which keeps reaching definitions cheap.
+    definitions, reaching = reaching_definitions(cfg, {candidate[2].var for candidate in candidates})
+    counted_loops: list[CountedLoop] = []
+    for loop, body, induction_variable, op, limit in candidates:
+        # The definitions of the induction variable that can reach the loop from outside.
+        entering = 0
+        for pred in cfg.blocks[loop.header].predecessors:
+            if pred not in loop.blocks:
+                entering |= reaching.block_out[pred]
+        initial_values = set()
+        for name, i in definitions.members(entering):
+            insn = cfg.blocks[name].instructions[i]
+            if induction_variable.var not in ir.defined_vars(insn):
+                continue
+            initial_values.add(insn.value if isinstance(insn, ir.LoadIntConst) else None)
+        if len(initial_values) != 1 or None in initial_values:
+            continue
+
+        initial_value = initial_values.pop()
+        trip_count = _trip_count(op, initial_value, induction_variable.step, limit)
+        if trip_count is not None:
+            counted_loops.append(CountedLoop(loop, body, induction_variable, initial_value, trip_count))
+    return counted_loops
+
+
+def _can_copy(cfg: ControlFlowGraph, loop: Loop, body: list[str]) -> bool:
+    """Whether the body blocks, in this order, can be copied as they are: each starts with a label,
+    only jumps back to the header, and only falls through to the next one."""
+    for i, name in enumerate(body):
+        block = cfg.blocks[name]
+        terminator = block.terminator()
+        if block.label() is None:
+            return False
+        if loop.header in block.successors and not isinstance(terminator, ir.Jump):
+            return False
+        if terminator is None and (i + 1 == len(body) or block.successors != [body[i + 1]]):
+            return False
+    return True
+
+
+def _copy_body(
+        cfg: ControlFlowGraph,
+        counted: CountedLoop,
+        renamed: dict[str, ir.Label],
+        next_target: ir.Label,
+) -> list[ir.Instruction]:
+    """A copy of the loop body with its own labels, where the jumps back to the header go to `next_target`."""
+    def target(label: ir.Label) -> ir.Label:
+        if label.name == counted.loop.header:
+            return next_target
+        return renamed.get(label.name, label)
+
+    code: list[ir.Instruction] = []
+    for name in counted.body:
+        for insn in cfg.blocks[name].instructions:
+            match insn:
+                case ir.Label():
+                    insn = renamed[insn.name]
+                case ir.Jump():
+                    insn = dataclasses.replace(insn, label=target(insn.label))
+                case ir.CondJump():
+                    insn = dataclasses.replace(
+                        insn, then_label=target(insn.then_label), else_label=target(insn.else_label)
+                    )
+            code.append(insn)
+    return code
+
+
+def _trip_count(op: str, initial: int, step: int, limit: int) -> int | None:
+    """How many times `i op limit` holds for `i` starting at `initial` and growing by `step`, or None
+    if the variable would wrap around before the condition fails."""
+    holds = {
+        '<': initial < limit, '<=': initial <= limit, '>': initial > limit,
+        '>=': initial >= limit, '==': initial == limit, '!=': initial != limit,
+    }[op]
+    if not holds:
+        return 0
+    match op:
+        case '<' if step > 0:
+            count = -(-(limit - initial) // step)
+        case '<=' if step > 0:
+            count = (limit - initial) // step + 1
+        case '>' if step < 0:
+            count = -(-(initial - limit) // -step)
+        case '>=' if step < 0:
+            count = (initial - limit) // -step + 1
+        case '==' if step != 0:
+            count = 1
+        case '!=' if step != 0 and (limit - initial) % step == 0 and (limit - initial) // step > 0:
+            count = (limit - initial) // step
+        case _:
+            return None
+    if not INT64_MIN <= initial + count * step < -INT64_MIN:
+        return None
+    return count
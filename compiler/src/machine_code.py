@@ -0,0 +1,746 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+class EncodingException(Exception):
+    pass
+
+
+# The sections an object can have. '.bss' only has a size, as it is all zeroes.
+section_names = ('.text', '.rodata', '.data', '.bss')
+
+
+@dataclass
+class Relocation:
+    """A field of `size` bytes at `offset` in `section` that is filled in at link time.
+
+    `kind` is 'pc32' for `symbol + addend - (address of the field)`, 'abs32s' for `symbol + addend`
+    as a sign-extended 32-bit value, and 'abs64' for `symbol + addend` as a 64-bit value.
+    """
+    section: str
+    offset: int
+    kind: str
+    symbol: str
+    addend: int
+
+
+@dataclass
+class ObjectCode:
+    """Machine code and data assembled from one file, before its symbols get their final addresses.
+
+    Each symbol is a section and an offset in it, or None and a value for constants set with '='.
+    """
+    sections: dict[str, bytearray] = field(default_factory=lambda: {name: bytearray() for name in section_names[:3]})
+    bss_size: int = 0
+    alignments: dict[str, int] = field(default_factory=lambda: {name: 1 for name in section_names})
+    symbols: dict[str, tuple[str | None, int]] = field(default_factory=dict)
+    global_symbols: set[str] = field(default_factory=set)
+    relocations: list[Relocation] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Register:
+    name: str
+    number: int
+    size: int
+
+
+# An expression is a sum of terms, each a sign and an integer, a symbol or '.' for the current location.
+Expression = tuple[tuple[int, int | str], ...]
+
+
+@dataclass(frozen=True)
+class Immediate:
+    value: Expression
+
+
+@dataclass(frozen=True)
+class Memory:
+    displacement: Expression
+    base: Register | None = None
+    index: Register | None = None
+    scale: int = 1
+    rip_relative: bool = False
+
+
+Operand = Register | Immediate | Memory
+
+
+def _register_table() -> dict[str, Register]:
+    names64 = ['rax', 'rcx', 'rdx', 'rbx', 'rsp', 'rbp', 'rsi', 'rdi']
+    names32 = ['eax', 'ecx', 'edx', 'ebx', 'esp', 'ebp', 'esi', 'edi']
+    names16 = ['ax', 'cx', 'dx', 'bx', 'sp', 'bp', 'si', 'di']
+    names8 = ['al', 'cl', 'dl', 'bl', 'spl', 'bpl', 'sil', 'dil']
+    table: dict[str, Register] = {}
+    for size, names, suffix in [(8, names64, ''), (4, names32, 'd'), (2, names16, 'w'), (1, names8, 'b')]:
+        for number in range(16):
+            name = names[number] if number < 8 else f'r{number}{suffix}'
+            table[name] = Register(name, number, size)
+    return table
+
+
+registers = _register_table()
+
+# The x86 encodings of the condition codes, for 'jcc' and 'setcc'.
+condition_encodings = {
+    'o': 0, 'no': 1, 'b': 2, 'c': 2, 'nae': 2, 'ae': 3, 'nb': 3, 'nc': 3, 'e': 4, 'z': 4, 'ne': 5, 'nz': 5,
+    'be': 6, 'na': 6, 'a': 7, 'nbe': 7, 's': 8, 'ns': 9, 'p': 10, 'pe': 10, 'np': 11, 'po': 11,
+    'l': 12, 'nge': 12, 'ge': 13, 'nl': 13, 'le': 14, 'ng': 14, 'g': 15, 'nle': 15,
+}
+
+_size_suffixes = {'b': 1, 'w': 2, 'l': 4, 'q': 8}
+
+
+@dataclass
+class _Field:
+    """A field of an instruction whose value depends on a symbol."""
+    offset: int
+    size: int
+    kind: str
+    value: Expression
+
+
+@dataclass
+class _Code:
+    """The bytes of one instruction, with fields that are filled in once symbols have values."""
+    data: bytearray = field(default_factory=bytearray)
+    fields: list[_Field] = field(default_factory=list)
+
+    def add_field(self, size: int, kind: str, value: Expression) -> None:
+        self.fields.append(_Field(len(self.data), size, kind, value))
+        self.data += bytes(size)
+
+
+# Encodes an instruction from its mnemonic without the size suffix, its size in bytes (None if the
+# mnemonic has no suffix), and its operands.
+Encoder = Callable[[str, int | None, list[Operand]], _Code]
+
+all_encoders: dict[str, Encoder] = {}
+
+
+def _encoder(*names: str) -> Callable[[Encoder], Encoder]:
+    """Function decorator that registers that function as the encoder of the mnemonics."""
+
+    def wrapper(f: Encoder) -> Encoder:
+        for name in names:
+            assert name not in all_encoders
+            all_encoders[name] = f
+        return f
+
+    return wrapper
+
+
+def assemble_object(assembly_code: str) -> ObjectCode:
+    """Assembles the AT&T syntax that `generate_assembly` and the runtime use into machine code.
+
+    Only the instructions and directives the compiler emits are supported. Jumps within a section
+    start out in their short form and are made longer until every one of them reaches its target,
+    as 'as' does, so the code comes out byte for byte the same.
+    """
+    statements = [statement for i, line in enumerate(assembly_code.split('\n')) for statement in _parse_line(line, i + 1)]
+    defined = {statement[1] for statement in statements if statement[0] in ('label', 'assign')}
+    long_jumps: set[int] = set()
+    previous: dict[str, tuple[str | None, int]] = {}
+    while True:
+        obj, grown = _assemble_pass(statements, defined, previous, long_jumps)
+        if not grown and obj.symbols == previous:
+            return obj
+        previous = obj.symbols
+
+
+def _assemble_pass(
+        statements: list[tuple],
+        defined: set[str],
+        previous: dict[str, tuple[str | None, int]],
+        long_jumps: set[int],
+) -> tuple[ObjectCode, bool]:
+    """Lays out the code once, with the addresses of symbols not yet seen taken from the `previous` pass.
+
+    Adds the jumps that don't reach their target to `long_jumps`, and returns whether there were any.
+    """
+    obj = ObjectCode()
+    section = '.text'
+    grown = False
+
+    def position() -> int:
+        return obj.bss_size if section == '.bss' else len(obj.sections[section])
+
+    def lookup(name: str) -> tuple[str | None, int] | None:
+        if name in obj.symbols:
+            return obj.symbols[name]
+        return previous.get(name)
+
+    def evaluate(value: Expression) -> tuple[int, str | None]:
+        """The value of an expression, as a constant and the symbol it is relative to, if any."""
+        constant = 0
+        relative: list[tuple[int, str, tuple[str | None, int] | None]] = []
+        for sign, term in value:
+            if isinstance(term, int):
+                constant += sign * term
+                continue
+            symbol = (section, position()) if term == '.' else lookup(term)
+            if symbol is not None and symbol[0] is None:
+                constant += sign * symbol[1]
+            else:
+                relative.append((sign, term, symbol))
+        # A difference of two symbols in the same section is a constant.
+        for plus in [r for r in relative if r[0] > 0 and r[2] is not None]:
+            minus = next((r for r in relative if r[0] < 0 and r[2] is not None and r[2][0] == plus[2][0]), None)
+            if minus is not None:
+                relative.remove(plus)
+                relative.remove(minus)
+                constant += plus[2][1] - minus[2][1]  # type: ignore
+        if not relative:
+            return constant, None
+        if len(relative) == 1 and relative[0][0] > 0 and relative[0][1] != '.':
+            return constant, relative[0][1]
+        if any(name in defined and symbol is None for _, name, symbol in relative):
+            return 0, None  # A symbol that only gets an address later in the first pass
+        raise EncodingException(f'cannot express {_format_expression(value)} in an object file')
+
+    def emit(code: _Code) -> None:
+        start = position()
+        # The same instruction is laid out again in each pass, so its bytes are left as they were parsed.
+        code = _Code(bytearray(code.data), code.fields)
+        for f in code.fields:
+            constant, symbol = evaluate(f.value)
+            if f.kind == 'pc32':
+                # Relative to the end of the instruction.
+                constant -= len(code.data) - f.offset
+                target = lookup(symbol) if symbol is not None else None
+                if target is not None and target[0] == section:
+                    value = target[1] + constant - (start + f.offset)
+                    code.data[f.offset:f.offset + 4] = _signed(value, 4)
+                    continue
+                if symbol is None:
+                    raise EncodingException('a relative address needs a symbol')
+            elif symbol is None:
+                code.data[f.offset:f.offset + f.size] = _signed(constant, f.size) if f.kind != 'abs64' \
+                    else (constant % 2 ** 64).to_bytes(8, 'little')
+                continue
+            elif f.kind not in ('abs32s', 'abs64'):
+                raise EncodingException(f'a field of {f.size} bytes cannot hold an address')
+            obj.relocations.append(Relocation(section, start + f.offset, f.kind, symbol, constant))
+        if section == '.bss':
+            if any(code.data):
+                raise EncodingException(f'section .bss can only hold zeroes')
+            obj.bss_size += len(code.data)
+        else:
+            obj.sections[section] += code.data
+
+    for index, statement in enumerate(statements):
+        kind, line = statement[0], statement[-1]
+        try:
+            match kind:
+                case 'label':
+                    if statement[1] in obj.symbols:
+                        raise EncodingException(f'symbol {statement[1]} is already defined')
+                    obj.symbols[statement[1]] = (section, position())
+                case 'assign':
+                    constant, symbol = evaluate(statement[2])
+                    target = lookup(symbol) if symbol is not None else (None, 0)
+                    if target is not None:
+                        obj.symbols[statement[1]] = (target[0], target[1] + constant)
+                    elif symbol not in defined:
+                        raise EncodingException(f'cannot set {statement[1]} to an external symbol')
+                case 'section':
+                    section = statement[1]
+                case 'global':
+                    obj.global_symbols.add(statement[1])
+                case 'align':
+                    alignment = statement[1]
+                    obj.alignments[section] = max(obj.alignments[section], alignment)
+                    padding = -position() % alignment
+                    emit(_Code(bytearray(b'\x90' * padding if section == '.text' else bytes(padding))))
+                case 'skip':
+                    constant, symbol = evaluate(statement[1])
+                    if symbol is not None or constant < 0:
+                        raise EncodingException('.skip needs a size known at this point')
+                    emit(_Code(bytearray(constant)))
+                case 'data':
+                    code = _Code()
+                    for size, value in statement[1]:
+                        if isinstance(value, bytes):
+                            code.data += value
+                        else:
+                            code.add_field(size, 'abs64' if size == 8 else 'abs32s' if size == 4 else 'data', value)
+                    emit(code)
+                case 'jump':
+                    mnemonic, target = statement[1], statement[2]
+                    constant, symbol = evaluate(target)
+                    destination = lookup(symbol) if symbol is not None else None
+                    local = symbol is not None and symbol in defined and (destination is None or destination[0] == section)
+                    if mnemonic != 'call' and local and index not in long_jumps:
+                        offset = (destination[1] if destination is not None else position()) + constant - (position() + 2)
+                        if -128 <= offset < 128:
+                            opcode = 0xeb if mnemonic == 'jmp' else 0x70 + condition_encodings[mnemonic[1:]]
+                            obj.sections[section] += bytes([opcode]) + _signed(offset, 1)
+                            continue
+                        long_jumps.add(index)
+                        grown = True
+                    code = _Code(bytearray(
+                        b'\xe8' if mnemonic == 'call' else b'\xe9' if mnemonic == 'jmp'
+                        else bytes([0x0f, 0x80 + condition_encodings[mnemonic[1:]]])
+                    ))
+                    code.add_field(4, 'pc32', target)
+                    emit(code)
+                case 'instruction':
+                    emit(statement[1])
+        except EncodingException as e:
+            raise EncodingException(f'Line {line}: {e}') from None
+    for name in obj.global_symbols:
+        if name not in obj.symbols:
+            raise EncodingException(f'Global symbol {name} is not defined')
+    return obj, grown
+
+
+def _signed(value: int, size: int) -> bytes:
+    if not -2 ** (8 * size - 1) <= value < 2 ** (8 * size):
+        raise EncodingException(f'value {value} does not fit in {size} bytes')
+    return (value % 2 ** (8 * size)).to_bytes(size, 'little')
+
+
+def _format_expression(value: Expression) -> str:
+    return ' '.join(f'{"+" if sign > 0 else "-"} {term}' for sign, term in value)
+
+
+_symbol = r'[A-Za-z_.$][\w.$]*'
+
+
+def _parse_line(text: str, line: int) -> list[tuple]:
+    """Parses a line into statements: labels, assignments, directives, jumps and encoded instructions.
+
+    Each statement is a tuple of its kind, its contents, and the line number last.
+    """
+    text = _strip_comment(text).strip()
+    statements: list[tuple] = []
+    while (label := re.match(rf'({_symbol}):\s*', text)) is not None:
+        statements.append(('label', label.group(1), line))
+        text = text[label.end():]
+    if not text:
+        return statements
+    try:
+        if (assignment := re.fullmatch(rf'({_symbol})\s*=\s*(.+)', text)) is not None:
+            return statements + [('assign', assignment.group(1), _parse_expression(assignment.group(2)), line)]
+        mnemonic, _, rest = text.partition(' ')
+        rest = rest.strip()
+        if mnemonic.startswith('.'):
+            return statements + _parse_directive(mnemonic, rest, line)
+        if mnemonic == 'rep':
+            return statements + [('instruction', _rep(rest), line)]
+        operands = [_parse_operand(op.strip()) for op in re.split(r',\s*(?![^()]*\))', rest)] if rest else []
+        if mnemonic in ('jmp', 'call') or (mnemonic[0] == 'j' and mnemonic[1:] in condition_encodings):
+            match operands:
+                case [Memory(displacement=target, base=None, index=None, rip_relative=False)]:
+                    return statements + [('jump', mnemonic, target, line)]
+            raise EncodingException(f'{mnemonic} only supports jumping to a label')
+        if mnemonic in all_encoders:
+            size = None
+            encoder = all_encoders[mnemonic]
+        elif mnemonic[:-1] in all_encoders and mnemonic[-1] in _size_suffixes:
+            size = _size_suffixes[mnemonic[-1]]
+            encoder = all_encoders[mnemonic[:-1]]
+        else:
+            raise EncodingException(f'unsupported instruction {mnemonic}')
+        name = mnemonic if size is None else mnemonic[:-1]
+        return statements + [('instruction', encoder(name, size, operands), line)]
+    except EncodingException as e:
+        raise EncodingException(f'Line {line}: {e}: {text}') from None
+
+
+def _strip_comment(text: str) -> str:
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            in_string = not in_string
+        elif char == '#' and not in_string:
+            return text[:i]
+    return text
+
+
+def _parse_directive(directive: str, rest: str, line: int) -> list[tuple]:
+    args = [arg.strip() for arg in rest.split(',')] if rest else []
+    match directive:
+        case '.global' | '.globl':
+            return [('global', name, line) for name in args]
+        case '.extern' | '.type' | '.size' | '.file':
+            return []
+        case '.text' | '.data' | '.bss':
+            return [('section', directive, line)]
+        case '.section' if args and args[0] in section_names:
+            return [('section', args[0], line)]
+        case '.align' | '.balign' if len(args) == 1 and args[0].isdigit() and int(args[0]) > 0:
+            return [('align', int(args[0]), line)]
+        case '.skip' | '.zero' if len(args) == 1:
+            return [('skip', _parse_expression(args[0]), line)]
+        case '.ascii' | '.asciz' | '.string':
+            data = b''.join(_parse_string(s) for s in re.findall(r'"(?:[^"\\]|\\.)*"', rest))
+            return [('data', [(len(data), data + (b'\0' if directive != '.ascii' else b''))], line)]
+        case '.byte' | '.word' | '.short' | '.long' | '.int' | '.quad':
+            size = {'.byte': 1, '.word': 2, '.short': 2, '.long': 4, '.int': 4, '.quad': 8}[directive]
+            return [('data', [(size, _parse_expression(arg)) for arg in args], line)]
+    raise EncodingException(f'unsupported directive {directive}')
+
+
+def _parse_string(literal: str) -> bytes:
+    escapes = {'n': b'\n', 't': b'\t', 'r': b'\r', '0': b'\0', '\\': b'\\', '"': b'"'}
+    result = bytearray()
+    i = 1
+    while i < len(literal) - 1:
+        if literal[i] == '\\':
+            if literal[i + 1] not in escapes:
+                raise EncodingException(f'unsupported escape in {literal}')
+            result += escapes[literal[i + 1]]
+            i += 2
+        else:
+            result += literal[i].encode()
+            i += 1
+    return bytes(result)
+
+
+def _parse_expression(text: str) -> Expression:
+    terms: list[tuple[int, int | str]] = []
+    for sign, term in re.findall(r'\s*([+-]?)\s*([\w.$]+)', text):
+        try:
+            value: int | str = int(term, 0) if term[0].isdigit() else term
+        except ValueError:
+            raise EncodingException(f'cannot parse number {term}') from None
+        terms.append((-1 if sign == '-' else 1, value))
+    if not terms or re.sub(r'[\s+-]|[\w.$]+', '', text):
+        raise EncodingException(f'cannot parse expression {text}')
+    return tuple(terms)
+
+
+def _parse_operand(text: str) -> Operand:
+    if text.startswith('%'):
+        if text[1:] not in registers:
+            raise EncodingException(f'unknown register {text}')
+        return registers[text[1:]]
+    if text.startswith('$'):
+        return Immediate(_parse_expression(text[1:]))
+    if (memory := re.fullmatch(r'([^(]*)\(\s*(%\w+)?\s*(?:,\s*(%\w+)\s*(?:,\s*(\d+))?)?\s*\)', text)) is not None:
+        displacement, base, index, scale = memory.groups()
+        displacement_value = _parse_expression(displacement) if displacement.strip() else ((1, 0),)
+        if base == '%rip':
+            return Memory(displacement_value, rip_relative=True)
+        base_register = _parse_operand(base) if base else None
+        index_register = _parse_operand(index) if index else None
+        if (base_register is not None and base_register.size != 8) or \
+                (index_register is not None and (index_register.size != 8 or index_register.number == 4)):
+            raise EncodingException(f'unsupported address {text}')
+        if scale is not None and scale not in ('1', '2', '4', '8'):
+            raise EncodingException(f'unsupported scale in {text}')
+        return Memory(displacement_value, base_register, index_register, int(scale or 1))  # type: ignore
+    # A plain expression is an absolute address, or the target of a jump.
+    return Memory(_parse_expression(text))
+
+
+def _is_constant(value: Expression) -> bool:
+    return all(isinstance(term, int) for _, term in value)
+
+
+def _constant(value: Expression) -> int:
+    return sum(sign * term for sign, term in value)  # type: ignore
+
+
+def _fits(value: Expression, size: int) -> bool:
+    """Whether the expression is a constant that fits in a sign-extended field of `size` bytes."""
+    return _is_constant(value) and -2 ** (8 * size - 1) <= _constant(value) < 2 ** (8 * size - 1)
+
+
+def _operand_size(size: int | None, operands: list[Operand]) -> int:
+    """The size of the operation, from the mnemonic's suffix or else from its register operands."""
+    register_sizes = {op.size for op in operands if isinstance(op, Register)}
+    if size is None:
+        if len(register_sizes) != 1:
+            raise EncodingException('operand size is ambiguous')
+        return register_sizes.pop()
+    if register_sizes - {size}:
+        raise EncodingException('operand sizes do not match')
+    return size
+
+
+def _instruction(
+        opcode: bytes,
+        size: int,
+        reg: int,
+        rm: Operand,
+        immediate: tuple[int, Expression] | None = None,
+        other_registers: tuple[Register, ...] = (),
+        default_64: bool = False,
+) -> _Code:
+    """Encodes an instruction with a ModRM byte, whose reg field is `reg` and r/m operand is `rm`.
+
+    The prefixes come from the operation size, and from `other_registers` the instruction uses besides `rm`.
+    """
+    code = _Code()
+    if size == 2:
+        code.data.append(0x66)
+    rex = 0x48 if size == 8 and not default_64 else 0x40
+    rex |= (reg >> 3 & 1) << 2
+    byte_registers = [r for r in (rm, *other_registers) if isinstance(r, Register) and r.size == 1]
+    needs_rex = any(4 <= r.number < 8 for r in byte_registers)
+    if isinstance(rm, Register):
+        rex |= rm.number >> 3
+    elif isinstance(rm, Memory):
+        rex |= (rm.index.number >> 3 if rm.index is not None else 0) << 1
+        rex |= rm.base.number >> 3 if rm.base is not None else 0
+    if rex != 0x40 or needs_rex:
+        code.data.append(rex)
+    code.data += opcode
+    _modrm(code, reg & 7, rm)
+    if immediate is not None:
+        immediate_size, value = immediate
+        code.add_field(immediate_size, 'abs64' if immediate_size == 8 else 'abs32s', value)
+    return code
+
+
+def _modrm(code: _Code, reg: int, rm: Operand) -> None:
+    if isinstance(rm, Register):
+        code.data.append(0xc0 | reg << 3 | rm.number & 7)
+        return
+    assert isinstance(rm, Memory)
+    displacement = rm.displacement
+    if rm.rip_relative:
+        code.data.append(reg << 3 | 5)
+        code.add_field(4, 'pc32', displacement)
+        return
+    scale = {1: 0, 2: 1, 4: 2, 8: 3}[rm.scale]
+    index = rm.index.number & 7 if rm.index is not None else 4
+    if rm.base is None:
+        code.data += bytes([reg << 3 | 4, scale << 6 | index << 3 | 5])
+        code.add_field(4, 'abs32s', displacement)
+        return
+    base = rm.base.number & 7
+    if _is_constant(displacement) and _constant(displacement) == 0 and base != 5:
+        mod = 0
+    elif _fits(displacement, 1):
+        mod = 1
+    else:
+        mod = 2
+    if rm.index is not None or base == 4:
+        code.data += bytes([mod << 6 | reg << 3 | 4, scale << 6 | index << 3 | base])
+    else:
+        code.data.append(mod << 6 | reg << 3 | base)
+    if mod == 1:
+        code.data += _signed(_constant(displacement), 1)
+    elif mod == 2:
+        code.add_field(4, 'abs32s', displacement)
+
+
+def _immediate_size(size: int) -> int:
+    return min(size, 4)
+
+
+_alu_operations = {'add': 0, 'or': 1, 'adc': 2, 'sbb': 3, 'and': 4, 'sub': 5, 'xor': 6, 'cmp': 7}
+
+
+@_encoder(*_alu_operations)
+def _alu(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    operation = _alu_operations[name]
+    size = _operand_size(size, operands)
+    byte = size == 1
+    match operands:
+        case [Immediate(value=value), (Register() | Memory()) as dest]:
+            if not byte and _fits(value, 1):
+                return _instruction(b'\x83', size, operation, dest, (1, value))
+            if not _is_constant(value) or _fits(value, _immediate_size(size)):
+                if isinstance(dest, Register) and dest.number == 0:
+                    # The accumulator has a form without a ModRM byte.
+                    return _accumulator_form(bytes([operation << 3 | (4 if byte else 5)]), size, value)
+                return _instruction(b'\x80' if byte else b'\x81', size, operation, dest, (_immediate_size(size), value))
+        case [Register() as source, (Register() | Memory()) as dest]:
+            return _instruction(bytes([operation << 3 | (0 if byte else 1)]), size, source.number, dest, None, (source,))
+        case [Memory() as source, Register() as dest]:
+            return _instruction(bytes([operation << 3 | (2 if byte else 3)]), size, dest.number, source, None, (dest,))
+    raise EncodingException('unsupported operands')
+
+
+def _accumulator_form(opcode: bytes, size: int, value: Expression) -> _Code:
+    code = _Code()
+    if size == 2:
+        code.data.append(0x66)
+    if size == 8:
+        code.data.append(0x48)
+    code.data += opcode
+    code.add_field(_immediate_size(size), 'abs32s', value)
+    return code
+
+
+@_encoder('test')
+def _test(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    size = _operand_size(size, operands)
+    byte = size == 1
+    match operands:
+        case [Immediate(value=value), (Register() | Memory()) as dest] \
+                if not _is_constant(value) or _fits(value, _immediate_size(size)):
+            if isinstance(dest, Register) and dest.number == 0:
+                return _accumulator_form(b'\xa8' if byte else b'\xa9', size, value)
+            return _instruction(b'\xf6' if byte else b'\xf7', size, 0, dest, (_immediate_size(size), value))
+        case [Register() as source, (Register() | Memory()) as dest]:
+            return _instruction(b'\x84' if byte else b'\x85', size, source.number, dest, None, (source,))
+        case [Memory() as source, Register() as dest]:
+            return _instruction(b'\x84' if byte else b'\x85', size, dest.number, source, None, (dest,))
+    raise EncodingException('unsupported operands')
+
+
+@_encoder('mov', 'movabs')
+def _mov(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    size = _operand_size(size, operands)
+    byte = size == 1
+    match operands:
+        case [Immediate(value=value), Register() as dest]:
+            # A 64-bit immediate needs 'movabs', which 'as' also picks for 'movq' when the value is too large.
+            if size == 8 and (name == 'movabs' or _is_constant(value) and not _fits(value, 4)):
+                return _register_in_opcode(0xb8, size, dest, (8, value))
+            if size == 8:
+                return _instruction(b'\xc7', size, 0, dest, (4, value))
+            return _register_in_opcode(0xb0 if byte else 0xb8, size, dest, (size, value))
+        case [Immediate(value=value), Memory() as dest] if name == 'mov':
+            return _instruction(b'\xc6' if byte else b'\xc7', size, 0, dest, (_immediate_size(size), value))
+        case [Register() as source, (Register() | Memory()) as dest] if name == 'mov':
+            return _instruction(b'\x88' if byte else b'\x89', size, source.number, dest, None, (source,))
+        case [Memory() as source, Register() as dest] if name == 'mov':
+            return _instruction(b'\x8a' if byte else b'\x8b', size, dest.number, source, None, (dest,))
+    raise EncodingException('unsupported operands')
+
+
+def _register_in_opcode(opcode: int, size: int, register: Register, immediate: tuple[int, Expression] | None,
+                        default_64: bool = False) -> _Code:
+    """Encodes an instruction that adds the register's number to its opcode, like 'mov $imm, %reg' or 'push'."""
+    code = _Code()
+    if size == 2:
+        code.data.append(0x66)
+    rex = 0x48 if size == 8 and not default_64 else 0x40
+    rex |= register.number >> 3
+    if rex != 0x40 or (size == 1 and 4 <= register.number < 8):
+        code.data.append(rex)
+    code.data.append(opcode + (register.number & 7))
+    if immediate is not None:
+        immediate_size, value = immediate
+        code.add_field(immediate_size, 'abs64' if immediate_size == 8 else 'abs32s', value)
+    return code
+
+
+# Moves with zero or sign extension, with their opcode and the sizes of their source and destination.
+_extending_moves = {
+    'movzbw': (b'\x0f\xb6', 1, 2), 'movzbl': (b'\x0f\xb6', 1, 4), 'movzbq': (b'\x0f\xb6', 1, 8),
+    'movzwl': (b'\x0f\xb7', 2, 4), 'movzwq': (b'\x0f\xb7', 2, 8),
+    'movsbw': (b'\x0f\xbe', 1, 2), 'movsbl': (b'\x0f\xbe', 1, 4), 'movsbq': (b'\x0f\xbe', 1, 8),
+    'movswl': (b'\x0f\xbf', 2, 4), 'movswq': (b'\x0f\xbf', 2, 8), 'movslq': (b'\x63', 4, 8),
+}
+
+
+@_encoder(*_extending_moves)
+def _extending_move(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    opcode, source_size, dest_size = _extending_moves[name]
+    match operands:
+        case [(Register() | Memory()) as source, Register() as dest] \
+                if dest.size == dest_size and (not isinstance(source, Register) or source.size == source_size):
+            return _instruction(opcode, dest_size, dest.number, source, None, (dest,))
+    raise EncodingException('unsupported operands')
+
+
+@_encoder('lea')
+def _lea(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    match operands:
+        case [Memory() as source, Register() as dest] if not size or size == dest.size:
+            return _instruction(b'\x8d', dest.size, dest.number, source)
+    raise EncodingException('unsupported operands')
+
+
+# Instructions on one operand, with the reg field that selects them after opcode 0xf6, 0xf7, 0xfe or 0xff.
+_unary_operations = {'inc': (0xfe, 0), 'dec': (0xfe, 1), 'not': (0xf6, 2), 'neg': (0xf6, 3),
+                     'mul': (0xf6, 4), 'div': (0xf6, 6), 'idiv': (0xf6, 7)}
+
+
+@_encoder(*_unary_operations)
+def _unary(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    opcode, operation = _unary_operations[name]
+    match operands:
+        case [(Register() | Memory()) as operand]:
+            size = _operand_size(size, operands)
+            return _instruction(bytes([opcode if size == 1 else opcode + 1]), size, operation, operand)
+    raise EncodingException('unsupported operands')
+
+
+@_encoder('imul')
+def _imul(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    size = _operand_size(size, operands)
+    match operands:
+        case [(Register() | Memory()) as operand]:
+            return _instruction(b'\xf6' if size == 1 else b'\xf7', size, 5, operand)
+        case [Immediate() as factor, Register() as dest]:
+            return _imul(name, size, [factor, dest, dest])
+        case [(Register() | Memory()) as source, Register() as dest] if size > 1:
+            return _instruction(b'\x0f\xaf', size, dest.number, source, None, (dest,))
+        case [Immediate(value=value), (Register() | Memory()) as source, Register() as dest] if size > 1:
+            if _fits(value, 1):
+                return _instruction(b'\x6b', size, dest.number, source, (1, value), (dest,))
+            return _instruction(b'\x69', size, dest.number, source, (_immediate_size(size), value), (dest,))
+    raise EncodingException('unsupported operands')
+
+
+_shift_operations = {'rol': 0, 'ror': 1, 'rcl': 2, 'rcr': 3, 'shl': 4, 'sal': 4, 'shr': 5, 'sar': 7}
+
+
+@_encoder(*_shift_operations)
+def _shift(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    operation = _shift_operations[name]
+    # The shift count can be in %cl, whatever the size of the shifted operand.
+    size = _operand_size(size, operands[-1:])
+    byte = size == 1
+    match operands:
+        case [(Register() | Memory()) as operand] | [Immediate(value=((1, 1),)), (Register() | Memory()) as operand]:
+            return _instruction(b'\xd0' if byte else b'\xd1', size, operation, operand)
+        case [Immediate(value=value), (Register() | Memory()) as operand] if _is_constant(value):
+            return _instruction(b'\xc0' if byte else b'\xc1', size, operation, operand, (1, value))
+        case [Register(name='cl'), (Register() | Memory()) as operand]:
+            return _instruction(b'\xd2' if byte else b'\xd3', size, operation, operand)
+    raise EncodingException('unsupported operands')
+
+
+@_encoder('push', 'pop')
+def _push_pop(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    match operands:
+        case [Register(size=8) as register] if size in (None, 8):
+            return _register_in_opcode(0x50 if name == 'push' else 0x58, 8, register, None, default_64=True)
+        case [Immediate(value=value)] if name == 'push' and size in (None, 8):
+            code = _Code(bytearray(b'\x6a' if _fits(value, 1) else b'\x68'))
+            code.add_field(1 if _fits(value, 1) else 4, 'abs32s', value)
+            return code
+    raise EncodingException('unsupported operands')
+
+
+@_encoder(*(f'set{condition}' for condition in condition_encodings))
+def _set(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    match operands:
+        case [Register(size=1) | Memory() as dest]:
+            return _instruction(bytes([0x0f, 0x90 + condition_encodings[name[3:]]]), 1, 0, dest)
+    raise EncodingException('unsupported operands')
+
+
+# Instructions without operands.
+_fixed_encodings = {
+    'ret': b'\xc3', 'syscall': b'\x0f\x05', 'cqto': b'\x48\x99', 'cltq': b'\x48\x98', 'cltd': b'\x99',
+    'nop': b'\x90', 'leave': b'\xc9', 'hlt': b'\xf4', 'ud2': b'\x0f\x0b', 'movsb': b'\xa4', 'stosb': b'\xaa',
+}
+
+
+@_encoder(*_fixed_encodings)
+def _fixed(name: str, size: int | None, operands: list[Operand]) -> _Code:
+    if operands or size is not None:
+        raise EncodingException('unsupported operands')
+    return _Code(bytearray(_fixed_encodings[name]))
+
+
+def _rep(instruction: str) -> _Code:
+    if instruction not in ('movsb', 'stosb'):
+        raise EncodingException(f'rep is not supported with {instruction}')
+    return _Code(bytearray(b'\xf3' + _fixed_encodings[instruction]))
@@ -0,0 +1,183 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+
+# A rule looks at a window of consecutive instructions and returns their replacement,
+# or None if it doesn't apply.
+Rewrite = Callable[[list[str]], list[str] | None]
+
+
+@dataclass
+class PeepholeRule:
+    name: str
+    window: int
+    rewrite: Rewrite
+
+
+all_rules: dict[str, PeepholeRule] = {}
+
+
+def _rule(name: str, window: int) -> Callable[[Rewrite], Rewrite]:
+    """Function decorator that registers that function as a peephole rule over `window` instructions."""
+
+    def wrapper(f: Rewrite) -> Rewrite:
+        assert name not in all_rules
+        all_rules[name] = PeepholeRule(name, window, f)
+        return f
+
+    return wrapper
+
+
+def optimize_assembly(
+        lines: list[str],
+        rules: list[PeepholeRule] | None = None,
+        hits: Counter[str] | None = None,
+) -> list[str]:
+    """Applies the peephole rules to the assembly lines until none of them matches anymore.
+
+    Comments are skipped over, so they don't stop a rule from matching the instructions around them.
+    A label ends every window, as other code may jump to it. The number of times each rule was
+    applied is added to `hits`.
+    """
+    rules = list(all_rules.values()) if rules is None else rules
+    longest = max((rule.window for rule in rules), default=1)
+
+    # Each instruction keeps the comments that came before it.
+    code: list[str] = []
+    comments: list[list[str]] = []
+    pending: list[str] = []
+    for line in lines:
+        if line.startswith('#'):
+            pending.append(line)
+        else:
+            code.append(line)
+            comments.append(pending)
+            pending = []
+
+    i = 0
+    while i < len(code):
+        for rule in rules:
+            window = code[i:i + rule.window]
+            if len(window) < rule.window or any(_is_label(line) for line in window):
+                continue
+            replacement = rule.rewrite(window)
+            if replacement is None:
+                continue
+            if hits is not None:
+                hits[rule.name] += 1
+            # Comments stay in place. Those of removed instructions move to the instruction after the window.
+            kept = comments[i:i + min(len(replacement), rule.window)]
+            dropped = [line for c in comments[i + len(kept):i + rule.window] for line in c]
+            code[i:i + rule.window] = replacement
+            comments[i:i + rule.window] = kept + [[] for _ in replacement[len(kept):]]
+            following = i + len(replacement)
+            if following < len(comments):
+                comments[following] = dropped + comments[following]
+            else:
+                pending = dropped + pending
+            # The replacement may complete a pattern that starts a little earlier.
+            i = max(i - longest + 1, 0)
+            break
+        else:
+            i += 1
+
+    result: list[str] = []
+    for c, line in zip(comments, code):
+        result.extend(c)
+        result.append(line)
+    result.extend(pending)
+    return result
+
+
+def _is_label(line: str) -> bool:
+    return line.endswith(':')
+
+
+def _parse(line: str) -> tuple[str, list[str]]:
+    """Splits an instruction into its mnemonic and operands. Commas inside parentheses don't separate operands."""
+    mnemonic, _, rest = line.partition(' ')
+    return mnemonic, [op.strip() for op in re.split(r',\s*(?![^()]*\))', rest)] if rest else []
+
+
+_register_aliases = {
+    f'%r{name}x': {f'%r{name}x', f'%e{name}x', f'%{name}x', f'%{name}l', f'%{name}h'} for name in 'abcd'
+} | {
+    f'%r{name}': {f'%r{name}', f'%e{name}', f'%{name}', f'%{name}l'} for name in ('si', 'di', 'bp', 'sp')
+} | {
+    f'%r{n}': {f'%r{n}', f'%r{n}d', f'%r{n}w', f'%r{n}b'} for n in range(8, 16)
+}
+
+
+def _mentions(operand: str, register: str) -> bool:
+    """Whether the operand reads or is any part of the 64-bit register."""
+    return any(re.search(re.escape(alias) + r'\b', operand) for alias in _register_aliases.get(register, {register}))
+
+
+def _is_register(operand: str) -> bool:
+    return operand in _register_aliases
+
+
+def _is_memory(operand: str) -> bool:
+    return operand.endswith(')')
+
+
+@_rule('self_move', 1)
+def _self_move(window: list[str]) -> list[str] | None:
+    mnemonic, ops = _parse(window[0])
+    if mnemonic == 'movq' and ops[0] == ops[1]:
+        return []
+    return None
+
+
+@_rule('reload_after_store', 2)
+def _reload_after_store(window: list[str]) -> list[str] | None:
+    # 'movq X, slot; movq slot, %r' reads the value back from X instead, where X is a register or an immediate.
+    first, ops1 = _parse(window[0])
+    second, ops2 = _parse(window[1])
+    if first != 'movq' or second != 'movq' or not _is_memory(ops1[1]) or ops2[0] != ops1[1]:
+        return None
+    if _is_register(ops1[0]) or (ops1[0].startswith('$') and _is_register(ops2[1])):
+        return [window[0], f'movq {ops1[0]}, {ops2[1]}']
+    return None
+
+
+@_rule('repeated_load', 2)
+def _repeated_load(window: list[str]) -> list[str] | None:
+    if window[0] != window[1]:
+        return None
+    mnemonic, ops = _parse(window[0])
+    if mnemonic == 'movq' and _is_register(ops[1]) and not _mentions(ops[0], ops[1]):
+        return [window[0]]
+    return None
+
+
+@_rule('overwritten_move', 2)
+def _overwritten_move(window: list[str]) -> list[str] | None:
+    first, ops1 = _parse(window[0])
+    second, ops2 = _parse(window[1])
+    if (first == 'movq' and second in ('movq', 'movabsq') and _is_register(ops1[1])
+            and ops2[1] == ops1[1] and not _mentions(ops2[0], ops1[1])):
+        return [window[1]]
+    return None
+
+
+@_rule('overwritten_xor', 2)
+def _overwritten_xor(window: list[str]) -> list[str] | None:
+    # The flags set by the 'xor' are not used, as a 'movq' neither reads nor sets flags and
+    # nothing in the generated code reads flags after one.
+    first, ops1 = _parse(window[0])
+    second, ops2 = _parse(window[1])
+    if (first in ('xor', 'xorq') and ops1[0] == ops1[1] and _is_register(ops1[0])
+            and second in ('movq', 'movabsq') and ops2[1] == ops1[0] and not _mentions(ops2[0], ops1[0])):
+        return [window[1]]
+    return None
+
+
+@_rule('compare_with_zero', 1)
+def _compare_with_zero(window: list[str]) -> list[str] | None:
+    # 'testq' sets the flags the same way, with a shorter encoding.
+    mnemonic, ops = _parse(window[0])
+    if mnemonic == 'cmpq' and ops[0] == '$0' and _is_register(ops[1]):
+        return [f'testq {ops[1]}, {ops[1]}']
+    return None
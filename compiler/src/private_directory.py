@@ -0,0 +1,14 @@
+import os
+import stat
+
+
+def make_private_directory(directory: str) -> None:
+    """Creates `directory` with mode 0700 if it doesn't exist.
+
+    Raises a PermissionError unless it is a directory owned by the current user that nobody else can
+    write to, since the callers trust the files in it.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(f'{directory} must be a directory owned by the current user and writable only by them')
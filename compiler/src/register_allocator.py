@@ -0,0 +1,81 @@
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+from compiler.src import ir
+from compiler.src.intrinsics import all_intrinsics
+from compiler.src.ir import IRVar
+
+# %rax, %rdx and %r11 are never allocated: intrinsics and the code generator use them as scratch
+# registers, and division needs %rax and %rdx for its operands and results.
+callee_saved_registers = ['%rbx', '%r12', '%r13', '%r14', '%r15']
+caller_saved_registers = ['%rcx', '%rsi', '%rdi', '%r8', '%r9', '%r10']
+
+
+@dataclass
+class Allocation:
+    registers: dict[IRVar, str] = field(default_factory=dict)
+    spilled: list[IRVar] = field(default_factory=list)
+
+    def used_callee_saved_registers(self) -> list[str]:
+        used = set(self.registers.values())
+        return [reg for reg in callee_saved_registers if reg in used]
+
+
+def allocate_registers(
+        instructions: list[ir.Instruction],
+        intervals: dict[IRVar, tuple[int, int]],
+) -> Allocation:
+    """Assigns registers to variables with linear scan allocation over their live intervals.
+
+    Variables that are live across a call to a runtime function only get callee-saved registers,
+    because the runtime is free to clobber the others. When registers run out, the variable whose
+    interval ends last is spilled, and it is left to the caller to give it a stack slot.
+    """
+    call_positions = [
+        i for i, insn in enumerate(instructions)
+        if isinstance(insn, ir.Call) and insn.fun.name not in all_intrinsics
+    ]
+
+    def crosses_call(var: IRVar) -> bool:
+        start, end = intervals[var]
+        next_call = bisect_right(call_positions, start)
+        return next_call < len(call_positions) and call_positions[next_call] < end
+
+    allocation = Allocation()
+    free = {reg: True for reg in caller_saved_registers + callee_saved_registers}
+    active: list[IRVar] = []
+
+    def usable_registers(var: IRVar) -> list[str]:
+        if crosses_call(var):
+            return callee_saved_registers
+        return caller_saved_registers + callee_saved_registers
+
+    for var in sorted(intervals, key=lambda v: intervals[v]):
+        start, end = intervals[var]
+
+        # Intervals that end before this one starts release their registers. An interval that ends
+        # where this one starts does not, so a result never shares a register with an operand.
+        for other in list(active):
+            if intervals[other][1] < start:
+                active.remove(other)
+                free[allocation.registers[other]] = True
+
+        candidates = usable_registers(var)
+        reg = next((r for r in candidates if free[r]), None)
+        if reg is not None:
+            free[reg] = False
+            allocation.registers[var] = reg
+            active.append(var)
+            continue
+
+        victims = [other for other in active if allocation.registers[other] in candidates]
+        victim = max(victims, key=lambda v: intervals[v][1], default=None)
+        if victim is not None and intervals[victim][1] > end:
+            allocation.registers[var] = allocation.registers.pop(victim)
+            allocation.spilled.append(victim)
+            active.remove(victim)
+            active.append(var)
+        else:
+            allocation.spilled.append(var)
+
+    return allocation
@@ -0,0 +1,134 @@
+from compiler.src import ir
+from compiler.src.cfg import build_cfg
+from compiler.src.intrinsics import all_evaluators
+from compiler.src.ir import IRVar, call_args, defined_vars, used_vars
+
+# The value of a variable that can hold different values at runtime. A variable with no value yet
+# has not been seen to be written on any path that can run.
+_varying = object()
+
+
+def propagate_constants_sparsely(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Sparse conditional constant propagation on instructions in SSA form.
+
+    Blocks are only looked at once some path to them can run, and a branch on a known condition only
+    makes its taken side runnable. Each variable is written once, so its value is worked out once and
+    only looked at again when a value it depends on changes. Phi instructions only take in the values
+    from edges that can run, so loops and branches that keep a variable constant are seen through.
+
+    Variables found to be constant are loaded as constants, branches on known conditions become
+    jumps, and blocks that can never run are removed.
+    """
+    cfg = build_cfg(instructions)
+    values: dict[IRVar, object] = {}
+    defined: set[IRVar] = {var for insn in instructions for var in defined_vars(insn)}
+    uses: dict[IRVar, list[tuple[str, int]]] = {}
+    for name, block in cfg.blocks.items():
+        for i, insn in enumerate(block.instructions):
+            for var in used_vars(insn):
+                uses.setdefault(var, []).append((name, i))
+
+    executable_blocks: set[str] = set()
+    executable_edges: set[tuple[str, str]] = set()
+    flow_worklist: list[tuple[str, str]] = [('', cfg.entry)]
+    value_worklist: list[IRVar] = []
+
+    def value_of(var: IRVar) -> object:
+        if var not in defined:
+            # Read before any write: whatever the variable held on entry.
+            return _varying
+        return values.get(var)
+
+    def set_value(var: IRVar, value: object) -> None:
+        if value is not None and not _same(values.get(var), value):
+            values[var] = value
+            value_worklist.append(var)
+
+    def meet(a: object, b: object) -> object:
+        if a is None:
+            return b
+        if b is None or _same(a, b):
+            return a
+        return _varying
+
+    def visit(name: str, i: int) -> None:
+        block = cfg.blocks[name]
+        insn = block.instructions[i]
+        match insn:
+            case ir.LoadIntConst() | ir.LoadBoolConst():
+                set_value(insn.dest, insn.value)
+            case ir.Copy():
+                set_value(insn.dest, value_of(insn.source))
+            case ir.Phi():
+                value = None
+                for pred, source in insn.sources.items():
+                    if (pred, name) in executable_edges:
+                        value = meet(value, value_of(source))
+                set_value(insn.dest, value)
+            case ir.Call() if insn.fun.name in all_evaluators:
+                args = [value_of(arg) for arg in call_args(insn)]
+                if any(arg is _varying for arg in args):
+                    set_value(insn.dest, _varying)
+                elif all(arg is not None for arg in args):
+                    result = all_evaluators[insn.fun.name](*args)
+                    set_value(insn.dest, _varying if result is None else result)
+            case ir.Call():
+                set_value(insn.dest, _varying)
+            case ir.Jump():
+                flow_worklist.append((name, insn.label.name))
+            case ir.CondJump():
+                cond = value_of(insn.cond)
+                if cond is _varying or cond is True:
+                    flow_worklist.append((name, insn.then_label.name))
+                if cond is _varying or cond is False:
+                    flow_worklist.append((name, insn.else_label.name))
+
+    while flow_worklist or value_worklist:
+        if flow_worklist:
+            edge = flow_worklist.pop()
+            if edge in executable_edges:
+                continue
+            executable_edges.add(edge)
+            name = edge[1]
+            block = cfg.blocks[name]
+            if name in executable_blocks:
+                for i, insn in enumerate(block.instructions):
+                    if isinstance(insn, ir.Phi):
+                        visit(name, i)
+                continue
+            executable_blocks.add(name)
+            for i in range(len(block.instructions)):
+                visit(name, i)
+            if block.terminator() is None and block.successors:
+                flow_worklist.append((name, block.successors[0]))
+        else:
+            for name, i in uses.get(value_worklist.pop(), []):
+                if name in executable_blocks:
+                    visit(name, i)
+
+    order = [name for name in cfg.blocks if name in executable_blocks]
+    for name in order:
+        block = cfg.blocks[name]
+        phis: list[ir.Instruction] = []
+        code: list[ir.Instruction] = []
+        for insn in block.instructions:
+            loc = insn.location
+            value = values.get(defined_vars(insn)[0]) if defined_vars(insn) else None
+            if isinstance(insn, ir.Phi):
+                insn = ir.Phi(loc, {
+                    pred: source for pred, source in insn.sources.items() if (pred, name) in executable_edges
+                }, insn.dest)
+            if isinstance(value, bool):
+                insn = ir.LoadBoolConst(loc, value, defined_vars(insn)[0])
+            elif isinstance(value, int):
+                insn = ir.LoadIntConst(loc, value, defined_vars(insn)[0])
+            elif isinstance(insn, ir.CondJump) and isinstance(value_of(insn.cond), bool):
+                insn = ir.Jump(loc, insn.then_label if value_of(insn.cond) else insn.else_label)
+            (phis if isinstance(insn, ir.Phi) else code).append(insn)
+        block.instructions = code[:1] + phis + code[1:] if block.label() is not None else phis + code
+    return cfg.instructions(order)
+
+
+def _same(a: object, b: object) -> bool:
+    # True == 1 in Python, but a boolean and an integer are different values here.
+    return type(a) is type(b) and a == b
@@ -0,0 +1,176 @@
+from typing import Callable
+
+from compiler.src import ir
+from compiler.src.cfg import BasicBlock, build_cfg
+from compiler.src.dominance import DominatorTree, dominance_frontiers
+from compiler.src.ir import IRVar, defined_vars, new_var_source, with_dest, with_target, with_used_vars
+from compiler.src.liveness import block_liveness
+
+
+def to_ssa(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Converts the instructions to static single assignment form, where every variable is written once.
+
+    Phi instructions go at the top of the blocks in the dominance frontiers of the blocks that write a
+    variable, where the variable is live on entry. Then each write gets a variable of its own, and
+    each read the version that reaches it on the way down the dominator tree. The first write keeps
+    the original name and the others get a version number after it. Reads that no write reaches also
+    keep the original name, as the variable can hold anything there. Unreachable blocks are left out.
+    """
+    cfg = build_cfg(instructions)
+    dominators = DominatorTree(cfg)
+    idom = dominators.idom
+    frontiers = dominance_frontiers(cfg, idom)
+    liveness = block_liveness(cfg)
+
+    written_in: dict[IRVar, set[str]] = {}
+    for name in idom:
+        for insn in cfg.blocks[name].instructions:
+            for var in defined_vars(insn):
+                written_in.setdefault(var, set()).add(name)
+
+    # The original variable of each phi instruction, per block.
+    phis: dict[str, list[IRVar]] = {name: [] for name in idom}
+    for var, blocks in written_in.items():
+        worklist = list(blocks)
+        placed: set[str] = set()
+        while worklist:
+            for frontier in frontiers[worklist.pop()]:
+                if frontier not in placed and var in liveness.block_in[frontier]:
+                    placed.add(frontier)
+                    phis[frontier].append(var)
+                    if frontier not in blocks:
+                        worklist.append(frontier)
+
+    versions: dict[IRVar, int] = {}
+    stacks: dict[IRVar, list[IRVar]] = {}
+    phi_dests: dict[str, list[IRVar]] = {}
+    phi_sources: dict[str, list[dict[str, IRVar]]] = {name: [{} for _ in phis[name]] for name in idom}
+    renamed: dict[str, list[ir.Instruction]] = {}
+
+    def new_version(var: IRVar) -> IRVar:
+        versions[var] = versions.get(var, 0) + 1
+        version = var if versions[var] == 1 else IRVar(f'{var.name}_{versions[var]}')
+        stacks.setdefault(var, []).append(version)
+        return version
+
+    def current(var: IRVar) -> IRVar:
+        stack = stacks.get(var)
+        return stack[-1] if stack else var
+
+    children: dict[str, list[str]] = {name: [] for name in idom}
+    for name, parent in idom.items():
+        if name != parent:
+            children[parent].append(name)
+
+    stack: list[tuple[str, bool]] = [(cfg.entry, False)]
+    pushed: dict[str, list[IRVar]] = {}
+    while stack:
+        name, leaving = stack.pop()
+        if leaving:
+            for var in pushed.pop(name):
+                stacks[var].pop()
+            continue
+        block = cfg.blocks[name]
+        written: list[IRVar] = []
+        phi_dests[name] = [new_version(var) for var in phis[name]]
+        written += phis[name]
+        code: list[ir.Instruction] = []
+        for insn in block.instructions:
+            insn = with_used_vars(insn, current)
+            for var in defined_vars(insn):
+                insn = with_dest(insn, new_version(var))
+                written.append(var)
+            code.append(insn)
+        renamed[name] = code
+        for succ in block.successors:
+            if succ in idom:
+                for var, sources in zip(phis[succ], phi_sources[succ]):
+                    sources[name] = current(var)
+        pushed[name] = written
+        stack.append((name, True))
+        stack.extend((child, False) for child in reversed(children[name]))
+
+    order = [name for name in cfg.blocks if name in idom]
+    for name in order:
+        block = cfg.blocks[name]
+        block.instructions = renamed[name]
+        label = block.label()
+        if phis[name]:
+            assert label is not None
+            block.instructions[1:1] = [
+                ir.Phi(label.location, sources, dest) for sources, dest in zip(phi_sources[name], phi_dests[name])
+            ]
+    return cfg.instructions(order)
+
+
+def from_ssa(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Converts out of SSA form by replacing each phi instruction with copies at the end of the predecessors.
+
+    The copies for one edge all take effect at the same time, so they are ordered so that no copy
+    overwrites a variable that a later one reads, with a new variable to break cycles. An edge from a
+    block with two successors to a block with phi instructions gets a block of its own for the copies.
+    """
+    cfg = build_cfg(instructions)
+    new_var = new_var_source(instructions)
+    edge_blocks: dict[str, list[str]] = {}
+
+    for name, block in list(cfg.blocks.items()):
+        phis = [insn for insn in block.instructions if isinstance(insn, ir.Phi)]
+        if not phis:
+            continue
+        block.instructions = [insn for insn in block.instructions if not isinstance(insn, ir.Phi)]
+        label = block.label()
+        assert label is not None
+        for pred_name in block.predecessors:
+            copies = [(phi.dest, phi.sources[pred_name]) for phi in phis if pred_name in phi.sources]
+            code = [ir.Copy(label.location, source, dest) for dest, source in sequentialize_copies(copies, new_var)]
+            if not code:
+                continue
+            pred = cfg.blocks[pred_name]
+            if len(set(pred.successors)) > 1:
+                edge_name = cfg.new_block_name('edge')
+                edge_label = ir.Label(label.location, edge_name)
+                cfg.blocks[edge_name] = BasicBlock(
+                    edge_name, [edge_label, *code, ir.Jump(label.location, label)], successors=[name]
+                )
+                pred.instructions[-1] = with_target(pred.instructions[-1], name, edge_label)
+                pred.successors = [edge_name if succ == name else succ for succ in pred.successors]
+                edge_blocks.setdefault(name, []).append(edge_name)
+            elif pred.terminator() is not None:
+                pred.instructions[-1:-1] = code
+            else:
+                pred.instructions += code
+
+    # Each edge block goes right before the block it jumps to.
+    edges = {edge for names in edge_blocks.values() for edge in names}
+    order: list[str] = []
+    for name in cfg.blocks:
+        if name not in edges:
+            order += edge_blocks.get(name, [])
+            order.append(name)
+    return cfg.instructions(order)
+
+
+def sequentialize_copies(
+        copies: list[tuple[IRVar, IRVar]],
+        new_var: Callable[[], IRVar],
+) -> list[tuple[IRVar, IRVar]]:
+    """Orders a set of (dest, source) copies that happen at the same time into copies that can run one
+    after the other. A copy runs only once no pending copy reads its destination, and a cycle is broken
+    by saving one of its variables to a new variable."""
+    pending = {dest: source for dest, source in copies if dest != source}
+    result: list[tuple[IRVar, IRVar]] = []
+    while pending:
+        read = set(pending.values())
+        ready = [dest for dest in pending if dest not in read]
+        if ready:
+            for dest in ready:
+                result.append((dest, pending.pop(dest)))
+            continue
+        # Every pending destination is read by another copy, so they form cycles.
+        dest = next(iter(pending))
+        temp = new_var()
+        result.append((temp, dest))
+        pending = {d: temp if source == dest else source for d, source in pending.items()}
+    return result
+
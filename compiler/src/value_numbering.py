@@ -0,0 +1,76 @@
+from itertools import count
+
+from compiler.src import ir
+from compiler.src.intrinsics import all_intrinsics
+from compiler.src.ir import IRVar, call_args
+
+# Intrinsics whose operands can be swapped without changing the result.
+_commutative = {'+', '*', '==', '!='}
+
+# Comparisons that are the same as another one with the operands swapped.
+_mirrored = {'>': '<', '>=': '<='}
+
+Expression = tuple[str, tuple[int, ...]] | tuple[str, int | bool]
+
+
+def number_values(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Replaces intrinsic calls that recompute a value already computed in the same basic block
+    with copies of the earlier result.
+
+    Every distinct value in a block gets a number. Variables that hold the same value have the same
+    number, and so do two calls of the same intrinsic on operands with the same numbers. Calls to
+    runtime functions like 'print_int' and 'read_int' have side effects, so they always produce a
+    new value and are never replaced.
+    """
+    value_of: dict[IRVar, int] = {}
+    numbers: dict[Expression, int] = {}
+    holder: dict[int, IRVar] = {}
+    result: list[ir.Instruction] = []
+    counter = count(1)
+
+    def new_number() -> int:
+        return next(counter)
+
+    def number(var: IRVar) -> int:
+        if var not in value_of:
+            value_of[var] = new_number()
+            holder[value_of[var]] = var
+        return value_of[var]
+
+    def define(var: IRVar, value: int) -> None:
+        value_of[var] = value
+        if value_of.get(holder.get(value)) != value:
+            holder[value] = var
+
+    def expression(insn: ir.Call) -> Expression:
+        name = insn.fun.name
+        operands = tuple(number(arg) for arg in call_args(insn))
+        if name in _mirrored:
+            name, operands = _mirrored[name], operands[::-1]
+        elif name in _commutative:
+            operands = tuple(sorted(operands))
+        return name, operands
+
+    for insn in instructions:
+        if isinstance(insn, ir.Label):
+            value_of.clear()
+            numbers.clear()
+            holder.clear()
+        match insn:
+            case ir.LoadIntConst() | ir.LoadBoolConst():
+                key: Expression = (type(insn).__name__, insn.value)
+                define(insn.dest, numbers.setdefault(key, new_number()))
+            case ir.Copy():
+                define(insn.dest, number(insn.source))
+            case ir.Call() if insn.fun.name in all_intrinsics:
+                key = expression(insn)
+                value = numbers.get(key)
+                if value is not None and value_of.get(holder.get(value)) == value:
+                    insn = ir.Copy(insn.location, holder[value], insn.dest)
+                if value is None:
+                    value = numbers[key] = new_number()
+                define(insn.dest, value)
+            case ir.Call():
+                define(insn.dest, new_number())
+        result.append(insn)
+    return result
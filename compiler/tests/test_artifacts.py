@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from compiler.src.artifacts import ArtifactStore
+
+
+def test_put_returns_content_derived_id(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    first = store.put(b'first')
+    assert store.put(b'first') == first
+    assert store.put(b'second') != first
+    with open(store.path(first), 'rb') as f:
+        assert f.read() == b'first'
+    assert os.access(store.path(first), os.X_OK)
+
+
+def test_path_rejects_unknown_and_malformed_ids(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    assert store.path('0' * 32) is None
+    assert store.path('../../etc/passwd') is None
+
+
+def test_cleanup_removes_expired_artifacts(tmp_path):
+    store = ArtifactStore(str(tmp_path), ttl=60)
+    expired = store.put(b'expired')
+    fresh = store.put(b'fresh')
+    os.utime(os.path.join(tmp_path, expired), (0, 0))
+    store.cleanup()
+    assert store.path(expired) is None
+    assert store.path(fresh) is not None
+
+
+def test_put_runs_cleanup_periodically(tmp_path):
+    store = ArtifactStore(str(tmp_path), ttl=60, cleanup_interval=0)
+    expired = store.put(b'expired')
+    os.utime(os.path.join(tmp_path, expired), (0, 0))
+    store.put(b'fresh')
+    assert store.path(expired) is None
+
+
+def test_put_replaces_a_file_already_under_the_id(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    artifact_id = store.put(b'real')
+    with open(store.path(artifact_id), 'wb') as f:
+        f.write(b'planted')
+    assert store.put(b'real') == artifact_id
+    with open(store.path(artifact_id), 'rb') as f:
+        assert f.read() == b'real'
+
+
+def test_artifacts_are_not_kept_in_a_shared_directory(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(PermissionError):
+        ArtifactStore(str(tmp_path))
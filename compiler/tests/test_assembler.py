@@ -0,0 +1,140 @@
+import os
+import random
+import stat
+import subprocess
+import tempfile
+
+import pytest
+
+from compiler.src.assembler import assemble, build_directory, stdlib_object
+from compiler.src.intrinsics import INT64_MIN
+from compiler.tests.test_program_utils import compile_to_assembly, compile_and_run, run_assembly
+
+program_asm = """
+.global main
+.section .text
+main:
+movq $42, %rdi
+call print_int
+ret
+"""
+
+
+def test_assemble_produces_runnable_executable(tmp_path):
+    executable = str(tmp_path / 'a.out')
+    assemble(program_asm, executable)
+    result = subprocess.run([executable], capture_output=True, text=True, check=True)
+    assert result.stdout == '42\n'
+
+
+def test_stdlib_object_is_built_once(tmp_path):
+    first = stdlib_object(cache_dir=str(tmp_path))
+    built_at = os.stat(first).st_mtime_ns
+    second = stdlib_object(cache_dir=str(tmp_path))
+    assert first == second
+    assert os.stat(second).st_mtime_ns == built_at
+    assert os.listdir(tmp_path) == [os.path.basename(first)]
+
+
+def test_stdlib_object_is_rebuilt_when_removed(tmp_path):
+    obj = stdlib_object(cache_dir=str(tmp_path))
+    os.remove(obj)
+    assert stdlib_object(cache_dir=str(tmp_path)) == obj
+    assert os.path.exists(obj)
+
+
+def test_stdlib_object_is_kept_in_a_private_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv('EZCOMPILER_BUILD_DIR', str(tmp_path))
+    cache_dir = os.path.dirname(stdlib_object())
+    assert os.path.dirname(cache_dir) == str(tmp_path)
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_stdlib_object_is_not_taken_from_a_shared_directory(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(PermissionError):
+        stdlib_object(cache_dir=str(tmp_path))
+
+
+def test_read_int_reads_input_larger_than_its_buffer():
+    numbers = [(-1) ** i * i * 7919 for i in range(20000)]
+    stdin = f'{len(numbers)}\n' + ''.join(f'{n}\n' for n in numbers)
+    assert len(stdin) > 65536
+    source = '{ var n = read_int(); var s = 0; while n > 0 do { s = s + read_int(); n = n - 1; } s }'
+    assert compile_and_run(source, stdin) == f'{sum(numbers)}\n'
+
+
+def test_read_int_skips_junk_and_reads_the_last_line_without_newline():
+    source = '{ print_int(read_int()); print_int(read_int()); read_int() }'
+    assert compile_and_run(source, 'x1y2\n\n-4') == '12\n0\n-4\n'
+
+
+def test_read_int_fails_at_end_of_input():
+    result = run_assembly(compile_to_assembly('{ print_int(read_int()); read_int() }'), '5\n')
+    assert result.returncode == 1
+    assert result.stdout == '5\n'
+    assert result.stderr == 'Error: read_int() failed to read input\n'
+
+
+def test_print_int_writes_output_larger_than_its_buffer():
+    source = '{ var n = read_int(); var i = 0; while i < n do { print_int(i); print_bool(i % 2 == 0); i = i + 1; } n }'
+    expected = ''.join(f'{i}\n{str(i % 2 == 0).lower()}\n' for i in range(20000)) + '20000\n'
+    assert len(expected) > 65536
+    assert compile_and_run(source, '20000\n') == expected
+
+
+def test_output_is_written_before_read_int_waits_for_input(tmp_path):
+    executable = str(tmp_path / 'a.out')
+    assemble(compile_to_assembly('{ print_int(1); print_int(read_int() + 1) }'), executable)
+    with subprocess.Popen([executable], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) as process:
+        assert process.stdout.readline() == '1\n'
+        stdout, _ = process.communicate('41\n', timeout=30)
+    assert stdout == '42\n'
+
+
+def test_output_is_written_before_division_by_zero_kills_the_program():
+    result = run_assembly(compile_to_assembly('{ var d = read_int(); print_int(1); print_int(1 / d) }'), '0\n')
+    assert result.returncode == -8
+    assert result.stdout == '1\n'
+
+
+def test_print_int_prints_the_whole_int64_range():
+    rng = random.Random(1234)
+    numbers = [0, INT64_MIN, INT64_MIN + 1, -INT64_MIN - 1]
+    for digits in range(1, 19):
+        numbers += [10 ** digits - 1, 10 ** digits, 10 ** digits + 1, rng.randrange(10 ** (digits - 1), 10 ** digits)]
+    numbers += [rng.randint(INT64_MIN, -INT64_MIN - 1) for _ in range(1000)]
+    numbers += [-n for n in numbers if n != INT64_MIN]
+    stdin = f'{len(numbers)}\n' + ''.join(f'{n}\n' for n in numbers)
+    source = '{ var n = read_int(); while n > 0 do { print_int(read_int()); n = n - 1; } 0 }'
+    assert compile_and_run(source, stdin) == ''.join(f'{n}\n' for n in numbers) + '0\n'
+
+
+def section_names(file: str) -> str:
+    return subprocess.run(['readelf', '-SW', file], check=True, capture_output=True, text=True).stdout
+
+
+def test_assembly_is_piped_to_as_without_debug_info(tmp_path, capfd):
+    workdir = tmp_path / 'build'
+    workdir.mkdir()
+    executable = str(tmp_path / 'a.out')
+    # 'as' warns if its input doesn't end in a newline
+    assemble(program_asm.rstrip('\n'), executable, workdir=str(workdir))
+    assert os.listdir(workdir) == ['program.o']
+    assert '.debug_line' not in section_names(executable)
+    assert capfd.readouterr().err == ''
+    assert subprocess.run([executable], capture_output=True, text=True).stdout == '42\n'
+
+
+def test_debug_build_keeps_the_source_for_its_debug_info(tmp_path):
+    executable = str(tmp_path / 'a.out')
+    assemble(program_asm, executable, workdir=str(tmp_path), debug=True)
+    assert (tmp_path / 'program.s').read_text() == program_asm
+    assert '.debug_line' in section_names(executable)
+
+
+def test_build_directory_is_configurable(monkeypatch, tmp_path):
+    monkeypatch.setenv('EZCOMPILER_BUILD_DIR', str(tmp_path))
+    assert build_directory() == str(tmp_path)
+    monkeypatch.delenv('EZCOMPILER_BUILD_DIR')
+    assert build_directory() in ('/dev/shm', tempfile.gettempdir())
@@ -0,0 +1,46 @@
+import re
+
+from compiler.src.assembly_generator import Locals
+from compiler.src.ir import IRVar
+from compiler.tests.test_program_utils import compile_to_assembly, compile_and_run
+
+
+def frame_size(asm: str) -> int:
+    return int(re.search(r'subq \$(\d+), %rsp', asm).group(1))
+
+
+def test_variables_with_disjoint_intervals_share_stack_slots():
+    a, b, c = IRVar('a'), IRVar('b'), IRVar('c')
+    locals = Locals([a, b, c], intervals={a: (0, 2), b: (1, 4), c: (3, 5)})
+    assert locals.get_ref(c) == locals.get_ref(a)
+    assert locals.get_ref(b) != locals.get_ref(a)
+    assert locals.stack_used() == 16
+
+
+def test_frame_size_follows_peak_pressure_rather_than_variable_count():
+    source = '{ var s = 0; ' + ' '.join(f'var v{i} = s + {i}; s = s + v{i} * 2;' for i in range(500)) + ' s }'
+    assert frame_size(compile_to_assembly(source, use_registers=False)) <= 64
+
+
+def test_shared_stack_slots_keep_values_intact():
+    source = '{ var s = 0; ' + ' '.join(f'var v{i} = s + {i}; s = s + v{i} * 2;' for i in range(30)) + ' s }'
+    expected = 0
+    for i in range(30):
+        expected = expected + (expected + i) * 2
+    assert compile_and_run(source, use_registers=False) == f'{expected}\n'
+
+
+def test_comparisons_jump_on_flags_directly():
+    asm = compile_to_assembly('{ var i = read_int(); while i < 10 do { i = i + 1; } i }')
+    condition = asm[asm.index('.Lwhile_body1:'):asm.index('.Lwhile_end1:')]
+    assert 'jl .Lwhile_body1' in condition
+    assert 'set' not in condition
+    assert '$0' not in condition
+
+
+def test_comparison_results_used_elsewhere_are_kept():
+    source = '{ var x = read_int(); var b = x < 3; if b then print_int(1) else print_int(2); b }'
+    asm = compile_to_assembly(source)
+    assert 'setl %al' in asm
+    assert compile_and_run(source, '1\n') == '1\ntrue\n'
+    assert compile_and_run(source, '5\n') == '2\nfalse\n'
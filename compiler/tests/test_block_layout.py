@@ -0,0 +1,67 @@
+from compiler.src import ir
+from compiler.src.block_layout import layout_blocks
+from compiler.src.ir import IRVar, Label, Jump, CondJump, Call, LoadIntConst
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir, compile_to_assembly, compile_and_run
+
+
+def jumps(asm: str) -> list[str]:
+    return [line for line in asm.split('\n') if line.startswith('j')]
+
+
+def test_while_loops_are_rotated():
+    instructions = compile_to_ir('{ var i = read_int(); while i < 10 do { i = i + 1; } i }')
+    body = instructions[instructions.index(Label(L, 'while_body1')):]
+    assert not any(isinstance(insn, ir.Jump) for insn in body)
+    assert sum(isinstance(insn, ir.CondJump) for insn in instructions) == 2
+
+
+def test_loop_iterations_take_one_conditional_jump():
+    asm = compile_to_assembly('{ var i = read_int(); while i < 10 do { i = i + 1; } i }')
+    assert jumps(asm) == ['jge .Lwhile_end1', 'jl .Lwhile_body1']
+
+
+def test_if_else_needs_one_unconditional_jump():
+    asm = compile_to_assembly('{ var x = read_int(); if x > 0 then print_int(1) else print_int(2); x }')
+    assert jumps(asm) == ['jle .Lelse1', 'jmp .Lif_end1']
+
+
+def test_blocks_only_reached_by_jumps_are_moved_after_them():
+    a = IRVar('a')
+    instructions = [
+        Jump(L, Label(L, 'second')),
+        Label(L, 'first'),
+        Call(L, IRVar('print_int'), [a], IRVar('p')),
+        Jump(L, Label(L, 'end')),
+        Label(L, 'second'),
+        LoadIntConst(L, 1, a),
+        Jump(L, Label(L, 'first')),
+        Label(L, 'end'),
+    ]
+    assert [str(insn) for insn in layout_blocks(instructions)] == [
+        'LoadIntConst(1, a)',
+        'Call(print_int, [a], p)',
+    ]
+
+
+def test_long_conditions_are_not_copied():
+    condition = ' + '.join(['i'] * 10)
+    source = f'{{ var i = read_int(); while {condition} < 100 do {{ i = i + 1; }} i }}'
+    instructions = compile_to_ir(source)
+    assert sum(isinstance(insn, CondJump) for insn in instructions) == 1
+    assert compile_and_run(source, '3\n') == '10\n'
+
+
+def test_nested_loops_keep_their_results():
+    source = ('{ var i = 0; var s = 0; while i < 5 do { var j = 0; while j < i do { s = s + j; j = j + 1; } '
+              'i = i + 1; } s }')
+    assert compile_and_run(source) == '10\n'
+
+
+def test_the_block_that_ends_the_program_stays_last():
+    source = ('{ var a = read_int(); var b = 0; var c = read_int(); var d = 12; var p = true; '
+              '{ var i = 1; while i <= 0 do { print_int(i * 5); '
+              'print_int(((b = (7 * d)) - (if (i < 3) then (0 - i) else (100 - d)))); '
+              'd = (d = ((if p then b else d) * 10)); c = (1 - i); i = i + 1; } }; '
+              'b = (if ((a < (-3)) or false) then 1024 else (((-3) / 9) % 3)); a + b * c - d }')
+    assert compile_and_run(source, '0\n1\n') == '-12\n'
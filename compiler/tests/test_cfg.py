@@ -0,0 +1,58 @@
+from compiler.src import ir
+from compiler.src.cfg import build_cfg
+from compiler.src.ir import IRVar, LoadIntConst, Label, Jump, CondJump, Copy
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir
+
+
+def test_blocks_are_split_at_labels_and_jumps():
+    cfg = build_cfg(compile_to_ir('{ var x = read_int(); while x > 0 do { x = x - 1; } x }', optimize=False))
+    assert list(cfg.blocks) == ['entry', 'while_start1', 'while_body1', 'while_end1']
+    assert cfg.blocks['entry'].successors == ['while_start1']
+    assert cfg.blocks['while_start1'].successors == ['while_body1', 'while_end1']
+    assert cfg.blocks['while_body1'].successors == ['while_start1']
+    assert cfg.blocks['while_start1'].predecessors == ['entry', 'while_body1']
+    assert cfg.blocks['while_end1'].successors == []
+
+
+def test_every_instruction_is_in_one_block():
+    a = IRVar('a')
+    instructions = [
+        Jump(L, Label(L, 'end')),
+        LoadIntConst(L, 1, a),
+        Label(L, 'end'),
+        Copy(L, a, a),
+    ]
+    cfg = build_cfg(instructions)
+    assert list(cfg.blocks) == ['entry', 'block1', 'end']
+    assert cfg.instructions() == instructions
+    assert cfg.postorder() == ['end', 'entry']
+
+
+def test_loop_body_follows_its_header_in_reverse_postorder():
+    cfg = build_cfg(compile_to_ir('{ var x = read_int(); while x > 0 do { x = x - 1; } x }', optimize=False))
+    assert cfg.reverse_postorder() == ['entry', 'while_start1', 'while_body1', 'while_end1']
+
+
+def test_flattening_adds_jumps_for_missing_fallthrough():
+    a = IRVar('a')
+    cfg = build_cfg([
+        CondJump(L, a, Label(L, 'then'), Label(L, 'else')),
+        Label(L, 'then'),
+        LoadIntConst(L, 1, a),
+        Label(L, 'else'),
+        LoadIntConst(L, 2, a),
+        Label(L, 'end'),
+    ])
+    instructions = cfg.instructions(['entry', 'else', 'then', 'end'])
+    assert [str(insn) for insn in instructions] == [
+        'CondJump(a, Label(then), Label(else))',
+        'Label(else)',
+        'LoadIntConst(2, a)',
+        'Jump(Label(end))',
+        'Label(then)',
+        'LoadIntConst(1, a)',
+        'Jump(Label(else))',
+        'Label(end)',
+    ]
+    assert isinstance(instructions[-2], ir.Jump)
@@ -0,0 +1,178 @@
+import os
+import stat
+
+import pytest
+
+from compiler import main
+from compiler.main import full_compile
+from compiler.src.artifacts import ArtifactStore
+from compiler.src.compile_cache import CompileCache, source_key
+
+
+def test_source_key_depends_on_source():
+    assert source_key('1 + 2') == source_key('1 + 2')
+    assert source_key('1 + 2') != source_key('1 + 3')
+
+
+def test_get_returns_stored_value():
+    cache = CompileCache()
+    cache.put('a', {'asm': 'ret'})
+    assert cache.get('a') == {'asm': 'ret'}
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CompileCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_entries_are_evicted_by_size():
+    cache = CompileCache(max_bytes=3000)
+    cache.put('a', b'x' * 1000)
+    cache.put('b', b'x' * 1000)
+    cache.put('c', b'x' * 1000)
+    cache.put('too_large', b'x' * 5000)
+    assert cache.get('a') is None
+    assert cache.get('c') is not None
+    assert cache.get('too_large') is None
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    CompileCache(disk_dir=str(tmp_path)).put('a', {'asm': 'ret'})
+    cache = CompileCache(disk_dir=str(tmp_path))
+    assert len(cache) == 0
+    assert cache.get('a') == {'asm': 'ret'}
+    assert len(cache) == 1
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = CompileCache(disk_dir=str(tmp_path), max_disk_bytes=2500)
+    cache.put('a', b'x' * 1000)
+    os.utime(tmp_path / 'a.pickle', (0, 0))
+    cache.put('b', b'x' * 1000)
+    cache.put('c', b'x' * 1000)
+    assert sorted(os.listdir(tmp_path)) == ['b.pickle', 'c.pickle']
+
+
+def test_disk_tier_is_only_scanned_when_over_its_limit(tmp_path, monkeypatch):
+    cache = CompileCache(disk_dir=str(tmp_path), max_disk_bytes=2500)
+    scans = []
+    original_scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda *args: scans.append(args) or original_scandir(*args))
+    cache.put('a', b'x' * 1000)
+    cache.put('b', b'x' * 1000)
+    assert scans == []
+    cache.put('c', b'x' * 1000)
+    assert len(scans) == 1
+    assert CompileCache(disk_dir=str(tmp_path), max_disk_bytes=1500).get('b') is None
+
+
+def test_disk_tier_is_private(tmp_path):
+    CompileCache(disk_dir=str(tmp_path / 'cache'))
+    assert stat.S_IMODE(os.stat(tmp_path / 'cache').st_mode) == 0o700
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(PermissionError):
+        CompileCache(disk_dir=str(tmp_path))
+
+
+def test_cache_limits_come_from_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv('EZCOMPILER_CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('EZCOMPILER_CACHE_MAX_ENTRIES', '16')
+    monkeypatch.setenv('EZCOMPILER_CACHE_MAX_DISK_BYTES', '4096')
+    cache = CompileCache(**main._cache_options_from_environment())
+    assert (cache.disk_dir, cache.max_entries, cache.max_disk_bytes) == (str(tmp_path), 16, 4096)
+    assert cache.max_bytes == CompileCache().max_bytes
+
+
+def test_full_compile_reuses_cached_result(tmp_path, monkeypatch):
+    artifacts = ArtifactStore(str(tmp_path))
+    assemble_calls = []
+    original_assemble = main.assemble
+
+    def counting_assemble(*args, **kwargs):
+        assemble_calls.append(args)
+        original_assemble(*args, **kwargs)
+
+    monkeypatch.setattr(main, 'assemble', counting_assemble)
+    cache = CompileCache()
+    source = '{ var x = 3; print_int(x * 2); }'
+
+    first = full_compile(source, cache=cache, artifacts=artifacts)
+    os.remove(artifacts.path(first['artifact_id']))
+    second = full_compile(source, cache=cache, artifacts=artifacts)
+
+    assert len(assemble_calls) == 1
+    assert second['asm'] == first['asm']
+    assert [str(i) for i in second['ir']] == [str(i) for i in first['ir']]
+    assert second['file_generated']
+    assert second['artifact_id'] == first['artifact_id']
+    assert os.access(artifacts.path(second['artifact_id']), os.X_OK)
+
+
+def test_executable_is_cached_once(tmp_path):
+    cache = CompileCache(disk_dir=str(tmp_path / 'cache'))
+    full_compile('{ var x = 3; print_int(x * 2); }', cache=cache, artifacts=ArtifactStore(str(tmp_path / 'artifacts')))
+    blobs = [(tmp_path / 'cache' / name).read_bytes() for name in os.listdir(tmp_path / 'cache')]
+    assert len(blobs) == 4
+    assert sum(b'\x7fELF' in blob for blob in blobs) == 1
+
+
+def test_entries_whose_executable_was_evicted_are_compiled_again(tmp_path):
+    artifacts = ArtifactStore(str(tmp_path))
+    cache = CompileCache(max_entries=3)
+    source = '{ var x = 3; print_int(x * 2); }'
+    first = full_compile(source, cache=cache, artifacts=artifacts)
+    assert len(cache) == 3
+    second = full_compile(source, cache=cache, artifacts=artifacts)
+    assert second['file_generated']
+    assert second['artifact_id'] == first['artifact_id']
+
+
+def test_full_compile_caches_errors():
+    cache = CompileCache()
+    first = full_compile('1 +', cache=cache)
+    assert full_compile('1 +', cache=cache) == first
+    assert cache.hits == 1
+
+
+def test_whitespace_and_comment_edits_reuse_downstream_stages(tmp_path, monkeypatch):
+    artifacts = ArtifactStore(str(tmp_path))
+    assembly_calls = []
+    original_generate_assembly = main.generate_assembly
+    monkeypatch.setattr(main, 'generate_assembly',
+                        lambda ir: assembly_calls.append(ir) or original_generate_assembly(ir))
+    cache = CompileCache()
+
+    first = full_compile('{ var x = 3; print_int(x); }', cache=cache, artifacts=artifacts)
+    second = full_compile('{\n    // comment\n    var x = 3;\n    print_int(x);\n}', cache=cache, artifacts=artifacts)
+
+    assert len(assembly_calls) == 1
+    assert second['asm'] == first['asm']
+    assert second['file_generated']
+    assert (second['ast'].location.line, second['ast'].location.column) == (1, 1)
+    declaration = second['ast'].expressions[0]
+    assert (declaration.location.line, declaration.location.column) == (3, 5)
+    assert {(i.location.line, i.location.column) for i in second['ir']} <= {(1, 1), (3, 5), (3, 13), (4, 5)}
+
+
+def test_equivalent_ir_reuses_assembly(tmp_path, monkeypatch):
+    artifacts = ArtifactStore(str(tmp_path))
+    assembly_calls = []
+    original_generate_assembly = main.generate_assembly
+    monkeypatch.setattr(main, 'generate_assembly',
+                        lambda ir: assembly_calls.append(ir) or original_generate_assembly(ir))
+    cache = CompileCache()
+
+    first = full_compile('{ var x = 3; print_int(x); }', cache=cache, artifacts=artifacts)
+    second = full_compile('{ var renamed = 3; print_int(renamed); }', cache=cache, artifacts=artifacts)
+
+    assert len(assembly_calls) == 1
+    assert second['asm'] == first['asm']
+    assert second['ast'].expressions[0].name == 'renamed'
@@ -0,0 +1,59 @@
+from compiler.src import ir
+from compiler.src.intrinsics import all_evaluators, INT64_MIN
+from compiler.tests.test_program_utils import compile_to_ir, compile_and_run
+
+
+def ir_text(source_code: str) -> list[str]:
+    return [str(insn) for insn in compile_to_ir(source_code)]
+
+
+def test_division_rounds_towards_zero():
+    assert all_evaluators['/'](-7, 2) == -3
+    assert all_evaluators['%'](-7, 2) == -1
+    assert all_evaluators['/'](7, -2) == -3
+    assert all_evaluators['%'](7, -2) == 1
+
+
+def test_trapping_division_is_not_evaluated():
+    assert all_evaluators['/'](1, 0) is None
+    assert all_evaluators['%'](INT64_MIN, -1) is None
+
+
+def test_arithmetic_wraps_around():
+    assert all_evaluators['+'](2 ** 63 - 1, 1) == INT64_MIN
+    assert all_evaluators['unary_-'](INT64_MIN) == INT64_MIN
+
+
+def test_constant_arithmetic_is_folded():
+    assert ir_text('1 + 2 * 3')[-2:] == ['LoadIntConst(7, x5)', 'Call(print_int, [x5], x6)']
+    assert not any(isinstance(insn, ir.Call) and insn.fun.name != 'print_int' for insn in compile_to_ir('1 + 2 * 3'))
+
+
+def test_known_values_propagate_through_copies():
+    instructions = compile_to_ir('{ var x = 4; var y = x; y * y }')
+    assert not any(isinstance(insn, ir.Call) and insn.fun.name == '*' for insn in instructions)
+    assert 'LoadIntConst(16, x4)' in [str(insn) for insn in instructions]
+
+
+def test_constant_conditions_become_jumps():
+    instructions = compile_to_ir('if 1 < 2 then print_int(1) else print_int(2)')
+    assert not any(isinstance(insn, ir.CondJump) for insn in instructions)
+    assert 'LoadIntConst(2, x7)' not in [str(insn) for insn in instructions]
+    assert compile_and_run('if 1 < 2 then print_int(1) else print_int(2)') == '1\n'
+
+
+def test_constant_false_loop_is_removed():
+    instructions = compile_to_ir('{ while 2 < 1 do print_int(1); 5 }')
+    assert not any(isinstance(insn, (ir.Label, ir.Jump, ir.CondJump)) for insn in instructions)
+    assert [str(insn) for insn in instructions][-1] == 'Call(print_int, [x6], x7)'
+
+
+def test_division_by_zero_is_kept():
+    instructions = compile_to_ir('1 / 0')
+    assert any(isinstance(insn, ir.Call) and insn.fun.name == '/' for insn in instructions)
+
+
+def test_values_are_forgotten_at_labels():
+    source = '{ var n = read_int(); var x = 1; while x < n do { x = x + 1; } x }'
+    assert any(isinstance(insn, ir.CondJump) for insn in compile_to_ir(source))
+    assert compile_and_run(source, '10\n') == '10\n'
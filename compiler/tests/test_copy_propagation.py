@@ -0,0 +1,89 @@
+from compiler.src import ir
+from compiler.src.copy_propagation import propagate_copies, coalesce_copies
+from compiler.src.dead_code import eliminate_dead_code
+from compiler.src.ir import IRVar, LoadIntConst, Copy, Call, Label, Jump
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+def text(instructions: list[ir.Instruction]) -> list[str]:
+    return [str(insn) for insn in instructions]
+
+
+def test_reads_of_a_copy_use_its_source():
+    instructions = [
+        Call(L, v('read_int'), [], v('a')),
+        Copy(L, v('a'), v('b')),
+        Call(L, v('print_int'), [v('b')], v('c')),
+    ]
+    assert text(propagate_copies(instructions))[2] == 'Call(print_int, [a], c)'
+
+
+def test_copies_are_not_propagated_past_redefinitions_or_labels():
+    instructions = [
+        Copy(L, v('a'), v('b')),
+        Call(L, v('read_int'), [], v('a')),
+        Call(L, v('print_int'), [v('b')], v('c')),
+        Copy(L, v('a'), v('d')),
+        Label(L, 'l'),
+        Call(L, v('print_int'), [v('d')], v('e')),
+    ]
+    result = text(propagate_copies(instructions))
+    assert result[2] == 'Call(print_int, [b], c)'
+    assert result[5] == 'Call(print_int, [d], e)'
+
+
+def test_temporaries_are_coalesced_into_copy_destinations():
+    instructions = [
+        Call(L, v('read_int'), [], v('x')),
+        LoadIntConst(L, 1, v('one')),
+        Call(L, v('+'), [v('x'), v('one')], v('t')),
+        Copy(L, v('t'), v('x')),
+        Call(L, v('print_int'), [v('x')], v('p')),
+    ]
+    assert text(coalesce_copies(instructions)) == [
+        'Call(read_int, [], x)',
+        'LoadIntConst(1, one)',
+        'Call(+, [x, one], x)',
+        'Call(print_int, [x], p)',
+    ]
+
+
+def test_temporaries_read_later_are_not_coalesced():
+    instructions = [
+        Call(L, v('read_int'), [], v('t')),
+        Copy(L, v('t'), v('x')),
+        Call(L, v('print_int'), [v('t')], v('p')),
+        Call(L, v('print_int'), [v('x')], v('q')),
+    ]
+    assert text(coalesce_copies(instructions)) == text(instructions)
+
+
+def test_dead_code_is_removed_but_side_effects_are_kept():
+    instructions = [
+        LoadIntConst(L, 1, v('unused')),
+        Call(L, v('read_int'), [], v('a')),
+        Call(L, v('*'), [v('a'), v('a')], v('square')),
+        Call(L, v('/'), [v('a'), v('a')], v('quotient')),
+        Call(L, v('print_int'), [v('a')], v('p')),
+        Jump(L, Label(L, 'end')),
+        Label(L, 'end'),
+    ]
+    assert text(eliminate_dead_code(instructions)) == [
+        'Call(read_int, [], a)',
+        'Call(/, [a, a], quotient)',
+        'Call(print_int, [a], p)',
+        'Jump(Label(end))',
+        'Label(end)',
+    ]
+
+
+def test_generated_copies_are_removed():
+    instructions = compile_to_ir('{ var x = read_int(); var y = x * 2; if y > 3 then y else x }')
+    copies = [insn for insn in instructions if isinstance(insn, ir.Copy)]
+    assert len(copies) == 2
+    assert not any(insn.source == IRVar('unit') for insn in copies)
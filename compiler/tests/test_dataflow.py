@@ -0,0 +1,67 @@
+from compiler.src.cfg import build_cfg
+from compiler.src.dataflow import BitSetUniverse, available_expressions, reaching_definitions
+from compiler.src.ir import IRVar, LoadIntConst, Label, Jump, CondJump, Call, Copy
+from compiler.src.liveness import live_variables, live_intervals
+from compiler.src.tokenizer import L
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+# a = 1; loop: if c then body else end; body: a = a + b; jump loop; end: print_int(a)
+loop_program = [
+    LoadIntConst(L, 1, v('a')),
+    Label(L, 'loop'),
+    CondJump(L, v('c'), Label(L, 'body'), Label(L, 'end')),
+    Label(L, 'body'),
+    Call(L, v('+'), [v('a'), v('b')], v('a')),
+    Jump(L, Label(L, 'loop')),
+    Label(L, 'end'),
+    Call(L, v('print_int'), [v('a')], v('p')),
+]
+
+
+def test_universe_round_trips_sets():
+    universe = BitSetUniverse(['x', 'y', 'z'])
+    assert sorted(universe.members(universe.bits(['z', 'x']))) == ['x', 'z']
+    assert universe.members(universe.full()) == ['x', 'y', 'z']
+
+
+def test_liveness_flows_around_loops():
+    liveness = live_variables(loop_program)
+    assert set(liveness.live_in_vars(1)) == {v('a'), v('b'), v('c')}
+    assert set(liveness.live_out_vars(4)) == {v('a'), v('b'), v('c')}
+    assert liveness.live_out_vars(7) == []
+    assert not liveness.is_live_out(7, v('a'))
+
+
+def test_live_intervals_cover_the_whole_loop():
+    intervals = live_intervals(loop_program)
+    assert intervals[v('a')] == (0, 7)
+    assert intervals[v('b')] == (0, 5)
+    assert intervals[v('p')] == (7, 7)
+
+
+def test_both_definitions_reach_the_loop_exit():
+    cfg = build_cfg(loop_program)
+    definitions, result = reaching_definitions(cfg)
+    assert sorted(definitions.members(result.block_in['end'])) == [('body', 1), ('entry', 0)]
+    assert definitions.members(result.block_in['entry']) == []
+
+
+def test_expressions_are_available_only_on_every_path():
+    x, y, t = v('x'), v('y'), v('t')
+    cfg = build_cfg([
+        Call(L, v('*'), [x, y], t),
+        CondJump(L, v('c'), Label(L, 'then'), Label(L, 'join')),
+        Label(L, 'then'),
+        Call(L, v('-'), [x, y], t),
+        Copy(L, t, x),
+        Label(L, 'join'),
+        Call(L, v('print_int'), [t], v('p')),
+    ])
+    expressions, result = available_expressions(cfg)
+    assert expressions.members(result.block_in['then']) == [('*', (x, y))]
+    assert expressions.members(result.block_out['then']) == []
+    assert expressions.members(result.block_in['join']) == []
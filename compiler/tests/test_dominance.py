@@ -0,0 +1,49 @@
+from compiler.src.cfg import build_cfg
+from compiler.src.dominance import DominatorTree, dominance_frontiers, enclosing_loops, immediate_dominators, \
+    natural_loops
+from compiler.tests.test_program_utils import compile_to_ir
+
+nested_loops = ('{ var i = read_int(); while i > 0 do { var j = i; while j > 0 do { j = j - 1; } '
+                'if i % 2 == 0 then print_int(i) else print_int(-i); i = i - 1; } }')
+
+
+def test_immediate_dominators():
+    cfg = build_cfg(compile_to_ir(nested_loops, optimize=False))
+    idom = immediate_dominators(cfg)
+    assert idom['while_start1'] == 'entry'
+    assert idom['while_body1'] == 'while_start1'
+    assert idom['while_start2'] == 'while_body1'
+    assert idom['while_end2'] == 'while_start2'
+    assert idom['if_end1'] == 'while_end2'
+    assert idom['while_end1'] == 'while_start1'
+    dominators = DominatorTree(cfg)
+    assert dominators.dominates('while_start1', 'if_end1')
+    assert dominators.dominates('if_end1', 'if_end1')
+    assert not dominators.dominates('then1', 'if_end1')
+    assert not dominators.dominates('while_body2', 'while_end2')
+
+
+def test_dominance_frontiers():
+    cfg = build_cfg(compile_to_ir(nested_loops, optimize=False))
+    frontiers = dominance_frontiers(cfg, immediate_dominators(cfg))
+    assert frontiers['then1'] == {'if_end1'}
+    assert frontiers['else1'] == {'if_end1'}
+    assert frontiers['while_body2'] == {'while_start2'}
+    assert frontiers['if_end1'] == {'while_start1'}
+
+
+def test_natural_loops_are_found_innermost_first():
+    cfg = build_cfg(compile_to_ir(nested_loops, optimize=False))
+    inner, outer = natural_loops(cfg, DominatorTree(cfg))
+    assert inner.header == 'while_start2'
+    assert inner.blocks == {'while_start2', 'while_body2'}
+    assert outer.header == 'while_start1'
+    assert inner.blocks < outer.blocks
+    assert 'while_end1' not in outer.blocks
+    assert outer.exits(cfg) == [('while_start1', 'while_end1')]
+
+
+def test_enclosing_loops():
+    cfg = build_cfg(compile_to_ir(nested_loops, optimize=False))
+    inner, outer = natural_loops(cfg, DominatorTree(cfg))
+    assert enclosing_loops([inner, outer]) == {'while_start2': [outer], 'while_start1': []}
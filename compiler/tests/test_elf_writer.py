@@ -0,0 +1,43 @@
+import subprocess
+
+import pytest
+
+from compiler.src.elf_writer import base_address, build_executable, write_executable
+from compiler.src.machine_code import EncodingException
+from compiler.tests.test_program_utils import compile_to_assembly, program_cases, run_assembly
+
+# Programs that end in other ways than returning, with their input.
+failing_cases = [
+    ('{ var d = read_int(); print_int(1); print_int(1 / d) }', '0\n'),
+    ('{ print_int(read_int()); read_int() }', '5\n'),
+    ('{ var n = read_int(); var i = 0; while i < n do { print_int(i); i = i + 1; } n }', '20000\n'),
+]
+
+
+def run_builtin(asm: str, stdin: str, tmp_path) -> subprocess.CompletedProcess:
+    executable = str(tmp_path / 'a.out')
+    write_executable(asm, executable)
+    return subprocess.run([executable], input=stdin, capture_output=True, text=True, timeout=30)
+
+
+@pytest.mark.parametrize('source_code, stdin', [(case[0], case[1]) for case in program_cases] + failing_cases)
+@pytest.mark.parametrize('optimize', [True, False])
+def test_executable_runs_like_the_binutils_one(source_code, stdin, optimize, tmp_path):
+    asm = compile_to_assembly(source_code, optimize)
+    expected = run_assembly(asm, stdin)
+    result = run_builtin(asm, stdin, tmp_path)
+    assert (result.returncode, result.stdout, result.stderr) == (expected.returncode, expected.stdout, expected.stderr)
+
+
+def test_executable_is_a_static_elf64_file():
+    executable = build_executable(compile_to_assembly('1 + 2'))
+    assert executable[:5] == b'\x7fELF\x02'
+    assert int.from_bytes(executable[16:18], 'little') == 2
+    assert base_address < int.from_bytes(executable[24:32], 'little') < base_address + len(executable)
+
+
+def test_undefined_symbols_are_reported():
+    with pytest.raises(EncodingException, match='missing'):
+        build_executable('.global main\nmain:\ncall missing\nret')
+    with pytest.raises(EncodingException, match='main'):
+        build_executable('.global other\nother:\nret')
@@ -0,0 +1,79 @@
+from compiler.src import ir
+from compiler.src.cfg import build_cfg
+from compiler.src.dominance import DominatorTree, natural_loops
+from compiler.src.induction_variables import basic_induction_variables, known_constants, reduce_induction_variables
+from compiler.src.ir import IRVar, LoadIntConst, Label, Jump, CondJump, Call
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir, compile_and_run
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+def calls(instructions: list[ir.Instruction], name: str) -> int:
+    return sum(isinstance(insn, ir.Call) and insn.fun.name == name for insn in instructions)
+
+
+def counting_loop(body: list[ir.Instruction]) -> list[ir.Instruction]:
+    return [
+        Call(L, v('read_int'), [], v('n')),
+        LoadIntConst(L, 0, v('i')),
+        LoadIntConst(L, 1, v('one')),
+        LoadIntConst(L, 7, v('seven')),
+        Label(L, 'start'),
+        Call(L, v('<'), [v('i'), v('n')], v('t')),
+        CondJump(L, v('t'), Label(L, 'body'), Label(L, 'end')),
+        Label(L, 'body'),
+        *body,
+        Jump(L, Label(L, 'start')),
+        Label(L, 'end'),
+    ]
+
+
+def test_variables_stepped_by_a_constant_are_induction_variables():
+    instructions = counting_loop([
+        Call(L, v('+'), [v('one'), v('i')], v('i')),
+        Call(L, v('-'), [v('j'), v('seven')], v('j')),
+        Call(L, v('+'), [v('k'), v('i')], v('k')),
+        Call(L, v('+'), [v('m'), v('one')], v('m')),
+        Call(L, v('+'), [v('m'), v('one')], v('m')),
+    ])
+    cfg = build_cfg(instructions)
+    [loop] = natural_loops(cfg, DominatorTree(cfg))
+    found = basic_induction_variables(cfg, loop, known_constants(instructions))
+    assert {var.name: iv.step for var, iv in found.items()} == {'i': 1, 'j': -7}
+
+
+def test_multiplication_becomes_addition():
+    instructions = reduce_induction_variables(counting_loop([
+        Call(L, v('*'), [v('i'), v('seven')], v('p')),
+        Call(L, v('print_int'), [v('p')], v('u')),
+        Call(L, v('+'), [v('i'), v('one')], v('i')),
+    ]))
+    body = instructions[instructions.index(Label(L, 'body')):]
+    assert calls(body, '*') == 0
+    assert [str(insn) for insn in body[-4:-2]] == ['Call(+, [i, one], i)', 'Call(+, [x1, x3], x1)']
+    assert 'LoadIntConst(7, x3)' in [str(insn) for insn in instructions]
+
+
+def test_multiplication_by_a_variable_is_kept():
+    instructions = counting_loop([
+        Call(L, v('*'), [v('i'), v('n')], v('p')),
+        Call(L, v('print_int'), [v('p')], v('u')),
+        Call(L, v('+'), [v('i'), v('one')], v('i')),
+    ])
+    assert reduce_induction_variables(instructions) == instructions
+
+
+def test_reduced_loops_compute_the_same_products():
+    source = ('{ var n = read_int(); var i = n; var s = 0; '
+              'while i > -10 do { s = s + i * 6 - i * -5; print_int(i * 6); i = i - 4; } s }')
+    instructions = compile_to_ir(source)
+    assert calls(instructions[instructions.index(Label(L, 'while_body1')):], '*') == 0
+    expected = []
+    s = 0
+    for i in range(9, -10, -4):
+        s += i * 6 - i * -5
+        expected.append(i * 6)
+    assert compile_and_run(source, '9\n') == ''.join(f'{x}\n' for x in expected + [s])
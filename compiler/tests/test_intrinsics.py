@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from compiler.src.intrinsics import all_evaluators, INT64_MIN, signed_division_magic, wrap_int64
+from compiler.tests.test_program_utils import compile_to_assembly, compile_and_run
+
+INT64_MAX = 2 ** 63 - 1
+
+dividends = [0, 1, -1, 2, -2, 3, -3, 7, -7, 8, -8, 9, -9, 1000, -1001, 123456789, -987654321,
+             INT64_MAX, INT64_MAX - 7, INT64_MIN, INT64_MIN + 1, INT64_MIN + 9]
+
+
+def run_for_each_input(expressions: list[str]) -> list[str]:
+    """Evaluates the expressions of 'x' for every dividend, in one program."""
+    prints = ' '.join(f'print_int({e});' for e in expressions)
+    source = f'{{ var n = read_int(); while n > 0 do {{ var x = read_int(); {prints} n = n - 1; }} 0 }}'
+    stdin = ''.join(f'{x}\n' for x in [len(dividends), *dividends])
+    return compile_and_run(source, stdin).split('\n')[:-2]
+
+
+@pytest.mark.parametrize('op', ['/', '%'])
+@pytest.mark.parametrize('divisor', [1, 2, 4, 8, 1024, 2 ** 30, -2, -8, -2 ** 30, -2 ** 31,
+                                     3, -3, 7, -7, 10, 100, 641, 1000000007, 2 ** 31 - 1])
+def test_division_by_constants_matches_idivq(op, divisor):
+    expected = [str(all_evaluators[op](x, divisor)) for x in dividends]
+    assert run_for_each_input([f'x {op} {divisor}']) == expected
+
+
+def test_multiplication_by_constants():
+    factors = [0, 1, 2, 3, 5, 8, 9, 10, -4, 2 ** 20]
+    expressions = [f'x * {factor}' for factor in factors] + [f'{factor} * x' for factor in factors]
+    expected = [str(all_evaluators['*'](x, factor)) for x in dividends for factor in factors + factors]
+    assert run_for_each_input(expressions) == expected
+
+
+def test_powers_of_two_avoid_slow_instructions():
+    asm = compile_to_assembly('{ var x = read_int(); print_int(x / 8); print_int(x % 16); x * 4 }')
+    assert 'idivq' not in asm
+    assert 'imulq' not in asm
+    assert 'sarq $3' in asm
+    assert 'shlq $2' in asm
+
+
+def test_constants_are_immediate_operands():
+    asm = compile_to_assembly('{ var x = read_int(); while x < 100 do { x = x + 7; } x }')
+    assert 'cmpq $100, ' in asm
+    assert 'movq $7' not in asm
+
+
+def test_comparison_with_a_constant_on_the_left_is_swapped():
+    source = '{ var x = read_int(); print_bool(5 < x); if 5 <= x then 1 else 0 }'
+    assert 'cmpq $5, ' in compile_to_assembly(source)
+    assert compile_and_run(source, '5\n') == 'false\n1\n'
+    assert compile_and_run(source, '6\n') == 'true\n1\n'
+    assert compile_and_run(source, '4\n') == 'false\n0\n'
+
+
+def test_division_by_zero_and_minus_one_still_traps():
+    for source in ['{ var x = read_int(); x / 0 }', '{ var x = read_int(); x % -1 }']:
+        asm = compile_to_assembly(source)
+        assert 'idivq %r11' in asm
+
+
+def magic_quotient(n: int, d: int) -> int:
+    """What the code emitted for 'n / d' computes, with the same 64-bit wrapping."""
+    multiplier, shift = signed_division_magic(d)
+    high = (multiplier * n) >> 64
+    if d > 0 and multiplier < 0:
+        high = wrap_int64(high + n)
+    elif d < 0 and multiplier > 0:
+        high = wrap_int64(high - n)
+    high >>= shift
+    return wrap_int64(high + (1 if high < 0 else 0))
+
+
+def test_magic_numbers_divide_like_idivq():
+    rng = random.Random(1234)
+    edges = [0, 1, -1, INT64_MAX, INT64_MIN, INT64_MIN + 1, INT64_MAX - 1]
+    divisors = [d for d in range(-1000, 1001) if d not in (0, 1, -1) and abs(d) & (abs(d) - 1) != 0]
+    divisors += [rng.randint(-2 ** 31, 2 ** 31 - 1) for _ in range(300)] + [2 ** 31 - 1, -2 ** 31 + 1]
+    for d in divisors:
+        numbers = edges + [d, -d, d - 1, -d + 1, d * 12345] + [rng.randint(INT64_MIN, INT64_MAX) for _ in range(20)]
+        for n in numbers:
+            n = wrap_int64(n)
+            assert magic_quotient(n, d) == all_evaluators['/'](n, d), (n, d)
+
+
+def test_division_by_other_constants_avoids_idivq():
+    asm = compile_to_assembly('{ var x = read_int(); print_int(x / 10); x % 7 }')
+    assert 'idivq' not in asm
+    assert 'imulq' in asm
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from compiler.src.assembly_generator import generate_assembly
+from compiler.src.ir_generator import generate_ir
+from compiler.src.parser import parse
+from compiler.src.sym_table import SymTable
+from compiler.src.tokenizer import tokenize
+from compiler.src.type import initialize_root_types
+from compiler.src.type_checker import typecheck
+from compiler.tests.test_program_utils import compile_and_run
+
+programs = [
+    '1 + 2 * 3',
+    '{ var x = 1; while x < 100 do { x = x * 2; } x }',
+    '{ var n = 50; while n > 1 do { if n % 2 == 0 then { n = n / 2; } else { n = 3 * n + 1; } print_int(n); } }',
+    '{ var a = true; var b = false; if a and not b or b then print_int(1) else print_int(2); a }',
+    '{ var i = 0; var s = 0; while i < 10 do { if i % 3 == 0 then { s = s + i; } i = i + 1; } s }',
+    '{ ' + ' '.join(f'{{ var v{i} = {i}; if v{i} < 5 then print_int(v{i}) else print_int(-v{i}); }}'
+                    for i in range(30)) + ' }',
+]
+
+
+def compile_to_ir_and_asm(source_code: str) -> tuple[list[str], str]:
+    ast = parse(tokenize(source_code))
+    typecheck(ast, SymTable())
+    ir_instructions = generate_ir(initialize_root_types(), ast)
+    return [str(insn) for insn in ir_instructions], generate_assembly(ir_instructions)
+
+
+def test_generate_ir_numbers_variables_and_labels_per_invocation():
+    first = compile_to_ir_and_asm('{ var x = 1; while x < 10 do x = x + 1; }')
+    second = compile_to_ir_and_asm('{ var x = 1; while x < 10 do x = x + 1; }')
+    assert first == second
+    assert 'LoadIntConst(1, x1)' in first[0]
+    assert 'Label(while_start1)' in first[0]
+
+
+def test_generate_ir_is_reentrant_across_threads():
+    expected = {source: compile_to_ir_and_asm(source) for source in programs}
+    work = programs * 50
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(compile_to_ir_and_asm, work))
+
+    for source, result in zip(work, results):
+        assert result == expected[source]
+
+
+def test_conditions_jump_without_computing_bools():
+    instructions, _ = compile_to_ir_and_asm(
+        '{ var a = 1; var b = 2; while a < b and not (b > 5 or a == 0) do { a = a + 1; } a }')
+    assert not any(insn.startswith('LoadBoolConst') for insn in instructions)
+    assert not any(insn.startswith('Call(unary_not') for insn in instructions)
+    assert sum(insn.startswith('CondJump') for insn in instructions) == 3
+
+
+def test_nested_and_or_get_unique_labels():
+    instructions, _ = compile_to_ir_and_asm(
+        '{ var a = true; var b = a and (a or false); var c = (b and a) or (a and b); if a and b then c else a }')
+    labels = [insn for insn in instructions if insn.startswith('Label(')]
+    assert len(labels) == len(set(labels))
+
+
+def test_conditions_short_circuit():
+    source = ('{ var x = read_int(); var calls = 0; '
+              'if x > 0 and { calls = calls + 1; x > 5 } or not { calls = calls + 10; x < 3 } then print_int(1); '
+              'calls }')
+    assert compile_and_run(source, '7\n') == '1\n1\n'
+    assert compile_and_run(source, '4\n') == '1\n11\n'
+    assert compile_and_run(source, '-1\n') == '10\n'
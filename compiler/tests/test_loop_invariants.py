@@ -0,0 +1,58 @@
+from compiler.src import ir
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir, compile_to_assembly, compile_and_run, run_assembly
+
+
+def loop_body(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    start = next(i for i, insn in enumerate(instructions) if isinstance(insn, ir.Label))
+    return instructions[start:]
+
+
+def calls(instructions: list[ir.Instruction], name: str) -> int:
+    return sum(isinstance(insn, ir.Call) and insn.fun.name == name for insn in instructions)
+
+
+def test_invariant_condition_is_computed_once():
+    source = '{ var n = read_int(); var i = 0; while i < n * n do { i = i + 1; } i }'
+    instructions = compile_to_ir(source)
+    assert calls(loop_body(instructions), '*') == 0
+    assert calls(instructions, '*') == 1
+    assert compile_and_run(source, '5\n') == '25\n'
+
+
+def test_invariants_move_out_of_nested_loops():
+    source = ('{ var n = read_int(); var k = read_int(); var s = 0; var i = 0; while i < k do { var j = 0; '
+              'while j < k do { s = s + n * n + i * i; j = j + 1; } i = i + 1; } s }')
+    instructions = compile_to_ir(source)
+    inner = instructions[instructions.index(ir.Label(L, 'while_body2')):]
+    assert calls(inner, '*') == 0
+    assert calls(loop_body(instructions), '*') == 1
+    assert compile_and_run(source, '4\n3\n') == '159\n'
+
+
+def test_variables_assigned_in_the_loop_are_not_invariant():
+    source = ('{ var n = read_int(); var k = read_int(); var i = 0; '
+              'while i < k do { n = n + 1; print_int(n * n); i = i + 1; } n }')
+    assert calls(loop_body(compile_to_ir(source)), '*') == 1
+    assert compile_and_run(source, '0\n5\n') == '1\n4\n9\n16\n25\n5\n'
+
+
+def test_division_that_may_trap_stays_in_a_loop_that_may_not_run():
+    source = '{ var d = read_int(); var i = 0; while i < d do { print_int(10 / d); i = i + 1; } i }'
+    assert calls(loop_body(compile_to_ir(source)), '/') == 1
+    assert compile_and_run(source, '0\n') == '0\n'
+    assert compile_and_run(source, '2\n') == '5\n5\n2\n'
+
+
+def test_division_that_may_trap_stays_after_output_in_the_loop():
+    source = '{ var y = read_int(); var i = 0; while { print_int(i); i = i + 1; 10 / y > i } do { } }'
+    assert calls(loop_body(compile_to_ir(source)), '/') == 1
+    result = run_assembly(compile_to_assembly(source), '0\n')
+    assert result.returncode == -8
+    assert result.stdout == '0\n'
+
+
+def test_division_by_a_nonzero_constant_is_hoisted():
+    source = '{ var n = read_int(); var k = read_int(); var i = 0; while i < k do { print_int(n / 3); i = i + 1; } i }'
+    assert calls(loop_body(compile_to_ir(source)), '/') == 0
+    assert compile_and_run(source, '10\n3\n') == '3\n3\n3\n3\n'
@@ -0,0 +1,92 @@
+from compiler.src import ir
+from compiler.src.ir import IRVar, LoadIntConst, Label, Jump, CondJump, Call
+from compiler.src.loop_unrolling import unroll_loops
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir, compile_and_run
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+def calls(instructions: list[ir.Instruction], name: str) -> int:
+    return sum(isinstance(insn, ir.Call) and insn.fun.name == name for insn in instructions)
+
+
+def branches(instructions: list[ir.Instruction]) -> int:
+    return sum(isinstance(insn, ir.CondJump) for insn in instructions)
+
+
+def constant_loop(limit: int) -> list[ir.Instruction]:
+    return [
+        LoadIntConst(L, 0, v('i')),
+        LoadIntConst(L, 1, v('one')),
+        LoadIntConst(L, limit, v('limit')),
+        Label(L, 'start'),
+        Call(L, v('<'), [v('i'), v('limit')], v('t')),
+        CondJump(L, v('t'), Label(L, 'body'), Label(L, 'end')),
+        Label(L, 'body'),
+        Call(L, v('print_int'), [v('i')], v('u')),
+        Call(L, v('+'), [v('i'), v('one')], v('i')),
+        Jump(L, Label(L, 'start')),
+        Label(L, 'end'),
+    ]
+
+
+def test_short_loops_are_unrolled_completely():
+    instructions = unroll_loops(constant_loop(3))
+    assert branches(instructions) == 0
+    assert calls(instructions, 'print_int') == 3
+    assert [insn.name for insn in instructions if isinstance(insn, Label)] == [
+        'start', 'body_1', 'body_2', 'body_3', 'end',
+    ]
+
+
+def test_loops_that_never_run_jump_past_the_body():
+    instructions = unroll_loops(constant_loop(0))
+    assert calls(instructions, 'print_int') == 0
+    assert Jump(L, Label(L, 'end')) in instructions
+
+
+def test_long_loops_are_unrolled_by_a_factor():
+    instructions = unroll_loops(constant_loop(10), max_size=12, factor=4)
+    assert branches(instructions) == 1
+    assert calls(instructions, 'print_int') == 4 + 2
+    assert 'LoadIntConst(8, x1)' in [str(insn) for insn in instructions]
+    assert 'Call(!=, [i, x1], x2)' in [str(insn) for insn in instructions]
+
+
+def test_loops_are_left_alone_when_the_copies_do_not_fit():
+    instructions = constant_loop(10)
+    assert unroll_loops(instructions, max_size=4) == instructions
+
+
+def test_constant_loops_fold_away():
+    instructions = compile_to_ir('{ var i = 0; var s = 0; while i < 5 do { s = s + i * i; i = i + 1; } s }')
+    assert not any(isinstance(insn, (ir.Label, ir.CondJump)) for insn in instructions)
+    assert [insn.value for insn in instructions if isinstance(insn, LoadIntConst)] == [30]
+
+
+def test_loops_with_unknown_bounds_are_not_unrolled():
+    source = '{ var n = read_int(); var i = 0; while i < n do { print_int(i); i = i + 1; } i }'
+    assert calls(compile_to_ir(source), 'print_int') == 2
+    assert compile_and_run(source, '2\n') == '0\n1\n2\n'
+
+
+def test_unrolled_loops_run_every_iteration():
+    cases = [
+        ('{ var i = 0; var s = 0; while i < 1003 do { s = s + i; i = i + 1; } s }', sum(range(1003))),
+        ('{ var i = 100; var s = 0; while i >= 1 do { s = s + i; i = i - 3; } s }', sum(range(100, 0, -3))),
+        ('{ var i = 0; var s = 0; while 50 > i do { s = s + i; i = i + 7; } s }', sum(range(0, 50, 7))),
+        ('{ var i = 0; var s = 0; while i != 60 do { s = s + i; i = i + 6; } s }', sum(range(0, 60, 6))),
+        ('{ var i = 1; var s = 0; while i <= 20 do { if i % 2 == 0 then { s = s + i; } i = i + 1; } s }', 110),
+        ('{ var i = 5; var s = 0; while i < 5 do { s = s + 1; i = i + 1; } s }', 0),
+    ]
+    for source, expected in cases:
+        assert compile_and_run(source) == f'{expected}\n', source
+
+
+def test_loops_that_wrap_around_are_not_unrolled():
+    source = '{ var i = 9223372036854775800; var n = 0; while i > 0 do { i = i + 1; n = n + 1; } n }'
+    assert branches(compile_to_ir(source)) > 0
+    assert compile_and_run(source) == '8\n'
@@ -0,0 +1,106 @@
+import os
+import re
+import subprocess
+import tempfile
+
+import pytest
+
+from compiler.src.assembler import stdlib_asm_code
+from compiler.src.machine_code import EncodingException, assemble_object
+from compiler.tests.test_program_utils import compile_to_assembly, program_cases
+
+_relocation_kinds = {'R_X86_64_PC32': 'pc32', 'R_X86_64_PLT32': 'pc32', 'R_X86_64_32S': 'abs32s', 'R_X86_64_64': 'abs64'}
+
+
+def assemble_with_binutils(assembly_code: str) -> tuple[dict[str, bytes], set[tuple[str, int, str]]]:
+    """The contents of the sections that 'as' makes of the assembly, and the places and kinds of its relocations."""
+    with tempfile.TemporaryDirectory(prefix='compiler_test_') as workdir:
+        source, obj, contents = (os.path.join(workdir, name) for name in ('a.s', 'a.o', 'section'))
+        with open(source, 'w') as f:
+            f.write(assembly_code + '\n')
+        subprocess.run(['as', '-o', obj, source], check=True)
+        sections = {}
+        for section in ('.text', '.rodata', '.data'):
+            subprocess.run(['objcopy', '-O', 'binary', f'--only-section={section}', obj, contents], check=True)
+            with open(contents, 'rb') as f:
+                sections[section] = f.read()
+            os.remove(contents)
+        relocations = set()
+        listing = subprocess.run(['readelf', '-rW', obj], check=True, capture_output=True, text=True).stdout
+        for section, table in re.findall(r"Relocation section '\.rela(\S+)'.*?\n\n?(.*?)(?:\n\n|$)", listing, re.S):
+            for offset, kind in re.findall(r'^([0-9a-f]{8,16})\s+\S+\s+(R_X86_64_\w+)', table, re.M):
+                relocations.add((section, int(offset, 16), _relocation_kinds[kind]))
+        return sections, relocations
+
+
+def corpus() -> list[str]:
+    programs = [stdlib_asm_code]
+    for source_code, _, _ in program_cases:
+        programs += [
+            compile_to_assembly(source_code),
+            compile_to_assembly(source_code, optimize=False),
+            compile_to_assembly(source_code, use_registers=False),
+        ]
+    return programs
+
+
+@pytest.mark.parametrize('assembly_code', corpus())
+def test_encoding_matches_binutils(assembly_code):
+    obj = assemble_object(assembly_code)
+    sections, relocations = assemble_with_binutils(assembly_code)
+    for section, contents in sections.items():
+        assert bytes(obj.sections[section]) == contents, section
+    assert {(r.section, r.offset, r.kind) for r in obj.relocations} == relocations
+
+
+def test_instructions_match_binutils():
+    assembly_code = '\n'.join([
+        'movq $-1, %rax', 'movq $0xffffffff, %rax', 'movabsq $-5, %r12', 'movl $7, %r9d', 'movb $1, %al',
+        'movq 8(%r13), %r14', 'movq %rax, (%r12)', 'movq %rax, -200(%rbp)', 'movw $3, (%rax)', 'movb %sil, 1(%rsp)',
+        'addq $1000, %rax', 'addq $1000, %rbx', 'addb $1, %al', 'subq $-128, %rsp', 'cmpq $127, %r15',
+        'andl $255, %ecx', 'xorq %r8, 16(%rsp,%r9,8)', 'orq (%rax,%rbx), %rcx', 'testq $5, %rax', 'testb %al, %al',
+        'imulq %r10', 'imulq $7, %rcx', 'imulq $1000, %r8, %r9', 'imulq -16(%rbp), %rdx', 'idivq %r11',
+        'negq -8(%rbp)', 'notq %rax', 'incq %r13', 'decl %eax', 'shlq $1, %rax', 'shrq $63, %rdx',
+        'sarq %cl, %r8', 'setl %al', 'setge %r10b', 'setne %dil', 'leaq 5(%r13,%r13,4), %r13',
+        'movzbq (%rsi), %r8', 'movzwl (%rax), %ecx', 'movslq %eax, %rdx', 'pushq %r15', 'popq %rbx',
+        'pushq $1', 'cqto', 'cltq', 'rep movsb', 'syscall', 'ret',
+    ])
+    sections, _ = assemble_with_binutils(assembly_code)
+    assert bytes(assemble_object(assembly_code).sections['.text']) == sections['.text']
+
+
+def test_jumps_are_made_long_only_when_needed():
+    padding = ['addq $1000, %rbx'] * 15  # 7 bytes each
+    assembly_code = '\n'.join(['start:', 'jmp near', 'jne far', *padding, 'near:', *padding, 'far:', 'jl start'])
+    text = bytes(assemble_object(assembly_code).sections['.text'])
+    assert text[:2] == bytes([0xeb, 6 + 15 * 7])
+    assert text[2:4] == bytes([0x0f, 0x85])
+    assert text == assemble_with_binutils(assembly_code)[0]['.text']
+
+
+def test_symbols_and_constants():
+    obj = assemble_object('\n'.join([
+        '.global f', '.section .text', 'f:', 'leaq message(%rip), %rsi', 'movq $message_len, %rdx', 'call g',
+        '.section .rodata', 'message:', '.ascii "hi\\n"', 'message_len = . - message',
+        '.section .bss', 'size = 8', '.align 16', 'buffer:', '.skip size',
+    ]))
+    assert obj.global_symbols == {'f'}
+    assert obj.symbols['message_len'] == (None, 3)
+    assert obj.symbols['buffer'] == ('.bss', 0)
+    assert bytes(obj.sections['.rodata']) == b'hi\n'
+    assert [(r.kind, r.symbol, r.addend) for r in obj.relocations] == [('pc32', 'message', -4), ('pc32', 'g', -4)]
+
+
+@pytest.mark.parametrize('assembly_code', [
+    'vmovdqa %xmm0, %xmm1',
+    'movq (%rax), (%rbx)',
+    'addq $5000000000, %rax',
+    'xor %rax, %eax',
+    'movq %eax, %rbx',
+    'jmp *%rax',
+    '.section .foo',
+    'movq $1, %rax\nx:\nx:',
+])
+def test_unsupported_code_is_rejected(assembly_code):
+    with pytest.raises(EncodingException):
+        assemble_object(assembly_code)
@@ -0,0 +1,49 @@
+from collections import Counter
+
+from compiler.src.peephole import optimize_assembly
+from compiler.tests.test_program_utils import compile_and_run, compile_to_assembly
+
+
+def test_reloads_after_stores_use_the_stored_value():
+    assert optimize_assembly(['movq %rcx, -8(%rbp)', 'movq -8(%rbp), %rdi']) == \
+           ['movq %rcx, -8(%rbp)', 'movq %rcx, %rdi']
+    assert optimize_assembly(['movq $0, -16(%rbp)', 'movq -16(%rbp), %rax']) == \
+           ['movq $0, -16(%rbp)', 'movq $0, %rax']
+
+
+def test_rules_are_applied_until_nothing_matches():
+    hits: Counter[str] = Counter()
+    lines = ['movq %rax, -8(%rbp)', 'movq -8(%rbp), %rax', 'movq -8(%rbp), %rax']
+    assert optimize_assembly(lines, hits=hits) == ['movq %rax, -8(%rbp)']
+    assert hits['reload_after_store'] == 2
+    assert hits['self_move'] == 2
+
+
+def test_comments_are_skipped_over_and_kept():
+    lines = ['# Copy(x1, x2)', 'movq %rax, -8(%rbp)', '# Call(print_int, [x2], x3)', 'movq -8(%rbp), %rax']
+    assert optimize_assembly(lines) == ['# Copy(x1, x2)', 'movq %rax, -8(%rbp)', '# Call(print_int, [x2], x3)']
+
+
+def test_labels_stop_rules_from_matching():
+    lines = ['movq %rax, -8(%rbp)', '.Lloop:', 'movq -8(%rbp), %rax']
+    assert optimize_assembly(lines) == lines
+
+
+def test_overwritten_values_are_not_computed():
+    assert optimize_assembly(['xor %rax, %rax', 'movq -8(%rbp), %rax']) == ['movq -8(%rbp), %rax']
+    assert optimize_assembly(['xor %rax, %rax', 'movq (%rax), %rax']) == ['xor %rax, %rax', 'movq (%rax), %rax']
+    assert optimize_assembly(['movq $1, %rcx', 'movq %rdx, %rcx']) == ['movq %rdx, %rcx']
+    assert optimize_assembly(['movq $1, %rcx', 'movq -8(%rcx), %rcx']) == ['movq $1, %rcx', 'movq -8(%rcx), %rcx']
+
+
+def test_comparisons_with_zero_use_test():
+    assert optimize_assembly(['cmpq $0, %rcx']) == ['testq %rcx, %rcx']
+    assert optimize_assembly(['cmpq $0, -8(%rbp)']) == ['cmpq $0, -8(%rbp)']
+
+
+def test_peephole_shrinks_stack_based_code():
+    source = '{ var x = read_int(); var y = x * 2; print_int(y); y + 1 }'
+    plain = compile_to_assembly(source, use_registers=False, peephole=False)
+    optimized = compile_to_assembly(source, use_registers=False)
+    assert optimized.count('(%rbp), %') < plain.count('(%rbp), %')
+    assert compile_and_run(source, '4\n', use_registers=False) == '8\n9\n'
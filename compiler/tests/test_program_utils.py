@@ -0,0 +1,83 @@
+import subprocess
+import tempfile
+from os import path
+
+import pytest
+
+from compiler.src import ir
+from compiler.src.assembler import assemble, build_directory
+from compiler.src.assembly_generator import generate_assembly
+from compiler.src.ir_generator import generate_ir
+from compiler.src.ir_optimizer import optimize_ir
+from compiler.src.parser import parse
+from compiler.src.sym_table import SymTable
+from compiler.src.tokenizer import tokenize
+from compiler.src.type import initialize_root_types
+from compiler.src.type_checker import typecheck
+
+
+def compile_to_ir(source_code: str, optimize: bool = True) -> list[ir.Instruction]:
+    ast = parse(tokenize(source_code))
+    typecheck(ast, SymTable())
+    ir_instructions = generate_ir(initialize_root_types(), ast)
+    return optimize_ir(ir_instructions) if optimize else ir_instructions
+
+
+def compile_to_assembly(source_code: str, optimize: bool = True, **codegen_options) -> str:
+    return generate_assembly(compile_to_ir(source_code, optimize), **codegen_options)
+
+
+def run_assembly(asm: str, stdin: str = '') -> subprocess.CompletedProcess:
+    with tempfile.TemporaryDirectory(prefix='compiler_test_', dir=build_directory()) as workdir:
+        executable = path.join(workdir, 'a.out')
+        assemble(asm, executable, workdir=workdir)
+        return subprocess.run([executable], input=stdin, capture_output=True, text=True, timeout=30)
+
+
+def compile_and_run(source_code: str, stdin: str = '', optimize: bool = True, **codegen_options) -> str:
+    """Compiles a program, runs it and returns what it printed."""
+    result = run_assembly(compile_to_assembly(source_code, optimize, **codegen_options), stdin)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+# Programs with their input and expected output, shared by the end-to-end tests of the back end.
+program_cases = [
+    ('1 + 2 * 3', '', '7\n'),
+    ('{ var x = 10; x - 3 - 2 }', '', '5\n'),
+    ('-7 / 2', '', '-3\n'),
+    ('-7 % 2', '', '-1\n'),
+    ('{ var a = 3; var b = 4; a < b and b <= 4 or a == b }', '', 'true\n'),
+    ('{ var a = 3; not (a != 3) }', '', 'true\n'),
+    ('{ var x = 1; while x < 100 do { x = x * 2; } x }', '', '128\n'),
+    ('{ var n = 6; while n > 1 do { if n % 2 == 0 then { n = n / 2; } else { n = 3 * n + 1; } print_int(n); } }',
+     '', '3\n10\n5\n16\n8\n4\n2\n1\n'),
+    ('{ var i = 0; var s = 0; while i < 10 do { if i % 3 == 0 then { s = s + i; } i = i + 1; } s }', '', '18\n'),
+    ('{ var x = read_int(); var y = read_int(); print_int(x * y); x - y }', '6\n-7\n', '-42\n13\n'),
+    ('{ var b = 5 > 3; print_bool(b); print_bool(not b); if b then 1 else 2 }', '', 'true\nfalse\n1\n'),
+    ('{ var a = 1; var b = 2; var c = 3; var d = 4; var e = 5; var f = 6; var g = 7; var h = 8; '
+     'var i = 9; var j = 10; var k = 11; var l = 12; var m = 13; var n = 14; var o = 15; var p = 16; '
+     'var s = 0; var t = 0; while t < 3 do { s = s + a + b + c + d + e + f + g + h + i + j + k + l + m + n + o + p; '
+     'print_int(s); t = t + 1; } s }', '', '136\n272\n408\n408\n'),
+    ('{ var x = 3000000000; x * 3 }', '', '9000000000\n'),
+    ('{ var a = 5; var b = 6; var x = read_int(); print_int(a); print_int(b); x }', '1\n', '5\n6\n1\n'),
+    ('{ var a = read_int(); var b = read_int(); var t = a; a = b; b = t; print_int(a); b }', '1\n2\n', '2\n1\n'),
+    ('{ var x = read_int(); var y = x; x = 5; print_int(x); y }', '7\n', '5\n7\n'),
+    ('{ var x = read_int(); var y = (x = x + 1) * 2; print_int(x); y }', '4\n', '5\n10\n'),
+    ('{ var x = read_int(); var y = if x > 0 then x else -x; print_int(y); 1 / 1 }', '-3\n', '3\n1\n'),
+]
+
+
+@pytest.mark.parametrize('source_code, stdin, expected', program_cases)
+def test_program_output(source_code, stdin, expected):
+    assert compile_and_run(source_code, stdin) == expected
+
+
+@pytest.mark.parametrize('source_code, stdin, expected', program_cases)
+def test_program_output_without_register_allocation(source_code, stdin, expected):
+    assert compile_and_run(source_code, stdin, use_registers=False) == expected
+
+
+@pytest.mark.parametrize('source_code, stdin, expected', program_cases)
+def test_program_output_without_ir_optimization(source_code, stdin, expected):
+    assert compile_and_run(source_code, stdin, optimize=False) == expected
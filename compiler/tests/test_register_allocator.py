@@ -0,0 +1,53 @@
+from compiler.src.ir import IRVar, LoadIntConst, Call
+from compiler.src.liveness import live_intervals
+from compiler.src.register_allocator import allocate_registers, callee_saved_registers
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_assembly
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+def test_overlapping_intervals_get_different_registers():
+    instructions = [
+        LoadIntConst(L, 1, v('a')),
+        LoadIntConst(L, 2, v('b')),
+        Call(L, v('+'), [v('a'), v('b')], v('c')),
+        Call(L, v('print_int'), [v('c')], v('d')),
+    ]
+    intervals = live_intervals(instructions)
+    allocation = allocate_registers(instructions, intervals)
+    assert allocation.spilled == []
+    assert len({allocation.registers[v('a')], allocation.registers[v('b')], allocation.registers[v('c')]}) == 3
+
+
+def test_variables_live_across_calls_get_callee_saved_registers():
+    instructions = [
+        LoadIntConst(L, 1, v('a')),
+        LoadIntConst(L, 2, v('b')),
+        Call(L, v('print_int'), [v('b')], v('c')),
+        Call(L, v('print_int'), [v('a')], v('d')),
+    ]
+    allocation = allocate_registers(instructions, live_intervals(instructions))
+    assert allocation.registers[v('a')] in callee_saved_registers
+    assert allocation.registers[v('b')] not in callee_saved_registers
+
+
+def test_variables_are_spilled_under_pressure():
+    count = len(callee_saved_registers) + 3
+    instructions = [LoadIntConst(L, i, v(f'x{i}')) for i in range(count)]
+    instructions.append(Call(L, v('read_int'), [], v('r')))
+    instructions += [Call(L, v('print_int'), [v(f'x{i}')], v(f'p{i}')) for i in range(count)]
+    intervals = live_intervals(instructions)
+    allocation = allocate_registers(instructions, intervals)
+
+    assert len(allocation.spilled) == 3
+    kept = [var for var in allocation.registers if var.name.startswith('x')]
+    assert sorted(allocation.registers[var] for var in kept) == sorted(callee_saved_registers)
+
+
+def test_loop_variables_stay_in_registers():
+    asm = compile_to_assembly('{ var n = read_int(); var i = 0; while i < n do { i = i + 1; } i }')
+    body = asm[asm.index('.Lwhile_body1:'):asm.index('.Lwhile_end1:')]
+    assert '(%rbp)' not in body
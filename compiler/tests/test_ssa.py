@@ -0,0 +1,105 @@
+from collections import Counter
+
+import pytest
+
+from compiler.src import ir
+from compiler.src.assembly_generator import generate_assembly
+from compiler.src.ir import IRVar, LoadIntConst, Label, Jump, CondJump, Call, Copy, Phi
+from compiler.src.sccp import propagate_constants_sparsely
+from compiler.src.ssa import from_ssa, sequentialize_copies, to_ssa
+from compiler.src.tokenizer import L
+from compiler.tests.test_program_utils import compile_to_ir, compile_and_run, program_cases, run_assembly
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+def phis(instructions: list[ir.Instruction]) -> list[Phi]:
+    return [insn for insn in instructions if isinstance(insn, Phi)]
+
+
+def test_every_variable_is_written_once():
+    source = '{ var x = read_int(); var y = 0; while x > 0 do { if x % 2 == 0 then y = y + x else y = y - 1; x = x - 1; } y }'
+    instructions = to_ssa(compile_to_ir(source, optimize=False))
+    written = Counter(var for insn in instructions for var in ir.defined_vars(insn))
+    assert max(written.values()) == 1
+
+
+def test_phis_merge_values_where_paths_join():
+    instructions = to_ssa([
+        Call(L, v('read_int'), [], v('c')),
+        CondJump(L, v('c'), Label(L, 'then'), Label(L, 'else')),
+        Label(L, 'then'),
+        LoadIntConst(L, 1, v('x')),
+        Jump(L, Label(L, 'end')),
+        Label(L, 'else'),
+        LoadIntConst(L, 2, v('x')),
+        LoadIntConst(L, 3, v('unused')),
+        Label(L, 'end'),
+        Call(L, v('print_int'), [v('x')], v('r')),
+    ])
+    assert [str(insn) for insn in instructions[-3:]] == [
+        'Label(end)',
+        'Phi({then: x, else: x_2}, x_3)',
+        'Call(print_int, [x_3], r)',
+    ]
+
+
+def test_loop_variables_get_a_phi_at_the_header():
+    instructions = to_ssa(compile_to_ir('{ var i = read_int(); while i < 10 do { i = i + 1; } i }', optimize=False))
+    header = instructions.index(Label(L, 'while_start1'))
+    assert isinstance(instructions[header + 1], Phi)
+    assert len(phis(instructions)) == 1
+
+
+def test_parallel_copies_are_ordered():
+    a, b, c = v('a'), v('b'), v('c')
+    assert sequentialize_copies([(a, b), (b, c)], lambda: v('t')) == [(a, b), (b, c)]
+    assert sequentialize_copies([(b, c), (a, b)], lambda: v('t')) == [(a, b), (b, c)]
+    assert sequentialize_copies([(a, b), (b, a)], lambda: v('t')) == [(v('t'), a), (a, b), (b, v('t'))]
+    assert sequentialize_copies([(a, a)], lambda: v('t')) == []
+
+
+def test_edges_from_branches_get_a_block_for_the_copies():
+    instructions = from_ssa([
+        Call(L, v('read_int'), [], v('c')),
+        LoadIntConst(L, 1, v('x')),
+        CondJump(L, v('c'), Label(L, 'then'), Label(L, 'end')),
+        Label(L, 'then'),
+        LoadIntConst(L, 2, v('x_2')),
+        Label(L, 'end'),
+        Phi(L, {'entry': v('x'), 'then': v('x_2')}, v('x_3')),
+        Call(L, v('print_int'), [v('x_3')], v('r')),
+    ])
+    assert not phis(instructions)
+    assert [str(insn) for insn in instructions] == [
+        'Call(read_int, [], c)',
+        'LoadIntConst(1, x)',
+        'CondJump(c, Label(then), Label(edge1))',
+        'Label(then)',
+        'LoadIntConst(2, x_2)',
+        'Copy(x_2, x_3)',
+        'Jump(Label(end))',
+        'Label(edge1)',
+        'Copy(x, x_3)',
+        'Jump(Label(end))',
+        'Label(end)',
+        'Call(print_int, [x_3], r)',
+    ]
+
+
+@pytest.mark.parametrize('source_code, stdin, expected', program_cases)
+def test_programs_survive_the_round_trip(source_code, stdin, expected):
+    instructions = from_ssa(to_ssa(compile_to_ir(source_code, optimize=False)))
+    assert run_assembly(generate_assembly(instructions), stdin).stdout == expected
+
+
+def test_constants_are_seen_through_loops_and_branches():
+    source = ('{ var x = 1; var n = read_int(); var i = 0; '
+              'while i < n do { if x == 1 then i = i + 1 else x = x + 1; } print_int(i); x }')
+    instructions = propagate_constants_sparsely(to_ssa(compile_to_ir(source, optimize=False)))
+    assert not any(isinstance(insn, Call) and insn.fun.name == '==' for insn in instructions)
+    [printed] = ir.call_args(instructions[-1])
+    assert [insn for insn in instructions if ir.defined_vars(insn) == [printed]] == [LoadIntConst(L, 1, printed)]
+    assert compile_and_run(source, '3\n') == '3\n1\n'
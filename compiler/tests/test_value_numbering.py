@@ -0,0 +1,75 @@
+from compiler.src import ir
+from compiler.src.ir import IRVar, LoadIntConst, Label, Call, Copy
+from compiler.src.tokenizer import L
+from compiler.src.value_numbering import number_values
+from compiler.tests.test_program_utils import compile_to_ir, compile_and_run
+
+
+def v(name: str) -> IRVar:
+    return IRVar(name)
+
+
+def calls(instructions: list[ir.Instruction], name: str) -> int:
+    return sum(isinstance(insn, ir.Call) and insn.fun.name == name for insn in instructions)
+
+
+def test_repeated_expressions_become_copies():
+    instructions = number_values([
+        Call(L, v('*'), [v('a'), v('b')], v('t1')),
+        Call(L, v('*'), [v('b'), v('a')], v('t2')),
+        Call(L, v('>'), [v('a'), v('b')], v('t3')),
+        Call(L, v('<'), [v('b'), v('a')], v('t4')),
+    ])
+    assert [str(insn) for insn in instructions] == [
+        'Call(*, [a, b], t1)',
+        'Copy(t1, t2)',
+        'Call(>, [a, b], t3)',
+        'Copy(t3, t4)',
+    ]
+
+
+def test_operands_with_equal_values_match():
+    instructions = number_values([
+        LoadIntConst(L, 10, v('c1')),
+        Call(L, v('%'), [v('x'), v('c1')], v('t1')),
+        LoadIntConst(L, 10, v('c2')),
+        Copy(L, v('x'), v('y')),
+        Call(L, v('%'), [v('y'), v('c2')], v('t2')),
+    ])
+    assert str(instructions[-1]) == 'Copy(t1, t2)'
+
+
+def test_redefined_operands_and_results_are_not_reused():
+    instructions = [
+        Call(L, v('+'), [v('a'), v('b')], v('t')),
+        Call(L, v('read_int'), [], v('a')),
+        Call(L, v('+'), [v('a'), v('b')], v('u')),
+        Call(L, v('-'), [v('u'), v('b')], v('w')),
+        Call(L, v('read_int'), [], v('w')),
+        Call(L, v('-'), [v('u'), v('b')], v('z')),
+    ]
+    assert number_values(instructions) == instructions
+
+
+def test_values_are_forgotten_at_labels():
+    instructions = [
+        Call(L, v('+'), [v('a'), v('b')], v('t')),
+        Label(L, 'loop'),
+        Call(L, v('+'), [v('a'), v('b')], v('u')),
+    ]
+    assert number_values(instructions) == instructions
+
+
+def test_runtime_calls_are_never_merged():
+    instructions = compile_to_ir('{ var x = read_int(); var y = read_int(); print_int(x); print_int(x); x - y }')
+    assert calls(instructions, 'read_int') == 2
+    assert calls(instructions, 'print_int') == 3
+
+
+def test_loop_body_computes_shared_subexpressions_once():
+    source = ('{ var a = read_int(); var b = read_int(); var n = 0; '
+              'while n < 2 do { print_int((a * b) + (b * a) + a % 10 * (a % 10)); n = n + 1; } }')
+    instructions = compile_to_ir(source)
+    assert calls(instructions, '*') == 2
+    assert calls(instructions, '%') == 1
+    assert compile_and_run(source, '13\n4\n') == '113\n113\n'